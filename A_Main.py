@@ -1,14 +1,24 @@
 import sys
 import os
+import argparse
 import subprocess
 import logging
 import sqlite3
+from importlib import metadata
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# شروع سریع: نصب بودن پکیج‌ها از روی metadata بررسی می‌شود (بدون import) و matplotlib/seaborn
+# و کتابخانه‌های مدل فقط وقتی لازم شوند بارگذاری می‌شوند
+FAST_START = os.getenv("FAST_START", "1") == "1"
+
+# ماژول‌های مسیر کشیدن کندل که زمان import آن‌ها با --profile-imports گزارش می‌شود
+INGESTION_MODULES = [
+    "b_config.f_logger_config", "c_database.a_database",
+    "e_data_ingestion.a_fetch_candles", "e_data_ingestion.f_indicator_engine",
+]
+
 # پکیج‌های لازم
 required_packages = [
     "sqlalchemy", "pandas", "numpy", "scikit-learn", "xgboost", "lightgbm", "matplotlib",
@@ -16,12 +26,25 @@ required_packages = [
     "joblib", "tqdm", "gym", "transformers", "scipy", "pycaret", "statsmodels", "MetaTrader5"
 ]
 
-def install_packages(packages):
-    for package in packages:
+def is_installed(package, fast_start=FAST_START):
+    """در حالت سریع فقط metadata توزیع نصب شده خوانده می‌شود (نام توزیع، مثلاً scikit-learn)"""
+    if fast_start:
         try:
-            __import__(package)
+            metadata.distribution(package)
+            return True
+        except metadata.PackageNotFoundError:
+            return False
+    try:
+        __import__(package)
+        return True
+    except ImportError:
+        return False
+
+def install_packages(packages, fast_start=FAST_START):
+    for package in packages:
+        if is_installed(package, fast_start):
             print(f"✅ {package} already installed.")
-        except ImportError:
+        else:
             print(f"📦 Installing {package}...")
             try:
                 subprocess.check_call([sys.executable, "-m", "pip", "install", package])
@@ -33,21 +56,6 @@ def connect_db(db_path):
     conn = sqlite3.connect(db_path)
     return conn
 
-def load_close_prices(conn, timeframe_id):
-    query = """
-        SELECT s.symbol_name, c.time, c.close
-        FROM candles c
-        JOIN symbols s ON c.symbol_id = s.id
-        WHERE c.timeframe_id = ?
-    """
-    df = pd.read_sql_query(query, conn, params=(timeframe_id,))
-    return df
-
-def pivot_close_prices(df):
-    df_pivot = df.pivot(index='time', columns='symbol_name', values='close')
-    df_pivot = df_pivot.dropna()
-    return df_pivot
-
 def calculate_returns(df_pivot):
     returns = df_pivot.pct_change().dropna()
     return returns
@@ -57,6 +65,8 @@ def calculate_correlation(df_returns):
     return correlation_matrix
 
 def plot_correlation_heatmap(correlation_matrix, title):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plt.figure(figsize=(10, 8))
     sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5)
     plt.title(title)
@@ -67,6 +77,7 @@ def calculate_rolling_correlation(df_returns, symbol1, symbol2, window=100):
     return rolling_corr
 
 def plot_rolling_correlation(rolling_corr, symbol1, symbol2):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(12, 6))
     rolling_corr.plot()
     plt.title(f'Rolling Correlation ({symbol1} vs {symbol2})')
@@ -75,9 +86,47 @@ def plot_rolling_correlation(rolling_corr, symbol1, symbol2):
     plt.grid(True)
     plt.show()
 
+def profile_imports(modules=INGESTION_MODULES, top=15):
+    """
+    زمان import هر ماژول (با وابستگی‌هایش) در یک پردازه تازه با python -X importtime.
+    خروجی: لیست (ماژول، زمان کل میلی‌ثانیه، زمان خود ماژول میلی‌ثانیه) به ترتیب زمان کل
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+        capture_output=True, text=True, env=env
+    )
+    if result.returncode != 0:
+        print(f"⚠️ import با خطا متوقف شد: {result.stderr.strip().splitlines()[-1]}")
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            timings.append((name.strip(), int(cumulative_us) / 1000, int(self_us) / 1000))
+    by_name = {name: cumulative for name, cumulative, _ in timings}
+    for module in modules:
+        if module in by_name:
+            print(f"⏱️ {module}: {by_name[module]:.1f} ms")
+    print("🐢 سنگین‌ترین importها (زمان کل / زمان خود ماژول):")
+    for name, cumulative, own in sorted(timings, key=lambda row: row[1], reverse=True)[:top]:
+        print(f"   {name}: {cumulative:.1f} / {own:.1f} ms")
+    return sorted(timings, key=lambda row: row[1], reverse=True)
+
 def main():
+    parser = argparse.ArgumentParser(description="اجرای پروژه Smart Expert")
+    parser.add_argument("--ingest-only", action="store_true", help="فقط ساخت دیتابیس و کشیدن کندل‌ها")
+    parser.add_argument("--full-check", action="store_true", help="بررسی پکیج‌ها با import (حالت قدیمی، کند)")
+    parser.add_argument("--profile-imports", action="store_true", help="گزارش زمان import ماژول‌های مسیر کندل و خروج")
+    args = parser.parse_args()
+
+    if args.profile_imports:
+        profile_imports()
+        return
+
     base_path = os.path.dirname(os.path.abspath(__file__))
-    install_packages(required_packages)
+    install_packages(required_packages, fast_start=FAST_START and not args.full_check)
 
     from b_config.f_logger_config import get_logger
     logger = get_logger('main', level=logging.DEBUG)
@@ -99,6 +148,9 @@ def main():
         logger.error(f"❌ خطا در کشیدن کندل‌ها: {e}")
         sys.exit(1)
 
+    if args.ingest_only:
+        return
+
     # 🟢 تحلیل Correlation بعد از کشیدن کندل‌ها
     try:
         logger.info("🚀 شروع تحلیل Correlation و Rolling Correlation...")
@@ -108,8 +160,9 @@ def main():
 
         timeframe_id = 3  # M15
 
-        df = load_close_prices(conn, timeframe_id)
-        df_pivot = pivot_close_prices(df)
+        from c_database.d_candle_cache import get_candle_cache
+        from f_analysis.b_correlation_analysis import load_close_pivot_cached
+        df_pivot = load_close_pivot_cached(conn, get_candle_cache(db_path), timeframe_id)
         df_returns = calculate_returns(df_pivot)
         correlation_matrix = calculate_correlation(df_returns)
 
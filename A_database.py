@@ -26,6 +26,7 @@ def seed_risk_settings(session):
             TradingRiskSetting(parameter_name='max_lot', parameter_value='50', description='حداکثر حجم لات مجاز'),
             TradingRiskSetting(parameter_name='stop_loss_atr_multiplier', parameter_value='1.5', description='ضریب ATR برای تعیین فاصله حد ضرر'),
             TradingRiskSetting(parameter_name='take_profit_ratio', parameter_value='2', description='نسبت حد سود به حد ضرر (Risk/Reward)'),
+            TradingRiskSetting(parameter_name='max_portfolio_risk_percent', parameter_value='3', description='حداکثر ریسک کل پورتفو (با در نظر گرفتن همبستگی نمادها) به درصد موجودی'),
         ]
         session.bulk_save_objects(seed_data)
         session.commit()
@@ -37,12 +38,12 @@ def seed_symbols(session):
     """
     if session.query(Symbols).count() == 0:
         symbols = [
-            Symbols(symbol_name="XAUUSD", description="Gold vs US Dollar", digits=2),
-            Symbols(symbol_name="USDInd", description="US Dollar Index", digits=2),
-            Symbols(symbol_name="WTI", description="West Texas Intermediate Crude Oil", digits=2),
-            Symbols(symbol_name="XAGUSD", description="Silver vs US Dollar", digits=3),
-            Symbols(symbol_name="EURUSD", description="Euro vs US Dollar", digits=5),
-            Symbols(symbol_name="US500", description="S&P 500 Index", digits=2),
+            Symbols(symbol_name="XAUUSD", description="Gold vs US Dollar", digits=2, contract_size=100),
+            Symbols(symbol_name="USDInd", description="US Dollar Index", digits=2, contract_size=1000),
+            Symbols(symbol_name="WTI", description="West Texas Intermediate Crude Oil", digits=2, contract_size=1000),
+            Symbols(symbol_name="XAGUSD", description="Silver vs US Dollar", digits=3, contract_size=5000),
+            Symbols(symbol_name="EURUSD", description="Euro vs US Dollar", digits=5, contract_size=100000),
+            Symbols(symbol_name="US500", description="S&P 500 Index", digits=2, contract_size=1),
         ]
         session.bulk_save_objects(symbols)
         session.commit()
@@ -57,6 +58,9 @@ def seed_timeframes(session):
             Timeframes(timeframe_name="M1", minutes=1, display_name="1 Minute"),
             Timeframes(timeframe_name="M5", minutes=5, display_name="5 Minutes"),
             Timeframes(timeframe_name="M15", minutes=15, display_name="15 Minutes"),
+            Timeframes(timeframe_name="H1", minutes=60, display_name="1 Hour"),
+            Timeframes(timeframe_name="H4", minutes=240, display_name="4 Hours"),
+            Timeframes(timeframe_name="D1", minutes=1440, display_name="1 Day"),
         ]
         session.bulk_save_objects(timeframes)
         session.commit()
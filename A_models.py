@@ -86,7 +86,7 @@ class Candles(Base):
     __tablename__ = 'candles'
     symbol_id = Column(Integer, ForeignKey('symbols.id'), primary_key=True)
     timeframe_id = Column(Integer, ForeignKey('timeframes.id'), primary_key=True)
-    time = Column(DateTime, primary_key=True)
+    time = Column(Integer, primary_key=True)  # epoch ثانیه (UTC)
     open = Column(Float, nullable=False)
     high = Column(Float, nullable=False)
     low = Column(Float, nullable=False)
@@ -95,15 +95,19 @@ class Candles(Base):
     spread = Column(Integer, nullable=True)
     real_volume = Column(Integer, nullable=True)
 
+    # جدول روی کلید (symbol_id, timeframe_id, time) خوشه‌بندی می‌شود (WITHOUT ROWID)،
+    # پس بازه‌های زمانی یک سری مستقیماً از خود جدول خوانده می‌شوند.
+    # ایندکس پوششی برای خواندن قیمت بسته شدن همه نمادها در یک تایم‌فریم (load_close_prices).
     __table_args__ = (
-        Index('ix_candles_symbol_timeframe_timestamp', 'symbol_id', 'timeframe_id', 'timestamp'),
+        Index('ix_candles_timeframe_symbol_time_close', 'timeframe_id', 'symbol_id', 'time', 'close'),
+        {'sqlite_with_rowid': False},
     )
 
 class Indicators(Base):
     __tablename__ = 'indicators'
     symbol_id = Column(Integer, ForeignKey('symbols.id'), primary_key=True)
     timeframe_id = Column(Integer, ForeignKey('timeframes.id'), primary_key=True)
-    timestamp = Column(DateTime, primary_key=True)
+    timestamp = Column(Integer, primary_key=True)  # epoch ثانیه، هم‌تراز با candles.time
     indicator_name = Column(String, primary_key=True)
     value = Column(Float, default=0)
 
@@ -111,6 +115,13 @@ class Indicators(Base):
         Index('ix_indicators_symbol_timeframe_timestamp_name', 'symbol_id', 'timeframe_id', 'timestamp', 'indicator_name'),
     )
 
+class IndicatorState(Base):
+    __tablename__ = 'indicator_state'
+    symbol_id = Column(Integer, ForeignKey('symbols.id'), primary_key=True)
+    timeframe_id = Column(Integer, ForeignKey('timeframes.id'), primary_key=True)
+    last_time = Column(Integer, nullable=False)  # آخرین کندل پردازش شده (epoch ثانیه)
+    state = Column(Text, nullable=False)  # JSON وضعیت بازگشتی اندیکاتورها (EMA، Wilder، ...)
+
 class SignalPredictions(Base):
     __tablename__ = 'signal_predictions'
     id = Column(Integer, primary_key=True)
@@ -120,6 +131,7 @@ class SignalPredictions(Base):
     predicted_signal = Column(String, nullable=False)
     confidence = Column(Float, default=0)
     status = Column(Enum(SignalStatusEnum), default=SignalStatusEnum.pending, nullable=False)
+    model_version_id = Column(Integer, ForeignKey('model_versions.id'), nullable=True)  # مدلی که پیش‌بینی را ساخته
 
     __table_args__ = (
         Index('ix_signal_predictions_symbol_timeframe_timestamp', 'symbol_id', 'timeframe_id', 'timestamp'),
@@ -194,6 +206,9 @@ class ModelVersions(Base):
     accuracy = Column(Float)
     loss = Column(Float)
     description = Column(Text)
+    artifact_path = Column(String, nullable=True)  # فایل مدل ذخیره شده در رجیستری
+    artifact_format = Column(String, nullable=True)  # joblib / xgboost / catboost
+    is_active = Column(Boolean, default=False)  # مدل فعال سرویس پیش‌بینی
 
 class BacktestResults(Base):
     __tablename__ = 'backtest_results'
@@ -205,6 +220,9 @@ class BacktestResults(Base):
     profit = Column(Float, default=0)
     drawdown = Column(Float, default=0)
     win_rate = Column(Float, default=0)
+    sharpe_ratio = Column(Float)
+    symbol_id = Column(Integer, ForeignKey('symbols.id'))
+    timeframe_id = Column(Integer, ForeignKey('timeframes.id'))
 
 
     __table_args__ = (
@@ -221,6 +239,39 @@ class OptimizationResults(Base):
     win_rate = Column(Float, default=0)
     test_period = Column(String)
 
+class CorrelationResults(Base):
+    __tablename__ = 'correlation_results'
+    id = Column(Integer, primary_key=True)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    timeframe_id = Column(Integer, ForeignKey('timeframes.id'), nullable=False)
+    window = Column(Integer, nullable=True)  # None = کل دوره، در غیر این صورت طول پنجره غلتان
+    symbol_id_1 = Column(Integer, ForeignKey('symbols.id'), nullable=False)
+    symbol_id_2 = Column(Integer, ForeignKey('symbols.id'), nullable=False)
+    correlation = Column(Float)
+    sample_size = Column(Integer)
+    period_start = Column(Integer)  # epoch ثانیه
+    period_end = Column(Integer)
+
+    __table_args__ = (
+        Index('ix_correlation_results_timeframe_computed_at', 'timeframe_id', 'computed_at'),
+    )
+
+class LeadLagResults(Base):
+    __tablename__ = 'lead_lag_results'
+    id = Column(Integer, primary_key=True)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    timeframe_id = Column(Integer, ForeignKey('timeframes.id'), nullable=False)
+    leader_symbol_id = Column(Integer, ForeignKey('symbols.id'), nullable=False)
+    lagger_symbol_id = Column(Integer, ForeignKey('symbols.id'), nullable=False)
+    lag_bars = Column(Integer, nullable=False)  # تعداد کندلی که leader جلوتر است
+    correlation = Column(Float)
+    zero_lag_correlation = Column(Float)
+    sample_size = Column(Integer)
+
+    __table_args__ = (
+        Index('ix_lead_lag_results_timeframe_computed_at', 'timeframe_id', 'computed_at'),
+    )
+
 class TradingRiskSetting(Base):
     __tablename__ = 'trading_risk_settings'
     id = Column(Integer, primary_key=True, autoincrement=True)
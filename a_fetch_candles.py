@@ -1,8 +1,33 @@
 import MetaTrader5 as mt5
 import sqlite3
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import os
+import time
+
+from b_config.c_database_config import DEFAULT_DB_PATH
+from c_database.c_columnar_store import get_columnar_store
+from c_database.d_candle_cache import notify_candles_written
+
+# تنظیمات PRAGMA برای نوشتن انبوه در SQLite
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",    # خواننده‌ها هنگام نوشتن قفل نمی‌شوند
+    "synchronous": "NORMAL",  # در حالت WAL امن و بسیار سریع‌تر از FULL
+    "cache_size": -64000,     # مقدار منفی یعنی کیلوبایت (~64MB)
+    "temp_store": "MEMORY",
+}
+
+# تعداد ردیف در هر فراخوانی executemany
+INSERT_BATCH_SIZE = 5000
+
+INSERT_CANDLES_SQL = """
+    INSERT OR IGNORE INTO candles (symbol_id, timeframe_id, time, open, high, low, close, tick_volume, spread, real_volume)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# بازنویسی کندل‌های موجود (کندل‌های ساخته شده از M1 وقتی کندل ناقص دوباره محاسبه می‌شود)
+REPLACE_CANDLES_SQL = INSERT_CANDLES_SQL.replace("INSERT OR IGNORE", "INSERT OR REPLACE", 1)
 
 def connect_mt5():
     """اتصال به متاتریدر 5"""
@@ -10,11 +35,17 @@ def connect_mt5():
         raise Exception(f"❌ اتصال به متاتریدر 5 برقرار نشد: {mt5.last_error()}")
     print("✅ اتصال موفق به متاتریدر 5")
 
-def connect_db(db_path):
+def apply_pragmas(conn, pragmas=None):
+    """اعمال PRAGMAهای نوشتن انبوه روی اتصال"""
+    for name, value in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name}={value}")
+
+def connect_db(db_path, pragmas=None):
     """اتصال به دیتابیس SQLite"""
     if not os.path.exists(db_path):
         raise FileNotFoundError(f"❌ فایل دیتابیس پیدا نشد: {db_path}")
     conn = sqlite3.connect(db_path)
+    apply_pragmas(conn, pragmas)
     print("✅ اتصال موفق به دیتابیس")
     return conn
 
@@ -28,27 +59,129 @@ def fetch_candles(symbol, timeframe, num_candles):
     df = df.drop_duplicates(subset=['timestamp'])  # حذف دابل
     return df
 
-def save_candles_to_db(candles_df, symbol_id, timeframe_id, conn):
-    """ذخیره کندل‌ها در دیتابیس"""
+def fetch_rates(symbol, timeframe, num_candles):
+    """
+    دریافت آرایه خام کندل‌های بسته شده از MT5 (بدون ساخت DataFrame) و حذف زمان‌های تکراری.
+    مثل استریم زنده از موقعیت 1 خوانده می‌شود: کندل موقعیت 0 هنوز در حال شکل‌گیری است و با INSERT OR IGNORE
+    ناقص می‌ماند، چون اجرای افزایشی بعدی از بعد از آن شروع می‌کند.
+    """
+    rates = mt5.copy_rates_from_pos(symbol, timeframe, 1, num_candles)
+    if rates is None or len(rates) == 0:
+        raise Exception(f"❌ هیچ دیتایی برنگشت برای {symbol} در تایم‌فریم {timeframe}")
+    _, first_idx = np.unique(rates['time'], return_index=True)
+    return rates[first_idx]
+
+def fetch_rates_since(symbol, timeframe, since_epoch):
+    """دریافت فقط کندل‌های بسته شده بعد از since_epoch با copy_rates_range (ممکن است خالی باشد)"""
+    date_from = datetime.fromtimestamp(since_epoch + 1, tz=timezone.utc)
+    # زمان سرور بروکر معمولاً جلوتر از UTC است، پس انتهای بازه را باز می‌گذاریم
+    date_to = datetime.now(tz=timezone.utc) + timedelta(days=1)
+    rates = mt5.copy_rates_range(symbol, timeframe, date_from, date_to)
+    if rates is None:
+        raise Exception(f"❌ خطا در دریافت کندل‌های جدید {symbol} در تایم‌فریم {timeframe}: {mt5.last_error()}")
+    _, first_idx = np.unique(rates['time'], return_index=True)
+    rates = rates[first_idx]
+    # بازه تا آینده باز است، پس آخرین کندل همان کندل موقعیت 0 (در حال شکل‌گیری) است و کنار گذاشته می‌شود
+    rates = rates[:-1]
+    return rates[rates['time'] > since_epoch]
+
+def get_last_candle_time(conn, symbol_id, timeframe_id):
+    """آخرین زمان ذخیره شده (epoch ثانیه) برای یک سری؛ برای سری خالی None"""
+    row = conn.execute(
+        "SELECT MAX(time) FROM candles WHERE symbol_id = ? AND timeframe_id = ?",
+        (symbol_id, timeframe_id)
+    ).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return db_time_to_epoch(row[0])
+
+def load_high_water_marks(conn):
+    """آخرین زمان ذخیره شده برای همه سری‌ها: {(symbol_id, timeframe_id): epoch}"""
+    rows = conn.execute("SELECT symbol_id, timeframe_id, MAX(time) FROM candles GROUP BY symbol_id, timeframe_id").fetchall()
+    return {(symbol_id, timeframe_id): db_time_to_epoch(last) for symbol_id, timeframe_id, last in rows if last is not None}
+
+def db_time_to_epoch(value):
+    """تبدیل مقدار ستون time به epoch ثانیه (رشته تاریخ فقط در دیتابیس‌های مهاجرت نشده)"""
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+    return int(value)
+
+def publish_candle_writes(pending):
+    """
+    به‌روزرسانی انبار ستونی و کش کندل‌ها برای سری‌هایی که نوشتن آن‌ها commit شده است.
+    pending همان لیستی است که به write_candle_columns(commit=False) داده شده و بعد از اجرا خالی می‌شود.
+    """
+    store = get_columnar_store()
+    for symbol_id, timeframe_id, columns, replace in pending:
+        # انبار ستونی (اگر فعال باشد) هم به‌روز می‌شود؛ کندل‌های تکراری را خودش نادیده می‌گیرد
+        if store is not None:
+            store.append(symbol_id, timeframe_id, columns, replace=replace)
+        # کش کندل‌ها ورودی‌های این سری را گسترش می‌دهد یا باطل می‌کند
+        notify_candles_written(symbol_id, timeframe_id, columns)
+    pending.clear()
+
+def write_candle_columns(conn, symbol_id, timeframe_id, columns, batch_size=INSERT_BATCH_SIZE, commit=True, replace=False,
+                         pending=None):
+    """
+    نوشتن ستون‌های کندل با executemany در دسته‌های batch_size داخل یک تراکنش.
+    columns یک دیکشنری از time (epoch ثانیه، همان مقدار ذخیره شده) و open/high/low/close/tick_volume/spread/real_volume است.
+    با commit=False تراکنش باز می‌ماند تا فراخواننده چند سری را یکجا commit کند؛ در این حالت rollback
+    هنگام خطا هم با فراخواننده است (مثلاً ROLLBACK TO یک SAVEPOINT فقط برای همین سری).
+    انبار ستونی و کش فقط بعد از commit به‌روز می‌شوند تا با rollback جلوتر از دیتابیس نمانند: با commit=False
+    سری نوشته شده به لیست pending اضافه می‌شود و فراخواننده بعد از commit خود publish_candle_writes(pending) را صدا می‌زند
+    (و بعد از rollback ورودی‌های دور ریخته شده را از pending حذف می‌کند).
+    با replace=True کندل‌های موجود با همان زمان بازنویسی می‌شوند (به جای نادیده گرفتن).
+    خروجی: (تعداد ردیف جدید یا بازنویسی شده، ردیف در ثانیه)
+    """
+    started = time.perf_counter()
+    n = len(columns['time'])
+    buffers = [
+        np.asarray(columns[name]).tolist()
+        for name in ('time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume')
+    ]
+    changes_before = conn.total_changes
     cursor = conn.cursor()
-    for index, row in candles_df.iterrows():
-        cursor.execute("""
-            INSERT OR IGNORE INTO candles (symbol_id, timeframe_id, time, open, high, low, close, tick_volume, spread, real_volume)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            symbol_id,
-            timeframe_id,
-            row['timestamp'].to_pydatetime(),
-            row['open'],
-            row['high'],
-            row['low'],
-            row['close'],
-            row['tick_volume'],
-            row['spread'],
-            row['real_volume']
-        ))
-    conn.commit()
-    print(f"✅ {len(candles_df)} کندل جدید برای نماد {symbol_id} ذخیره شد.")
+    try:
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            cursor.executemany(REPLACE_CANDLES_SQL if replace else INSERT_CANDLES_SQL, zip(
+                [symbol_id] * (stop - start),
+                [timeframe_id] * (stop - start),
+                *(buf[start:stop] for buf in buffers)
+            ))
+        if commit:
+            conn.commit()
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+    inserted = conn.total_changes - changes_before
+
+    if inserted:
+        written = (symbol_id, timeframe_id, columns, replace)
+        if commit:
+            publish_candle_writes([written])
+        elif pending is not None:
+            pending.append(written)
+
+    elapsed = time.perf_counter() - started
+    rows_per_sec = n / elapsed if elapsed > 0 else float('inf')
+    return inserted, rows_per_sec
+
+def save_rates_to_db(rates, symbol_id, timeframe_id, conn, batch_size=INSERT_BATCH_SIZE):
+    """ذخیره مستقیم آرایه ساخت‌یافته MT5 در دیتابیس"""
+    columns = {name: rates[name] for name in rates.dtype.names}
+    inserted, rows_per_sec = write_candle_columns(conn, symbol_id, timeframe_id, columns, batch_size)
+    print(f"✅ {inserted} کندل جدید از {len(rates)} برای نماد {symbol_id} ذخیره شد ({rows_per_sec:,.0f} ردیف/ثانیه).")
+    return inserted
+
+def save_candles_to_db(candles_df, symbol_id, timeframe_id, conn, batch_size=INSERT_BATCH_SIZE):
+    """ذخیره کندل‌ها در دیتابیس"""
+    columns = {name: candles_df[name].to_numpy() for name in ('open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume')}
+    columns['time'] = candles_df['timestamp'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+    inserted, rows_per_sec = write_candle_columns(conn, symbol_id, timeframe_id, columns, batch_size)
+    print(f"✅ {inserted} کندل جدید از {len(candles_df)} برای نماد {symbol_id} ذخیره شد ({rows_per_sec:,.0f} ردیف/ثانیه).")
+    return inserted
 
 # تعریف تایم‌فریم‌های استاندارد MT5
 TIMEFRAMES = {
@@ -64,42 +197,89 @@ CANDLE_COUNTS = {
     "M15": 960    # 10 روز کاری برای M15
 }
 
+# اگر True باشد فقط M1 از MT5 کشیده می‌شود و بقیه تایم‌فریم‌ها محلی از M1 ساخته می‌شوند (c_resampler)
+DERIVE_HIGHER_TIMEFRAMES = True
+
+def fetched_timeframes():
+    """تایم‌فریم‌هایی که مستقیم از MT5 کشیده می‌شوند"""
+    return ["M1"] if DERIVE_HIGHER_TIMEFRAMES else list(TIMEFRAMES)
+
 def tf_name_to_id(tf_name):
     """تبدیل اسم تایم‌فریم به ID جدول Timeframes"""
     mapping = {"M1": 1, "M5": 2, "M15": 3}
     return mapping[tf_name]
 
-def run_fetch_for_symbol(symbol, symbol_id, db_path):
+def fetch_new_rates(conn, symbol, symbol_id, tf_name, incremental=True):
+    """
+    کندل‌های لازم برای یک سری: در حالت incremental فقط بعد از آخرین زمان ذخیره شده،
+    و برای سری خالی (یا incremental=False) کل پنجره CANDLE_COUNTS.
+    """
+    last_time = get_last_candle_time(conn, symbol_id, tf_name_to_id(tf_name)) if incremental else None
+    return fetch_series(symbol, tf_name, last_time)
+
+def fetch_series(symbol, tf_name, last_time=None):
+    """دریافت یک سری از MT5 با دانستن آخرین زمان ذخیره شده (None یعنی کل پنجره)"""
+    tf_code = TIMEFRAMES[tf_name]
+    if last_time is None:
+        print(f"🚀 در حال کشیدن {CANDLE_COUNTS[tf_name]} کندل برای {symbol} در {tf_name}")
+        return fetch_rates(symbol, tf_code, CANDLE_COUNTS[tf_name])
+    print(f"🚀 در حال کشیدن کندل‌های بعد از {datetime.fromtimestamp(last_time, tz=timezone.utc):%Y-%m-%d %H:%M} برای {symbol} در {tf_name}")
+    return fetch_rates_since(symbol, tf_code, last_time)
+
+def run_fetch_for_symbol(symbol, symbol_id, db_path, incremental=True):
     """کشیدن دیتا برای هر نماد و هر تایم‌فریم"""
     conn = connect_db(db_path)
     try:
-        for tf_name, tf_code in TIMEFRAMES.items():
-            print(f"🚀 در حال کشیدن {CANDLE_COUNTS[tf_name]} کندل برای {symbol} در {tf_name}")
-            candles_df = fetch_candles(symbol, tf_code, CANDLE_COUNTS[tf_name])
-            save_candles_to_db(candles_df, symbol_id, tf_name_to_id(tf_name), conn)
+        for tf_name in fetched_timeframes():
+            rates = fetch_new_rates(conn, symbol, symbol_id, tf_name, incremental)
+            if len(rates) == 0:
+                print(f"ℹ️ کندل جدیدی برای {symbol} در {tf_name} وجود ندارد.")
+                continue
+            save_rates_to_db(rates, symbol_id, tf_name_to_id(tf_name), conn)
+        if DERIVE_HIGHER_TIMEFRAMES:
+            from e_data_ingestion.c_resampler import resample_symbol
+            resample_symbol(conn, symbol_id)
     finally:
         conn.close()
         print(f"✅ اتصال به دیتابیس بسته شد برای نماد {symbol}")
 
-def main_fetch():
+# لیست نمادها و ID ها
+SYMBOLS_TO_FETCH = {
+    "XAUUSD": 1,
+    "USDInd": 2,
+    "WTI": 3,
+    "XAGUSD": 4,
+    "EURUSD": 5,
+    "US500": 6
+}
+
+# تعداد worker های موازی دریافت؛ 0 یعنی اجرای ترتیبی نماد به نماد
+FETCH_WORKERS = 4
+
+def get_db_path():
+    """آدرس فایل دیتابیس"""
+    return DEFAULT_DB_PATH
+
+def main_fetch(incremental=True, fetch_workers=FETCH_WORKERS):
     """اجرای کامل برای همه نمادهای همبستگی"""
     connect_mt5()
 
-    # آدرس فایل دیتابیس
-    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "c_database", "smart_expert.db")
-
-    # لیست نمادها و ID ها
-    symbols_to_fetch = {
-        "XAUUSD": 1,
-        "USDInd": 2,
-        "WTI": 3,
-        "XAGUSD": 4,
-        "EURUSD": 5,
-        "US500": 6
-    }
-
-    for symbol, symbol_id in symbols_to_fetch.items():
-        run_fetch_for_symbol(symbol, symbol_id, db_path)
+    db_path = get_db_path()
+
+    if fetch_workers > 0:
+        from e_data_ingestion.b_ingestion_pipeline import IngestionPipeline
+        IngestionPipeline(db_path, SYMBOLS_TO_FETCH, fetch_workers=fetch_workers, incremental=incremental).run()
+    else:
+        for symbol, symbol_id in SYMBOLS_TO_FETCH.items():
+            run_fetch_for_symbol(symbol, symbol_id, db_path, incremental)
+
+    # اندیکاتورها فقط برای کندل‌های جدید محاسبه می‌شوند
+    from e_data_ingestion.f_indicator_engine import update_all_indicators
+    conn = connect_db(db_path)
+    try:
+        update_all_indicators(conn)
+    finally:
+        conn.close()
 
     mt5.shutdown()
     print("🔕 اتصال به متاتریدر 5 بسته شد.")
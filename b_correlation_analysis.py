@@ -2,8 +2,11 @@ import sqlite3
 import pandas as pd
 import os
 import seaborn as sns
+import numpy as np
 import matplotlib.pyplot as plt
 
+from c_database.d_candle_cache import get_candle_cache
+
 def connect_db(db_path):
     conn = sqlite3.connect(db_path)
     return conn
@@ -17,6 +20,7 @@ def load_close_prices(conn, timeframe_id):
         WHERE c.timeframe_id = ?
     """
     df = pd.read_sql_query(query, conn, params=(timeframe_id,))
+    df['time'] = pd.to_datetime(df['time'], unit='s')
     return df
 
 def pivot_close_prices(df):
@@ -25,6 +29,30 @@ def pivot_close_prices(df):
     df_pivot = df_pivot.dropna()  # حذف ردیف‌هایی که دیتای کامل ندارن
     return df_pivot
 
+def load_close_pivot_columnar(conn, store, timeframe_id):
+    """خواندن ماتریس قیمت بسته شدن از انبار ستونی memory-mapped (بدون کوئری روی candles)"""
+    symbols = conn.execute("SELECT id, symbol_name FROM symbols ORDER BY id").fetchall()
+    symbols = [(symbol_id, name) for symbol_id, name in symbols if store.length(symbol_id, timeframe_id) > 0]
+    times, closes = store.load_close_panel([symbol_id for symbol_id, _ in symbols], timeframe_id)
+    index = pd.to_datetime(times, unit='s').rename('time')
+    return pd.DataFrame(closes, index=index, columns=pd.Index([name for _, name in symbols], name='symbol_name'))
+
+def load_close_pivot_cached(conn, cache, timeframe_id, start=None, end=None):
+    """ماتریس قیمت بسته شدن از کش کندل‌ها؛ اجرای دوباره بدون کوئری و pivot از کش پاسخ داده می‌شود"""
+    series = []
+    for symbol_id, name in conn.execute("SELECT id, symbol_name FROM symbols ORDER BY id").fetchall():
+        data = cache.get(symbol_id, timeframe_id, start, end, columns=("time", "close"))
+        if len(data["time"]) > 0:
+            series.append((name, data))
+    if not series:
+        return pd.DataFrame()
+    times = series[0][1]["time"]
+    for _, data in series[1:]:
+        times = np.intersect1d(times, data["time"], assume_unique=True)
+    closes = {name: data["close"][np.searchsorted(data["time"], times)] for name, data in series}
+    index = pd.to_datetime(times, unit='s').rename('time')
+    return pd.DataFrame(closes, index=index).rename_axis(columns='symbol_name')
+
 def calculate_returns(df_pivot):
     """محاسبه returns برای هر نماد"""
     returns = df_pivot.pct_change().dropna()  # درصد تغییرات بین کندل‌ها
@@ -50,13 +78,10 @@ def main():
 
     timeframe_id = 3  # M15 تایم‌فریم
 
-    # بارگذاری دیتا
-    df = load_close_prices(conn, timeframe_id)
-    print(f"✅ {len(df)} ردیف دیتا بارگذاری شد.")
-
-    # Pivot دیتا
-    df_pivot = pivot_close_prices(df)
-    print(f"✅ دیتا Pivot شد با شکل {df_pivot.shape}.")
+    # بارگذاری دیتا از کش کندل‌ها (که از انبار ستونی یا جدول candles پر می‌شود)
+    cache = get_candle_cache(db_path)
+    df_pivot = load_close_pivot_cached(conn, cache, timeframe_id)
+    print(f"✅ دیتا بارگذاری شد با شکل {df_pivot.shape}. آمار کش: {cache.stats()}")
 
     # محاسبه returns
     df_returns = calculate_returns(df_pivot)
@@ -0,0 +1,178 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from e_data_ingestion.a_fetch_candles import (
+    DERIVE_HIGHER_TIMEFRAMES, connect_db, fetch_series, fetched_timeframes, load_high_water_marks,
+    publish_candle_writes, tf_name_to_id, write_candle_columns
+)
+from e_data_ingestion.c_resampler import SOURCE_TIMEFRAME, resample_symbol
+
+# علامت پایان صف‌ها
+_STOP = object()
+
+
+@contextmanager
+def savepoint(conn, name="series"):
+    """
+    SAVEPOINT برای یک سری داخل تراکنش گروهی: در صورت خطا فقط تغییرات همین سری برگردانده می‌شود.
+    اگر تراکنشی باز نباشد اول BEGIN زده می‌شود تا RELEASE خود تراکنش گروهی را commit نکند.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except Exception:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        raise
+    conn.execute(f"RELEASE {name}")
+
+
+class IngestionPipeline:
+    """
+    موتور دریافت موازی کندل‌ها به صورت producer/consumer.
+    چند worker کارهای (نماد، تایم‌فریم) را از MT5 می‌کشند و یک thread نویسنده که
+    تنها صاحب اتصال دیتابیس است، نتایج را دسته‌ای (group commit) ذخیره می‌کند.
+    صف نتایج محدود است تا اگر نویسنده عقب بیفتد، worker ها منتظر بمانند و حافظه ثابت بماند.
+    """
+
+    def __init__(self, db_path, symbols, timeframes=None, fetch_workers=4, queue_size=8,
+                 group_commit_rows=50000, incremental=True, pragmas=None):
+        self.db_path = db_path
+        self.symbols = symbols  # {symbol_name: symbol_id}
+        self.timeframes = list(timeframes or fetched_timeframes())
+        self.fetch_workers = fetch_workers
+        self.group_commit_rows = group_commit_rows
+        self.incremental = incremental
+        self.pragmas = pragmas
+        self.jobs = queue.Queue()
+        self.results = queue.Queue(maxsize=queue_size)
+        self.errors = []
+        self.stats = {"jobs": 0, "fetched": 0, "inserted": 0, "commits": 0, "seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def _add_error(self, symbol, tf_name, error):
+        with self._lock:
+            self.errors.append((symbol, tf_name, error))
+
+    def _fetch_worker(self, high_water_marks):
+        """دریافت کارها از صف و قرار دادن آرایه‌ها در صف نتایج"""
+        while True:
+            job = self.jobs.get()
+            if job is _STOP:
+                return
+            symbol, symbol_id, tf_name = job
+            try:
+                last_time = high_water_marks.get((symbol_id, tf_name_to_id(tf_name)))
+                rates = fetch_series(symbol, tf_name, last_time)
+            except Exception as e:
+                self._add_error(symbol, tf_name, e)
+                print(f"❌ خطا در کشیدن {symbol} در {tf_name}: {e}")
+                continue
+            if len(rates) > 0:
+                self.results.put((symbol, symbol_id, tf_name, rates))  # در صورت پر بودن صف بلاک می‌شود
+
+    def _writer(self):
+        """تنها نویسنده دیتابیس: درج هر سری و commit گروهی"""
+        conn = connect_db(self.db_path, self.pragmas)
+        pending_rows = 0
+        pending = []  # سری‌های نوشته شده در تراکنش باز که بعد از commit به انبار ستونی و کش اعلام می‌شوند
+        try:
+            while True:
+                try:
+                    item = self.results.get(timeout=0.5)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    break
+                if item is None:
+                    # صف خالی است؛ تراکنش باز را ببندیم تا داده زودتر قابل خواندن شود
+                    if pending_rows:
+                        conn.commit()
+                        publish_candle_writes(pending)
+                        self.stats["commits"] += 1
+                        pending_rows = 0
+                    continue
+
+                symbol, symbol_id, tf_name, rates = item
+                columns = {name: rates[name] for name in rates.dtype.names}
+                mark = len(pending)
+                try:
+                    with savepoint(conn):
+                        inserted, _ = write_candle_columns(
+                            conn, symbol_id, tf_name_to_id(tf_name), columns, commit=False, pending=pending
+                        )
+                except Exception as e:
+                    del pending[mark:]
+                    self._add_error(symbol, tf_name, e)
+                    print(f"❌ خطا در ذخیره {symbol} در {tf_name}: {e}")
+                    # فقط همین سری دور ریخته می‌شود؛ چون high-water mark جلو نرفته در اجرای بعدی دوباره کشیده می‌شود
+                    continue
+                self.stats["fetched"] += len(rates)
+                self.stats["inserted"] += inserted
+                pending_rows += len(rates)
+                print(f"✅ {inserted} کندل جدید از {len(rates)} برای {symbol} در {tf_name} در صف commit قرار گرفت.")
+                if DERIVE_HIGHER_TIMEFRAMES and tf_name == SOURCE_TIMEFRAME and inserted:
+                    mark = len(pending)
+                    try:
+                        with savepoint(conn):
+                            resample_symbol(conn, symbol_id, commit=False, pending=pending)
+                    except Exception as e:
+                        del pending[mark:]
+                        self._add_error(symbol, "resample", e)
+                        print(f"❌ خطا در ساخت تایم‌فریم‌های بالاتر {symbol}: {e}")
+                if pending_rows >= self.group_commit_rows:
+                    conn.commit()
+                    publish_candle_writes(pending)
+                    self.stats["commits"] += 1
+                    pending_rows = 0
+
+            if pending_rows:
+                conn.commit()
+                publish_candle_writes(pending)
+                self.stats["commits"] += 1
+        finally:
+            conn.close()
+
+    def run(self):
+        """اجرای کامل خط لوله و بازگرداندن آمار"""
+        started = time.perf_counter()
+
+        high_water_marks = {}
+        if self.incremental:
+            conn = connect_db(self.db_path, self.pragmas)
+            try:
+                high_water_marks = load_high_water_marks(conn)
+            finally:
+                conn.close()
+
+        for symbol, symbol_id in self.symbols.items():
+            for tf_name in self.timeframes:
+                self.jobs.put((symbol, symbol_id, tf_name))
+                self.stats["jobs"] += 1
+
+        workers = [
+            threading.Thread(target=self._fetch_worker, args=(high_water_marks,), name=f"fetch-{i}", daemon=True)
+            for i in range(max(1, self.fetch_workers))
+        ]
+        for _ in workers:
+            self.jobs.put(_STOP)
+        writer = threading.Thread(target=self._writer, name="candle-writer", daemon=True)
+
+        writer.start()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.results.put(_STOP)
+        writer.join()
+
+        self.stats["seconds"] = time.perf_counter() - started
+        print(
+            f"🏁 {self.stats['jobs']} سری در {self.stats['seconds']:.2f} ثانیه: "
+            f"{self.stats['inserted']} کندل جدید از {self.stats['fetched']}، {self.stats['commits']} commit، {len(self.errors)} خطا"
+        )
+        return self.stats
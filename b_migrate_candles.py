@@ -0,0 +1,158 @@
+import argparse
+import os
+import sqlite3
+import time
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from b_config.c_database_config import DEFAULT_DB_PATH
+from d_models.a_models import Candles
+
+# تعداد ردیف (بر اساس rowid جدول قدیمی) در هر تراکنش کپی
+CHUNK_SIZE = 200000
+
+# کوئری نمونه برای مقایسه سرعت قبل و بعد (همان الگوی load_close_prices)
+BENCHMARK_QUERY = """
+    SELECT s.symbol_name, c.time, c.close
+    FROM candles c
+    JOIN symbols s ON c.symbol_id = s.id
+    WHERE c.timeframe_id = ?
+"""
+
+
+def table_sql(conn, name):
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return None if row is None else row[0]
+
+
+def is_migrated(conn):
+    """
+    آیا جدول candles از قبل با time عددی و WITHOUT ROWID ساخته شده است؟
+    اگر فقط candles_new وجود داشته باشد (جابجایی نیمه‌کاره) False برمی‌گردد تا migrate_candles آن را کامل کند.
+    """
+    sql = table_sql(conn, "candles")
+    if sql is None:
+        if table_sql(conn, "candles_new") is not None:
+            return False
+        raise RuntimeError("❌ جدول candles در دیتابیس وجود ندارد.")
+    return "WITHOUT ROWID" in sql.upper()
+
+
+def swap_tables(conn):
+    """جایگزینی candles با candles_new و ساخت ایندکس‌ها در یک تراکنش (یا همه یا هیچ)"""
+    conn.execute("BEGIN")
+    try:
+        conn.execute("DROP TABLE IF EXISTS candles")
+        conn.execute("ALTER TABLE candles_new RENAME TO candles")
+        for index in Candles.__table__.indexes:
+            conn.execute(str(CreateIndex(index).compile(dialect=sqlite.dialect())))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def benchmark_range_query(conn, timeframe_id, repeat=3):
+    """بهترین زمان اجرای کوئری نمونه (ثانیه) و تعداد ردیف‌ها"""
+    best, rows = float("inf"), 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(conn.execute(BENCHMARK_QUERY, (timeframe_id,)).fetchall())
+        best = min(best, time.perf_counter() - started)
+    return best, rows
+
+
+def copy_candles(conn, chunk_size=CHUNK_SIZE):
+    """کپی تکه‌ای candles به candles_new با تبدیل time به epoch. خروجی: تعداد ردیف‌های کپی شده"""
+    ddl = str(CreateTable(Candles.__table__).compile(dialect=sqlite.dialect()))
+    conn.execute(ddl.replace("CREATE TABLE candles ", "CREATE TABLE IF NOT EXISTS candles_new ", 1))
+    conn.commit()
+
+    min_rowid, max_rowid = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM candles").fetchone()
+    copied = 0
+    if min_rowid is not None:
+        for start in range(min_rowid, max_rowid + 1, chunk_size):
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO candles_new (symbol_id, timeframe_id, time, open, high, low, close, tick_volume, spread, real_volume)
+                SELECT symbol_id, timeframe_id,
+                       CASE WHEN typeof(time) = 'text' THEN CAST(strftime('%s', time) AS INTEGER) ELSE CAST(time AS INTEGER) END,
+                       open, high, low, close, tick_volume, spread, real_volume
+                FROM candles
+                WHERE rowid >= ? AND rowid < ?
+            """, (start, start + chunk_size))
+            conn.commit()
+            copied += cursor.rowcount
+            print(f"🚚 {copied} کندل منتقل شد (rowid تا {min(start + chunk_size - 1, max_rowid)} از {max_rowid}).")
+    return copied
+
+
+def migrate_candles(db_path, chunk_size=CHUNK_SIZE, vacuum=True):
+    """
+    تبدیل درجای جدول candles به ساختار جدید:
+    time به صورت epoch عددی، خوشه‌بندی روی (symbol_id, timeframe_id, time) و ایندکس پوششی.
+    کپی به صورت تکه‌ای انجام می‌شود و چون از INSERT OR IGNORE استفاده می‌کند، اجرای دوباره
+    پس از قطع شدن امن است؛ جابجایی جدول‌ها اتمیک است و اگر اجرای قبلی بعد از حذف candles قطع شده باشد
+    همان جابجایی کامل می‌شود.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        if is_migrated(conn):
+            print("ℹ️ جدول candles قبلاً مهاجرت داده شده است.")
+            return False
+
+        if table_sql(conn, "candles") is None:
+            print("⚠️ جابجایی نیمه‌کاره از اجرای قبلی پیدا شد؛ candles_new جایگزین candles می‌شود.")
+        else:
+            copy_candles(conn, chunk_size)
+
+        swap_tables(conn)
+        conn.execute("ANALYZE candles")
+        conn.commit()
+        rows = conn.execute("SELECT COUNT(*) FROM candles").fetchone()[0]
+        print(f"✅ جدول candles با {rows} ردیف به ساختار جدید تبدیل شد.")
+    finally:
+        conn.close()
+
+    if vacuum:
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="مهاجرت جدول candles به ساختار بهینه سری زمانی")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="مسیر فایل smart_expert.db")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--no-vacuum", action="store_true", help="بدون VACUUM (فایل کوچک نمی‌شود)")
+    parser.add_argument("--benchmark-timeframe", type=int, default=3, help="timeframe_id برای مقایسه سرعت")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise FileNotFoundError(f"❌ فایل دیتابیس پیدا نشد: {args.db}")
+
+    size_before = os.path.getsize(args.db)
+    conn = sqlite3.connect(args.db)
+    # بعد از جابجایی نیمه‌کاره جدول candles برای اندازه‌گیری قبل از مهاجرت وجود ندارد
+    has_candles = table_sql(conn, "candles") is not None
+    query_before, rows = benchmark_range_query(conn, args.benchmark_timeframe) if has_candles else (None, 0)
+    conn.close()
+
+    if not migrate_candles(args.db, args.chunk_size, vacuum=not args.no_vacuum):
+        return
+
+    size_after = os.path.getsize(args.db)
+    conn = sqlite3.connect(args.db)
+    query_after, _ = benchmark_range_query(conn, args.benchmark_timeframe)
+    conn.close()
+
+    print(f"📦 حجم فایل: از {size_before / 1e6:.1f}MB به {size_after / 1e6:.1f}MB")
+    if query_before is not None:
+        print(f"⏱️ کوئری {rows} ردیفی تایم‌فریم {args.benchmark_timeframe}: از {query_before * 1000:.1f}ms به {query_after * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,96 @@
 # b_model_trainer.py
-import numpy as np
-import pandas as pd
-
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
 from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import make_pipeline
 
 # Import model configs
 from b_config.d_model_config import (
-    RANDOM_SEED, TEST_SIZE, TASK_TYPE, MODEL_TYPE,
+    RANDOM_SEED, TEST_SIZE, TASK_TYPE, MODEL_TYPE, VALIDATION_MODE,
     XGBOOST_PARAMS, LIGHTGBM_PARAMS, CATBOOST_PARAMS,
     RANDOM_FOREST_PARAMS, GRADIENT_BOOSTING_PARAMS, NEURAL_NETWORK_PARAMS,
     SVM_PARAMS, LOGISTIC_REGRESSION_PARAMS, LINEAR_REGRESSION_PARAMS, KNN_PARAMS,
-    EARLY_STOPPING_ROUNDS
+    USE_TUNED_PARAMS
 )
 
-# Import ML models
-from xgboost import XGBClassifier, XGBRegressor
-from lightgbm import LGBMClassifier, LGBMRegressor
-from catboost import CatBoostClassifier, CatBoostRegressor
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, GradientBoostingClassifier, GradientBoostingRegressor
-from sklearn.neural_network import MLPClassifier, MLPRegressor
-from sklearn.svm import SVC, SVR
-from sklearn.linear_model import LogisticRegression, LinearRegression
-from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
-
-# ===> Generate Placeholder Dataset (GLOBAL) ✅
-from sklearn.datasets import make_classification, make_regression
-
-if TASK_TYPE == "classification":
-    X, y = make_classification(
-        n_samples=1000, n_features=20, n_classes=2, random_state=RANDOM_SEED
-    )
-else:
-    X, y = make_regression(
+# ML model libraries are imported inside get_model, so only the chosen MODEL_TYPE is loaded
+from g_training.c_dataset_builder import build_dataset
+from g_training.d_walk_forward import SCALED_MODELS, cross_validate, record_model_version
+from g_training.g_model_registry import save_or_discard_artifact
+
+def make_placeholder_dataset():
+    """Synthetic dataset for smoke-testing models without market data."""
+    from sklearn.datasets import make_classification, make_regression
+    if TASK_TYPE == "classification":
+        return make_classification(
+            n_samples=1000, n_features=20, n_classes=2, random_state=RANDOM_SEED
+        )
+    return make_regression(
         n_samples=1000, n_features=20, noise=0.1, random_state=RANDOM_SEED
     )
 
+def load_market_dataset(symbol_id, timeframe_id, feature_columns=(), start=None, end=None):
+    """Real (X, y) from stored candles and the feature store."""
+    X, y, _ = build_dataset(symbol_id, timeframe_id, feature_columns=feature_columns, start=start, end=end)
+    return X, y
+
 # ===> Functions Start from Here
-def get_model():
-    if MODEL_TYPE == "xgboost":
-        return XGBClassifier(**XGBOOST_PARAMS) if TASK_TYPE == "classification" else XGBRegressor(**XGBOOST_PARAMS)
-    elif MODEL_TYPE == "lightgbm":
-        return LGBMClassifier(**LIGHTGBM_PARAMS) if TASK_TYPE == "classification" else LGBMRegressor(**LIGHTGBM_PARAMS)
-    elif MODEL_TYPE == "catboost":
-        return CatBoostClassifier(**CATBOOST_PARAMS) if TASK_TYPE == "classification" else CatBoostRegressor(**CATBOOST_PARAMS)
-    elif MODEL_TYPE == "random_forest":
-        return RandomForestClassifier(**RANDOM_FOREST_PARAMS) if TASK_TYPE == "classification" else RandomForestRegressor(**RANDOM_FOREST_PARAMS)
-    elif MODEL_TYPE == "gradient_boosting":
-        return GradientBoostingClassifier(**GRADIENT_BOOSTING_PARAMS) if TASK_TYPE == "classification" else GradientBoostingRegressor(**GRADIENT_BOOSTING_PARAMS)
-    elif MODEL_TYPE == "neural_network":
-        return MLPClassifier(**NEURAL_NETWORK_PARAMS) if TASK_TYPE == "classification" else MLPRegressor(**NEURAL_NETWORK_PARAMS)
-    elif MODEL_TYPE == "svm":
-        return SVC(**SVM_PARAMS) if TASK_TYPE == "classification" else SVR(**SVM_PARAMS)
-    elif MODEL_TYPE == "logistic_regression":
-        return LogisticRegression(**LOGISTIC_REGRESSION_PARAMS)
-    elif MODEL_TYPE == "linear_regression":
-        return LinearRegression()
-    elif MODEL_TYPE == "knn":
-        return KNeighborsClassifier(**KNN_PARAMS) if TASK_TYPE == "classification" else KNeighborsRegressor(**KNN_PARAMS)
-    else:
-        raise ValueError(f"Unsupported MODEL_TYPE: {MODEL_TYPE}")
+MODEL_PARAMS = {
+    "xgboost": XGBOOST_PARAMS,
+    "lightgbm": LIGHTGBM_PARAMS,
+    "catboost": CATBOOST_PARAMS,
+    "random_forest": RANDOM_FOREST_PARAMS,
+    "gradient_boosting": GRADIENT_BOOSTING_PARAMS,
+    "neural_network": NEURAL_NETWORK_PARAMS,
+    "svm": SVM_PARAMS,
+    "logistic_regression": LOGISTIC_REGRESSION_PARAMS,
+    "linear_regression": LINEAR_REGRESSION_PARAMS,
+    "knn": KNN_PARAMS,
+}
+
+def get_model(model_type=MODEL_TYPE, params=None, tuned=USE_TUNED_PARAMS):
+    """
+    Build a model from the config params of model_type, overridden by params (e.g. tuned values).
+    With tuned=True the latest tuned params of model_type in optimization_results sit between the two.
+    """
+    if model_type not in MODEL_PARAMS:
+        raise ValueError(f"Unsupported MODEL_TYPE: {model_type}")
+    tuned_params = None
+    if tuned:
+        # e_hyperparameter_tuning imports this module
+        from g_training.e_hyperparameter_tuning import load_best_params
+        tuned_params = load_best_params(model_type)
+    p = {**MODEL_PARAMS[model_type], **(tuned_params or {}), **(params or {})}
+    if model_type == "xgboost":
+        from xgboost import XGBClassifier, XGBRegressor
+        return XGBClassifier(**p) if TASK_TYPE == "classification" else XGBRegressor(**p)
+    elif model_type == "lightgbm":
+        from lightgbm import LGBMClassifier, LGBMRegressor
+        return LGBMClassifier(**p) if TASK_TYPE == "classification" else LGBMRegressor(**p)
+    elif model_type == "catboost":
+        from catboost import CatBoostClassifier, CatBoostRegressor
+        return CatBoostClassifier(**p) if TASK_TYPE == "classification" else CatBoostRegressor(**p)
+    elif model_type == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+        return RandomForestClassifier(**p) if TASK_TYPE == "classification" else RandomForestRegressor(**p)
+    elif model_type == "gradient_boosting":
+        from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor
+        return GradientBoostingClassifier(**p) if TASK_TYPE == "classification" else GradientBoostingRegressor(**p)
+    elif model_type == "neural_network":
+        from sklearn.neural_network import MLPClassifier, MLPRegressor
+        return MLPClassifier(**p) if TASK_TYPE == "classification" else MLPRegressor(**p)
+    elif model_type == "svm":
+        from sklearn.svm import SVC, SVR
+        return SVC(**p) if TASK_TYPE == "classification" else SVR(**p)
+    elif model_type == "logistic_regression":
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(**p)
+    elif model_type == "linear_regression":
+        from sklearn.linear_model import LinearRegression
+        return LinearRegression(**p)
+    elif model_type == "knn":
+        from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
+        return KNeighborsClassifier(**p) if TASK_TYPE == "classification" else KNeighborsRegressor(**p)
 
 def evaluate(y_true, y_pred):
     if TASK_TYPE == "classification":
@@ -74,14 +104,21 @@ def evaluate(y_true, y_pred):
         print(f"🔎 R2 Score: {r2:.4f}")
         return mse, r2
 
-def train(X, y):
-    # Split into train/test
+def train(X, y, validation="holdout", record=False):
+    """
+    Chronological holdout fit by default; pass validation=VALIDATION_MODE (or "walk_forward"/"purged_kfold")
+    for cross-validation and record=True to store the version and its artifact.
+    """
+    if validation != "holdout":
+        return train_cross_validated(X, y, validation, record)
+
+    # Chronological split: the test set is the most recent TEST_SIZE of samples (no shuffling on time series)
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=TEST_SIZE, random_state=RANDOM_SEED
+        X, y, test_size=TEST_SIZE, shuffle=False
     )
 
     # Normalize features for Neural Networks or SVMs
-    if MODEL_TYPE in ["neural_network", "svm"]:
+    if MODEL_TYPE in SCALED_MODELS:
         scaler = StandardScaler()
         X_train = scaler.fit_transform(X_train)
         X_test = scaler.transform(X_test)
@@ -99,4 +136,32 @@ def train(X, y):
 
     return model
 
+def train_cross_validated(X, y, validation=VALIDATION_MODE, record=False):
+    """Score with parallel time-series CV, fit on all samples, and with record=True store the version and its artifact."""
+    print(f"🚀 {validation} cross-validation of {MODEL_TYPE} model for {TASK_TYPE} task...")
+    summary = cross_validate(get_model, X, y, MODEL_TYPE, mode=validation)
+
+    metric = "accuracy" if TASK_TYPE == "classification" else "mse"
+    for k, fold in enumerate(summary["folds"], 1):
+        print(f"   Fold {k}: {metric}={fold[metric]:.4f} "
+              f"(train={fold['train_samples']}, test={fold['test_samples']}, fit={fold['fit_seconds']:.2f}s)")
+    print(f"📊 Mean {metric}: {summary['mean_' + metric]:.4f} ± {summary['std_' + metric]:.4f} "
+          f"({summary['wall_seconds']:.2f}s wall)")
+
+    model = get_model()
+    if MODEL_TYPE in SCALED_MODELS:
+        model = make_pipeline(StandardScaler(), model)
+    model.fit(X, y)
+    print("✅ Final model trained on all samples.")
+
+    if record:
+        try:
+            version_id = record_model_version(summary, MODEL_TYPE, params=get_model().get_params())
+            path = save_or_discard_artifact(model, version_id, MODEL_TYPE)
+            print(f"🗂️ Recorded in model_versions (id={version_id}), artifact: {path}")
+        except Exception as e:
+            # the fitted model is still returned; a failed save leaves no model_versions row behind
+            print(f"⚠️ Could not record model version: {e}")
+    return model
+
 # no need for if __name__ == "__main__" part now
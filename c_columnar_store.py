@@ -0,0 +1,157 @@
+import os
+import threading
+
+import numpy as np
+
+from b_config.c_database_config import get_columnar_store_dir
+
+# ستون‌های هر سری و نوع داده آن‌ها؛ ستون time همیشه آخر نوشته می‌شود و طول معتبر سری را تعیین می‌کند
+COLUMNS = {
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "tick_volume": np.int64,
+    "spread": np.int64,
+    "real_volume": np.int64,
+    "time": np.int64,
+}
+
+
+class ColumnarCandleStore:
+    """
+    انبار ستونی کندل‌ها: برای هر (symbol_id, timeframe_id) یک پوشه با یک فایل باینری خام
+    برای هر ستون. نوشتن فقط append است و خواندن با np.memmap بدون کپی انجام می‌شود.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _series_dir(self, symbol_id, timeframe_id):
+        return os.path.join(self.root_dir, f"{symbol_id}_{timeframe_id}")
+
+    def _column_path(self, symbol_id, timeframe_id, name):
+        return os.path.join(self._series_dir(symbol_id, timeframe_id), f"{name}.bin")
+
+    def length(self, symbol_id, timeframe_id):
+        """تعداد کندل‌های کامل ذخیره شده در سری"""
+        path = self._column_path(symbol_id, timeframe_id, "time")
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // np.dtype(COLUMNS["time"]).itemsize
+
+    def last_time(self, symbol_id, timeframe_id):
+        """آخرین زمان ذخیره شده (epoch ثانیه) یا None"""
+        n = self.length(symbol_id, timeframe_id)
+        if n == 0:
+            return None
+        return int(self._memmap(symbol_id, timeframe_id, "time", n)[n - 1])
+
+    def append(self, symbol_id, timeframe_id, columns, replace=False):
+        """
+        افزودن کندل‌های جدید به انتهای سری. فقط کندل‌های بعد از آخرین زمان ذخیره شده نوشته می‌شوند
+        (مثل INSERT OR IGNORE برای داده‌های تکراری). با replace=True انتهای سری از اولین زمان columns
+        به بعد با columns جایگزین می‌شود (بازنویسی کندل‌های آخر). خروجی: تعداد کندل نوشته شده.
+        """
+        times = np.asarray(columns["time"], dtype=np.int64)
+        with self._lock:
+            n = self.length(symbol_id, timeframe_id)
+            last = self.last_time(symbol_id, timeframe_id)
+            if replace and last is not None and len(times) and times.min() <= last:
+                n = int(np.searchsorted(self._memmap(symbol_id, timeframe_id, "time", n), times.min(), side="left"))
+                last = None
+                # اول ستون time کوتاه می‌شود تا اگر نوشتن نیمه‌کاره بماند طول معتبر سری درست باشد
+                with open(self._column_path(symbol_id, timeframe_id, "time"), "r+b") as f:
+                    f.truncate(n * np.dtype(COLUMNS["time"]).itemsize)
+            mask = times > last if last is not None else np.ones(len(times), dtype=bool)
+            if not mask.any():
+                return 0
+            order = np.argsort(times[mask], kind="stable")
+            new_times = times[mask][order]
+            keep = np.concatenate(([True], np.diff(new_times) > 0))
+
+            os.makedirs(self._series_dir(symbol_id, timeframe_id), exist_ok=True)
+            for name, dtype in COLUMNS.items():
+                values = new_times if name == "time" else np.asarray(columns[name], dtype=dtype)[mask][order]
+                path = self._column_path(symbol_id, timeframe_id, name)
+                with open(path, "ab") as f:
+                    # اگر نوشتن قبلی نیمه‌کاره مانده، ستون را به طول معتبر برگردان
+                    f.truncate(n * np.dtype(dtype).itemsize)
+                    f.write(np.ascontiguousarray(values[keep], dtype=dtype).tobytes())
+            return int(keep.sum())
+
+    def _memmap(self, symbol_id, timeframe_id, name, n):
+        return np.memmap(self._column_path(symbol_id, timeframe_id, name), dtype=COLUMNS[name], mode="r", shape=(n,))
+
+    def read(self, symbol_id, timeframe_id, columns=("time", "close"), start=None, end=None):
+        """
+        خواندن بدون کپی ستون‌های یک سری در بازه [start, end] (epoch ثانیه).
+        خروجی: دیکشنری نام ستون ← آرایه memmap (فقط خواندنی).
+        """
+        n = self.length(symbol_id, timeframe_id)
+        if n == 0:
+            return {name: np.empty(0, dtype=COLUMNS[name]) for name in columns}
+        times = self._memmap(symbol_id, timeframe_id, "time", n)
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = n if end is None else int(np.searchsorted(times, end, side="right"))
+        return {
+            name: (times if name == "time" else self._memmap(symbol_id, timeframe_id, name, n))[lo:hi]
+            for name in columns
+        }
+
+    def load_close_panel(self, symbol_ids, timeframe_id, start=None, end=None):
+        """
+        ماتریس قیمت بسته شدن نمادها روی زمان‌های مشترک (معادل pivot + dropna).
+        خروجی: (times, closes) با شکل closes برابر (len(times), len(symbol_ids)).
+        """
+        series = [self.read(symbol_id, timeframe_id, ("time", "close"), start, end) for symbol_id in symbol_ids]
+        if not series:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0))
+        common = series[0]["time"]
+        for s in series[1:]:
+            common = np.intersect1d(common, s["time"], assume_unique=True)
+        closes = np.empty((len(common), len(series)), dtype=np.float64)
+        for j, s in enumerate(series):
+            closes[:, j] = s["close"][np.searchsorted(s["time"], common)]
+        return np.asarray(common), closes
+
+    def backfill_from_db(self, conn, chunk_size=500000):
+        """پر کردن انبار از جدول candles برای کندل‌هایی که هنوز در انبار نیستند"""
+        total = 0
+        series = conn.execute("SELECT DISTINCT symbol_id, timeframe_id FROM candles").fetchall()
+        for symbol_id, timeframe_id in series:
+            while True:
+                last = self.last_time(symbol_id, timeframe_id)
+                rows = conn.execute("""
+                    SELECT time, open, high, low, close,
+                           COALESCE(tick_volume, 0), COALESCE(spread, 0), COALESCE(real_volume, 0)
+                    FROM candles
+                    WHERE symbol_id = ? AND timeframe_id = ? AND time > ?
+                    ORDER BY time
+                    LIMIT ?
+                """, (symbol_id, timeframe_id, -1 if last is None else last, chunk_size)).fetchall()
+                if not rows:
+                    break
+                data = np.array(rows, dtype=np.float64)
+                names = ("time", "open", "high", "low", "close", "tick_volume", "spread", "real_volume")
+                total += self.append(symbol_id, timeframe_id, {name: data[:, i] for i, name in enumerate(names)})
+        print(f"✅ {total} کندل به انبار ستونی اضافه شد.")
+        return total
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_columnar_store():
+    """انبار ستونی پیکربندی شده (COLUMNAR_STORE_DIR) یا None اگر غیرفعال باشد"""
+    global _store
+    root_dir = get_columnar_store_dir()
+    if root_dir is None:
+        return None
+    with _store_lock:
+        if _store is None or _store.root_dir != root_dir:
+            _store = ColumnarCandleStore(root_dir)
+    return _store
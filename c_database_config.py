@@ -30,5 +30,24 @@ else:
 
     SQLALCHEMY_DATABASE_URL = f"sqlite:///{absolute_db_path}"
 
+# مسیر فایل SQLite برای ماژول‌های تحلیل و آموزش که مستقیم با sqlite3 کار می‌کنند
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, "..", os.getenv("SQLITE_DB_FILE", "c_database/smart_expert.db")).replace("\\", "/")
+
 def get_database_url():
     return SQLALCHEMY_DATABASE_URL
+
+# انبار ستونی memory-mapped کندل‌ها برای خواندن سریع تحلیل‌ها (خالی = غیرفعال)
+COLUMNAR_STORE_DIR = os.getenv("COLUMNAR_STORE_DIR", "")
+if COLUMNAR_STORE_DIR and not os.path.isabs(COLUMNAR_STORE_DIR):
+    COLUMNAR_STORE_DIR = os.path.join(BASE_DIR, "..", COLUMNAR_STORE_DIR).replace("\\", "/")
+
+def get_columnar_store_dir():
+    return COLUMNAR_STORE_DIR or None
+
+# انبار ویژگی‌های عریض (float32، یک ماتریس برای هر نماد/تایم‌فریم) برای ساخت داده آموزش
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "c_database/feature_store")
+if not os.path.isabs(FEATURE_STORE_DIR):
+    FEATURE_STORE_DIR = os.path.join(BASE_DIR, "..", FEATURE_STORE_DIR).replace("\\", "/")
+
+def get_feature_store_dir():
+    return FEATURE_STORE_DIR
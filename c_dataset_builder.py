@@ -0,0 +1,208 @@
+# c_dataset_builder.py
+import sqlite3
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from b_config.c_database_config import DEFAULT_DB_PATH
+from b_config.d_model_config import (
+    TASK_TYPE, LOOKBACK, HORIZON, LABEL_THRESHOLD, DATASET_CHUNK_MB
+)
+from c_database.c_columnar_store import get_columnar_store
+from c_database.e_feature_store import get_feature_store
+
+# Per-bar features derived from the candles themselves
+BAR_FEATURES = ["log_return", "hl_range"]
+
+# Feature-store columns measured in price units; they are fed to the model relative to close
+PRICE_LEVEL_PREFIXES = ("sma_", "ema_", "bb_")
+
+
+def _candle_dict(data):
+    return {"time": data[:, 0].astype(np.int64), "high": data[:, 1], "low": data[:, 2], "close": data[:, 3]}
+
+
+def _stored_series(symbol_id, timeframe_id):
+    """The columnar store if it holds this series, else None (SQL path)."""
+    store = get_columnar_store()
+    if store is not None and store.length(symbol_id, timeframe_id) > 0:
+        return store
+    return None
+
+
+def load_candle_columns(symbol_id, timeframe_id, start=None, end=None, db_path=DEFAULT_DB_PATH):
+    """Return time/high/low/close for a series (memory-mapped when the columnar store is enabled)."""
+    store = _stored_series(symbol_id, timeframe_id)
+    if store is not None:
+        return store.read(symbol_id, timeframe_id, ("time", "high", "low", "close"), start, end)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT time, high, low, close FROM candles
+            WHERE symbol_id = ? AND timeframe_id = ? AND time >= ? AND time <= ?
+            ORDER BY time
+        """, (symbol_id, timeframe_id, -1 if start is None else start, 2 ** 62 if end is None else end)).fetchall()
+    finally:
+        conn.close()
+    return _candle_dict(np.array(rows, dtype=np.float64).reshape(-1, 4))
+
+
+def iter_candle_columns(symbol_id, timeframe_id, start=None, end=None, chunk_bars=None, overlap=0,
+                        db_path=DEFAULT_DB_PATH):
+    """
+    Yield time/high/low/close of a series in time-bounded chunks.
+
+    The columnar store (or chunk_bars=None) gives the whole series at once. The SQL path reads
+    chunk_bars new rows per query, keyed on the last time read, and every later chunk starts
+    with the last `overlap` bars of the previous one.
+    """
+    if chunk_bars is None or _stored_series(symbol_id, timeframe_id) is not None:
+        yield load_candle_columns(symbol_id, timeframe_id, start, end, db_path)
+        return
+
+    conn = sqlite3.connect(db_path)
+    try:
+        lower, operator = (-1 if start is None else start), ">="
+        upper = 2 ** 62 if end is None else end
+        carry = np.empty((0, 4))
+        while True:
+            rows = conn.execute(f"""
+                SELECT time, high, low, close FROM candles
+                WHERE symbol_id = ? AND timeframe_id = ? AND time {operator} ? AND time <= ?
+                ORDER BY time LIMIT ?
+            """, (symbol_id, timeframe_id, lower, upper, chunk_bars)).fetchall()
+            if not rows:
+                break
+            data = np.concatenate((carry, np.array(rows, dtype=np.float64)))
+            yield _candle_dict(data)
+            if len(rows) < chunk_bars:
+                break
+            lower, operator = rows[-1][0], ">"
+            carry = data[-overlap:] if overlap else data[:0]
+    finally:
+        conn.close()
+
+
+def count_candles(symbol_id, timeframe_id, start=None, end=None, db_path=DEFAULT_DB_PATH):
+    """Number of bars of a series in [start, end], without loading them."""
+    store = _stored_series(symbol_id, timeframe_id)
+    if store is not None:
+        return len(store.read(symbol_id, timeframe_id, ("time",), start, end)["time"])
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("""
+            SELECT COUNT(*) FROM candles
+            WHERE symbol_id = ? AND timeframe_id = ? AND time >= ? AND time <= ?
+        """, (symbol_id, timeframe_id, -1 if start is None else start, 2 ** 62 if end is None else end)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _bar_matrix(symbol_id, timeframe_id, candles, lo, hi, feature_columns):
+    """
+    Per-bar feature rows for candles[lo:hi] as float32 (bars x features).
+    Row 0 only supplies the previous close, so its log_return is NaN.
+    """
+    close = np.asarray(candles["close"][lo:hi], dtype=np.float64)
+    high = np.asarray(candles["high"][lo:hi], dtype=np.float64)
+    low = np.asarray(candles["low"][lo:hi], dtype=np.float64)
+    bars = np.empty((hi - lo, len(BAR_FEATURES) + len(feature_columns)), dtype=np.float32)
+    bars[0, 0] = np.nan
+    bars[1:, 0] = np.log(close[1:] / close[:-1])
+    bars[:, 1] = (high - low) / close
+    if feature_columns:
+        # point-in-time join: the latest feature row at or before each candle
+        features = get_feature_store().read_asof(symbol_id, timeframe_id, candles["time"][lo:hi], feature_columns)
+        for j, name in enumerate(feature_columns):
+            if name.startswith(PRICE_LEVEL_PREFIXES):
+                features[:, j] = features[:, j] / close - 1.0
+        bars[:, len(BAR_FEATURES):] = features
+    return bars
+
+
+def _iter_samples(symbol_id, timeframe_id, candles, lookback, horizon, feature_columns, chunk_rows, task_type):
+    """(X, y, times) chunks for every sample of candles that has lookback bars behind it and horizon bars ahead."""
+    n = len(candles["time"])
+    width = lookback * (len(BAR_FEATURES) + len(feature_columns))
+    times = candles["time"]
+    for a in range(lookback, n - horizon, chunk_rows):
+        b = min(a + chunk_rows, n - horizon)
+        bars = _bar_matrix(symbol_id, timeframe_id, candles, a - lookback, b, feature_columns)[1:]
+        windows = sliding_window_view(bars, lookback, axis=0)  # (samples, features, lookback) view
+        valid = ~sliding_window_view(np.isnan(bars).any(axis=1), lookback).any(axis=1)
+
+        X = windows.transpose(0, 2, 1)[valid].reshape(-1, width)  # the only copy
+        close = np.asarray(candles["close"][a:b + horizon], dtype=np.float64)
+        forward = (close[horizon:] / close[:-horizon] - 1.0)[valid]
+        if task_type == "classification":
+            y = (forward > LABEL_THRESHOLD).astype(np.int8)
+        else:
+            y = forward.astype(np.float32)
+        yield X, y, np.asarray(times[a:b])[valid]
+
+
+def iter_dataset(symbol_id, timeframe_id, lookback=LOOKBACK, horizon=HORIZON, feature_columns=(),
+                 start=None, end=None, chunk_rows=None, db_path=DEFAULT_DB_PATH, task_type=TASK_TYPE, candles=None):
+    """
+    Stream (X, y, times) chunks for one series.
+
+    Sample t uses bars t-lookback+1..t and is labelled with the forward return
+    close[t+horizon] / close[t] - 1 (thresholded for classification). Windows are
+    sliding_window_view views over the per-bar matrix, so only the flattened X chunk
+    (float32, bars oldest to newest, features within each bar) is materialised.
+    Windows touching a NaN feature (indicator warm-up) are skipped.
+
+    Without candles, the SQL path reads chunk_rows bars at a time, overlapping by
+    lookback + horizon bars so no sample is lost or repeated at a chunk edge.
+    """
+    feature_columns = list(feature_columns)
+    width = lookback * (len(BAR_FEATURES) + len(feature_columns))
+    if chunk_rows is None:
+        chunk_rows = max(1, DATASET_CHUNK_MB * 1024 * 1024 // (width * np.dtype(np.float32).itemsize))
+
+    if candles is not None:
+        chunks = [candles]
+    else:
+        chunks = iter_candle_columns(symbol_id, timeframe_id, start, end, chunk_rows, lookback + horizon, db_path)
+    for chunk in chunks:
+        yield from _iter_samples(symbol_id, timeframe_id, chunk, lookback, horizon, feature_columns, chunk_rows,
+                                 task_type)
+
+
+def feature_names(feature_columns=(), lookback=LOOKBACK):
+    """Column names of X in build/iter order, e.g. 'log_return_t-0' for the newest bar."""
+    per_bar = BAR_FEATURES + list(feature_columns)
+    return [f"{name}_t-{lag}" for lag in range(lookback - 1, -1, -1) for name in per_bar]
+
+
+def build_dataset(symbol_id, timeframe_id, lookback=LOOKBACK, horizon=HORIZON, feature_columns=(),
+                  start=None, end=None, out_path=None, db_path=DEFAULT_DB_PATH, task_type=TASK_TYPE):
+    """
+    Build the full (X, y, times) for one series, ready for train(X, y).
+
+    Candles are streamed (see iter_dataset), and with out_path X is written chunk by chunk
+    into a .npy memmap on disk, so peak memory stays around two chunks (2 x DATASET_CHUNK_MB)
+    regardless of history length.
+    """
+    total = max(count_candles(symbol_id, timeframe_id, start, end, db_path) - lookback - horizon, 0)
+    width = lookback * (len(BAR_FEATURES) + len(feature_columns))
+    if out_path is not None:
+        X = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32, shape=(total, width))
+    else:
+        X = np.empty((total, width), dtype=np.float32)
+    y = np.empty(total, dtype=np.int8 if task_type == "classification" else np.float32)
+    times = np.empty(total, dtype=np.int64)
+
+    count = 0
+    for X_chunk, y_chunk, t_chunk in iter_dataset(symbol_id, timeframe_id, lookback, horizon, feature_columns,
+                                                  start, end, db_path=db_path, task_type=task_type):
+        X[count:count + len(X_chunk)] = X_chunk
+        y[count:count + len(y_chunk)] = y_chunk
+        times[count:count + len(t_chunk)] = t_chunk
+        count += len(X_chunk)
+
+    if out_path is not None:
+        X.flush()
+    print(f"📦 Dataset built: {count} samples x {width} features (lookback={lookback}, horizon={horizon})")
+    return X[:count], y[:count], times[:count]
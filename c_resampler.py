@@ -0,0 +1,134 @@
+import numpy as np
+
+from e_data_ingestion.a_fetch_candles import tf_name_to_id, write_candle_columns
+
+# تایم‌فریم‌هایی که به صورت محلی از کندل‌های M1 ساخته می‌شوند: نام ← (دقیقه، نام نمایشی)
+RESAMPLED_TIMEFRAMES = {
+    "M5": (5, "5 Minutes"),
+    "M15": (15, "15 Minutes"),
+    "H1": (60, "1 Hour"),
+    "H4": (240, "4 Hours"),
+    "D1": (1440, "1 Day"),
+}
+
+SOURCE_TIMEFRAME = "M1"
+
+BAR_VALUE_COLUMNS = ("open", "high", "low", "close", "tick_volume", "spread", "real_volume")
+
+
+def ensure_timeframe(conn, tf_name, minutes, display_name=None, commit=True):
+    """ID تایم‌فریم از جدول timeframes؛ اگر وجود نداشته باشد ساخته می‌شود (با commit=False در تراکنش فراخواننده)"""
+    row = conn.execute("SELECT id FROM timeframes WHERE timeframe_name = ?", (tf_name,)).fetchone()
+    if row is not None:
+        return row[0]
+    cursor = conn.execute(
+        "INSERT INTO timeframes (timeframe_name, minutes, display_name, is_active) VALUES (?, ?, ?, 1)",
+        (tf_name, minutes, display_name)
+    )
+    if commit:
+        conn.commit()
+    print(f"✅ تایم‌فریم {tf_name} به جدول timeframes اضافه شد.")
+    return cursor.lastrowid
+
+
+def aggregate_bars(columns, minutes, source_minutes=1):
+    """
+    ساخت کندل‌های تایم‌فریم بالاتر از ستون‌های مرتب M1 (برداری با reduceat).
+    فقط کندل‌های بسته شده برگردانده می‌شوند: هر کندل به جز آخری، و آخری فقط اگر
+    دقیقه پایانی آن رسیده باشد. spread مثل MT5 کمترین spread داخل کندل است.
+    """
+    times = np.asarray(columns["time"], dtype=np.int64)
+    if len(times) == 0:
+        return None
+    step = minutes * 60
+    buckets = times - times % step
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(times)]))
+    bars = {
+        "time": buckets[starts],
+        "open": np.asarray(columns["open"])[starts],
+        "high": np.maximum.reduceat(np.asarray(columns["high"]), starts),
+        "low": np.minimum.reduceat(np.asarray(columns["low"]), starts),
+        "close": np.asarray(columns["close"])[ends - 1],
+        "tick_volume": np.add.reduceat(np.asarray(columns["tick_volume"]), starts),
+        "spread": np.minimum.reduceat(np.asarray(columns["spread"]), starts),
+        "real_volume": np.add.reduceat(np.asarray(columns["real_volume"]), starts),
+    }
+    # کندل آخر اگر هنوز بسته نشده کنار گذاشته می‌شود (بعد از reduceat تا بازه‌ها درست بمانند)
+    if times[-1] < buckets[-1] + step - source_minutes * 60:
+        bars = {name: values[:-1] for name, values in bars.items()}
+    if len(bars["time"]) == 0:
+        return None
+    return bars
+
+
+def load_source_columns(conn, symbol_id, since):
+    """خواندن کندل‌های M1 از زمان since به بعد به صورت ستونی"""
+    rows = conn.execute("""
+        SELECT time, open, high, low, close,
+               COALESCE(tick_volume, 0), COALESCE(spread, 0), COALESCE(real_volume, 0)
+        FROM candles
+        WHERE symbol_id = ? AND timeframe_id = ? AND time >= ?
+        ORDER BY time
+    """, (symbol_id, tf_name_to_id(SOURCE_TIMEFRAME), since)).fetchall()
+    if not rows:
+        return None
+    time_col, open_col, high_col, low_col, close_col, tick_col, spread_col, real_col = zip(*rows)
+    return {
+        "time": np.array(time_col, dtype=np.int64),
+        "open": np.array(open_col, dtype=np.float64),
+        "high": np.array(high_col, dtype=np.float64),
+        "low": np.array(low_col, dtype=np.float64),
+        "close": np.array(close_col, dtype=np.float64),
+        "tick_volume": np.array(tick_col, dtype=np.int64),
+        "spread": np.array(spread_col, dtype=np.int64),
+        "real_volume": np.array(real_col, dtype=np.int64),
+    }
+
+
+def resample_series(conn, symbol_id, tf_name, commit=True, pending=None):
+    """
+    ساخت افزایشی یک تایم‌فریم بالاتر برای یک نماد: فقط کندل‌های M1 از شروع آخرین کندل
+    ساخته شده به بعد خوانده و تجمیع می‌شوند. آخرین کندل موجود هم دوباره محاسبه و اگر تغییر کرده
+    باشد (مثلاً با داده ناقص M1 ساخته شده بود) بازنویسی می‌شود. خروجی: تعداد کندل جدید یا بازنویسی شده.
+    pending مثل write_candle_columns است: با commit=False سری‌های نوشته شده برای publish بعد از commit جمع می‌شوند.
+    """
+    minutes, display_name = RESAMPLED_TIMEFRAMES[tf_name]
+    timeframe_id = ensure_timeframe(conn, tf_name, minutes, display_name, commit=commit)
+    last = conn.execute(
+        "SELECT MAX(time) FROM candles WHERE symbol_id = ? AND timeframe_id = ?", (symbol_id, timeframe_id)
+    ).fetchone()[0]
+    since = 0 if last is None else int(last)
+
+    source = load_source_columns(conn, symbol_id, since)
+    if source is None:
+        return 0
+    bars = aggregate_bars(source, minutes)
+    if bars is not None and last is None and source["time"][0] > bars["time"][0]:
+        # اولین کندل از وسط بازه شروع شده و ناقص است
+        bars = {name: values[1:] for name, values in bars.items()}
+    if bars is not None and last is not None and bars["time"][0] == since and _unchanged(conn, symbol_id, timeframe_id, bars):
+        bars = {name: values[1:] for name, values in bars.items()}
+    if bars is None or len(bars["time"]) == 0:
+        return 0
+    inserted, _ = write_candle_columns(conn, symbol_id, timeframe_id, bars, commit=commit, replace=True, pending=pending)
+    return inserted
+
+
+def _unchanged(conn, symbol_id, timeframe_id, bars):
+    """آیا اولین کندل bars با کندل ذخیره شده همان زمان یکسان است؟"""
+    stored = conn.execute(f"""
+        SELECT {", ".join(BAR_VALUE_COLUMNS)} FROM candles WHERE symbol_id = ? AND timeframe_id = ? AND time = ?
+    """, (symbol_id, timeframe_id, int(bars["time"][0]))).fetchone()
+    return stored is not None and all(
+        stored_value == bars[name][0].item() for stored_value, name in zip(stored, BAR_VALUE_COLUMNS)
+    )
+
+
+def resample_symbol(conn, symbol_id, timeframes=None, commit=True, pending=None):
+    """ساخت همه تایم‌فریم‌های بالاتر یک نماد از M1"""
+    result = {}
+    for tf_name in timeframes or RESAMPLED_TIMEFRAMES:
+        result[tf_name] = resample_series(conn, symbol_id, tf_name, commit=commit, pending=pending)
+    print(f"🧮 کندل‌های ساخته شده از M1 برای نماد {symbol_id}: {result}")
+    return result
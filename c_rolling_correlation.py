@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+# هر چند به‌روزرسانی یک بار آمارها از روی بافر پنجره دوباره ساخته می‌شوند تا خطای float انباشته نشود
+RECOMPUTE_EVERY = 10000
+
+# طول بلوک در update_many (برای محدود کردن حافظه و خطای cumsum)
+BLOCK_SIZE = 4096
+
+
+class RollingCorrelationEngine:
+    """
+    همبستگی غلتان افزایشی برای همه جفت‌نمادها (ماتریس N×N).
+    آمارهای کافی پنجره (مجموع‌ها و ماتریس حاصل‌ضرب‌های متقابل) نگه داشته می‌شوند و هر بار جدید
+    با یک به‌روزرسانی O(N²) اعمال می‌شود، بدون پیمایش دوباره تاریخچه.
+    مثل pandas rolling(window).corr تا پر شدن پنجره مقدار NaN برمی‌گرداند.
+    """
+
+    def __init__(self, symbols, window=100, keep_history=True):
+        self.symbols = list(symbols)
+        self.n = len(self.symbols)
+        self.window = window
+        self.keep_history = keep_history
+        self._buffer = np.zeros((window, self.n))  # بافر حلقوی آخرین returnها
+        self._pos = 0
+        self._count = 0
+        self._sum = np.zeros(self.n)
+        self._cross = np.zeros((self.n, self.n))  # قطر آن مجموع مربعات است
+        self._since_recompute = 0
+        self._times = []
+        self._history = []
+
+    def update(self, returns, time=None):
+        """افزودن یک بردار return (طول N) و برگرداندن ماتریس همبستگی فعلی"""
+        x = np.asarray(returns, dtype=np.float64)
+        if self._count == self.window:
+            old = self._buffer[self._pos]
+            self._sum -= old
+            self._cross -= np.outer(old, old)
+        else:
+            self._count += 1
+        self._buffer[self._pos] = x
+        self._pos = (self._pos + 1) % self.window
+        self._sum += x
+        self._cross += np.outer(x, x)
+
+        self._since_recompute += 1
+        if self._since_recompute >= RECOMPUTE_EVERY:
+            self._recompute()
+
+        corr = self.current()
+        if self.keep_history:
+            self._times.append(time)
+            self._history.append(corr)
+        return corr
+
+    def update_many(self, returns, times=None):
+        """
+        افزودن دسته‌ای returnها (شکل T×N) به صورت برداری با cumsum روی بلوک‌ها.
+        خروجی: آرایه T×N×N ماتریس‌های همبستگی.
+        """
+        returns = np.asarray(returns, dtype=np.float64)
+        times = list(times) if times is not None else [None] * len(returns)
+        results = [self._update_block(returns[i:i + BLOCK_SIZE], times[i:i + BLOCK_SIZE])
+                   for i in range(0, len(returns), BLOCK_SIZE)]
+        if not results:
+            return np.empty((0, self.n, self.n))
+        return np.concatenate(results)
+
+    def _update_block(self, block, times):
+        w = self.window
+        previous = self._window_rows()
+        data = np.concatenate((previous, block))
+        k = len(previous)
+
+        csum = np.concatenate((np.zeros((1, self.n)), np.cumsum(data, axis=0)))
+        ccross = np.concatenate((np.zeros((1, self.n, self.n)), np.cumsum(np.einsum('ti,tj->tij', data, data), axis=0)))
+        ends = np.arange(k + 1, len(data) + 1)
+        starts = np.maximum(ends - w, 0)
+        counts = ends - starts
+        sums = csum[ends] - csum[starts]
+        cross = ccross[ends] - ccross[starts]
+        corr = _correlation(counts, sums, cross)
+        corr[counts < w] = np.nan
+
+        # وضعیت پس از بلوک از روی آخرین پنجره ساخته می‌شود
+        tail = data[-w:]
+        self._buffer[:len(tail)] = tail
+        self._count = len(tail)
+        self._pos = self._count % w
+        self._recompute()
+
+        if self.keep_history:
+            self._times.extend(times)
+            self._history.extend(corr)
+        return corr
+
+    def _window_rows(self):
+        """ردیف‌های داخل پنجره به ترتیب زمان"""
+        if self._count < self.window:
+            return self._buffer[:self._count].copy()
+        return np.roll(self._buffer, -self._pos, axis=0)
+
+    def _recompute(self):
+        rows = self._buffer[:self._count]
+        self._sum = rows.sum(axis=0)
+        self._cross = rows.T @ rows
+        self._since_recompute = 0
+
+    def current(self):
+        """ماتریس همبستگی پنجره فعلی (N×N)"""
+        if self._count < self.window:
+            return np.full((self.n, self.n), np.nan)
+        return _correlation(np.array([self._count]), self._sum[None], self._cross[None])[0]
+
+    def current_frame(self):
+        return pd.DataFrame(self.current(), index=self.symbols, columns=self.symbols)
+
+    def history(self, start=None, end=None):
+        """ماتریس‌های تاریخی ثبت شده: (times, آرایه T×N×N) در بازه [start, end]"""
+        times = np.array(self._times)
+        matrices = np.array(self._history).reshape(-1, self.n, self.n)
+        mask = np.ones(len(times), dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        return times[mask], matrices[mask]
+
+    def pair_series(self, symbol1, symbol2):
+        """سری زمانی همبستگی غلتان یک جفت نماد (مثل calculate_rolling_correlation)"""
+        i, j = self.symbols.index(symbol1), self.symbols.index(symbol2)
+        times, matrices = self.history()
+        return pd.Series(matrices[:, i, j], index=times, name=f"{symbol1}~{symbol2}")
+
+
+def _correlation(counts, sums, cross):
+    """همبستگی از آمارهای کافی: (nΣxy - ΣxΣy) / sqrt((nΣx² - (Σx)²)(nΣy² - (Σy)²))"""
+    n = counts[:, None, None].astype(np.float64)
+    cov = n * cross - sums[:, :, None] * sums[:, None, :]
+    var = np.clip(np.diagonal(cov, axis1=1, axis2=2), 0, None)
+    denom = np.sqrt(var[:, :, None] * var[:, None, :])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov / denom
+    corr[denom == 0] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def from_returns(df_returns, window=100):
+    """ساخت موتور از DataFrame returnها (خروجی calculate_returns) با تاریخچه کامل"""
+    engine = RollingCorrelationEngine(df_returns.columns, window=window)
+    engine.update_many(df_returns.to_numpy(), df_returns.index)
+    return engine
+
+
+def compare_with_pandas(df_returns, window=100):
+    """بیشترین اختلاف مطلق با pandas rolling().corr() روی همه جفت‌ها"""
+    engine = from_returns(df_returns, window)
+    _, matrices = engine.history()
+    max_diff = 0.0
+    for i, s1 in enumerate(df_returns.columns):
+        for j, s2 in enumerate(df_returns.columns):
+            if j <= i:
+                continue
+            expected = df_returns[s1].rolling(window).corr(df_returns[s2]).to_numpy()
+            both = ~np.isnan(expected) & ~np.isnan(matrices[:, i, j])
+            if (np.isnan(expected) != np.isnan(matrices[:, i, j])).any():
+                return np.inf
+            if both.any():
+                max_diff = max(max_diff, float(np.abs(expected[both] - matrices[both, i, j]).max()))
+    return max_diff
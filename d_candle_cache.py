@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from c_database.c_columnar_store import get_columnar_store
+
+CANDLE_COLUMNS = ("time", "open", "high", "low", "close", "tick_volume", "spread", "real_volume")
+
+# سقف حافظه پیش‌فرض کش (بایت)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def sql_loader(db_path):
+    """loader پیش‌فرض: خواندن یک بازه از جدول candles (از انبار ستونی اگر فعال باشد)"""
+    def load(symbol_id, timeframe_id, start, end):
+        store = get_columnar_store()
+        if store is not None and store.length(symbol_id, timeframe_id) > 0:
+            data = store.read(symbol_id, timeframe_id, CANDLE_COLUMNS, start, end)
+            return {name: np.array(values) for name, values in data.items()}
+
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute("""
+                SELECT time, open, high, low, close,
+                       COALESCE(tick_volume, 0), COALESCE(spread, 0), COALESCE(real_volume, 0)
+                FROM candles
+                WHERE symbol_id = ? AND timeframe_id = ? AND time >= ? AND time <= ?
+                ORDER BY time
+            """, (symbol_id, timeframe_id, -1 if start is None else start, 2 ** 62 if end is None else end)).fetchall()
+        finally:
+            conn.close()
+        data = np.array(rows, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS))
+        return {
+            name: data[:, i].astype(np.int64) if name in ("time", "tick_volume", "spread", "real_volume") else data[:, i].copy()
+            for i, name in enumerate(CANDLE_COLUMNS)
+        }
+    return load
+
+
+class _Entry:
+    __slots__ = ("start", "end", "columns", "nbytes")
+
+    def __init__(self, start, end, columns):
+        self.start = start
+        self.end = end  # None یعنی بازه باز تا آخرین کندل (با نوشتن کندل جدید گسترش می‌یابد)
+        self.columns = columns
+        self.nbytes = sum(values.nbytes for values in columns.values())
+
+    def covers(self, start, end):
+        if self.start is not None and (start is None or start < self.start):
+            return False
+        if self.end is None:
+            return True
+        return end is not None and end <= self.end
+
+
+class CandleCache:
+    """
+    کش درون‌پردازه‌ای کندل‌ها با کلید (symbol_id, timeframe_id, start, end).
+    - حافظه محدود با حذف LRU
+    - درخواست زیربازه از یک بازه بزرگ‌تر کش شده بدون کوئری (برش view) پاسخ داده می‌شود
+    - با نوشتن کندل جدید (on_candles_written) ورودی‌های باز گسترش و ورودی‌های متأثر حذف می‌شوند
+    """
+
+    def __init__(self, loader, max_bytes=DEFAULT_MAX_BYTES):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (symbol_id, timeframe_id, start, end) -> _Entry
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_held = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes_held": self.bytes_held,
+            }
+
+    def get(self, symbol_id, timeframe_id, start=None, end=None, columns=CANDLE_COLUMNS):
+        """
+        کندل‌های یک سری در بازه [start, end] (epoch ثانیه؛ None یعنی بدون محدودیت).
+        آرایه‌های برگشتی فقط خواندنی هستند و ممکن است view روی داده کش باشند.
+        """
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key[0] == symbol_id and key[1] == timeframe_id and entry.covers(start, end):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._slice(entry, start, end, columns)
+            self.misses += 1
+
+        data = self.loader(symbol_id, timeframe_id, start, end)
+        entry = _Entry(start, end, {name: self._readonly(np.asarray(data[name])) for name in CANDLE_COLUMNS})
+        with self._lock:
+            self._put((symbol_id, timeframe_id, start, end), entry)
+            return self._slice(entry, start, end, columns)
+
+    def on_candles_written(self, symbol_id, timeframe_id, columns):
+        """به‌روزرسانی کش پس از نوشتن کندل‌های جدید در مسیر ingestion"""
+        times = np.asarray(columns["time"], dtype=np.int64)
+        if len(times) == 0:
+            return
+        first, last = int(times.min()), int(times.max())
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == symbol_id and k[1] == timeframe_id]:
+                entry = self._entries[key]
+                cached_times = entry.columns["time"]
+                cached_last = int(cached_times[-1]) if len(cached_times) else None
+                if entry.end is None and (cached_last is None or first > cached_last):
+                    # ورودی باز: کندل‌های جدید فقط به انتها اضافه می‌شوند
+                    order = np.argsort(times, kind="stable")
+                    extended = {
+                        name: self._readonly(np.concatenate((entry.columns[name], np.asarray(columns[name])[order].astype(entry.columns[name].dtype))))
+                        for name in CANDLE_COLUMNS
+                    }
+                    if entry.start is not None:
+                        keep = extended["time"] >= entry.start
+                        extended = {name: values[keep] for name, values in extended.items()}
+                    self.bytes_held -= entry.nbytes
+                    self._entries[key] = _Entry(entry.start, None, extended)
+                    self.bytes_held += self._entries[key].nbytes
+                elif (entry.end is None or first <= entry.end) and (entry.start is None or last >= entry.start):
+                    # کندل‌ها وسط بازه کش شده نوشته شده‌اند؛ ورودی دیگر معتبر نیست
+                    self.bytes_held -= entry.nbytes
+                    del self._entries[key]
+            self._evict()
+
+    def invalidate(self, symbol_id=None, timeframe_id=None):
+        """حذف ورودی‌های یک سری (یا کل کش)"""
+        with self._lock:
+            for key in list(self._entries):
+                if (symbol_id is None or key[0] == symbol_id) and (timeframe_id is None or key[1] == timeframe_id):
+                    self.bytes_held -= self._entries.pop(key).nbytes
+
+    def _put(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes_held -= old.nbytes
+        self._entries[key] = entry
+        self.bytes_held += entry.nbytes
+        self._evict()
+
+    def _evict(self):
+        while self.bytes_held > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.bytes_held -= entry.nbytes
+            self.evictions += 1
+
+    @staticmethod
+    def _readonly(values):
+        values = np.ascontiguousarray(values)
+        values.flags.writeable = False
+        return values
+
+    @staticmethod
+    def _slice(entry, start, end, columns):
+        times = entry.columns["time"]
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+        return {name: entry.columns[name][lo:hi] for name in columns}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_candle_cache(db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+    """کش مشترک پردازه؛ اولین فراخوانی باید db_path را بدهد"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if db_path is None:
+                raise ValueError("❌ برای ساخت کش کندل مسیر دیتابیس لازم است.")
+            _cache = CandleCache(sql_loader(db_path), max_bytes)
+    return _cache
+
+
+def notify_candles_written(symbol_id, timeframe_id, columns):
+    """فراخوانی از مسیر نوشتن کندل؛ اگر کشی ساخته نشده باشد کاری انجام نمی‌دهد"""
+    if _cache is not None:
+        _cache.on_candles_written(symbol_id, timeframe_id, columns)
@@ -0,0 +1,163 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")  # بدون نمایشگر؛ باید قبل از import شدن pyplot باشد
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+
+from b_config.c_database_config import DEFAULT_DB_PATH
+from c_database.c_columnar_store import get_columnar_store
+from f_analysis.b_correlation_analysis import (
+    calculate_correlation, calculate_returns, load_close_pivot_columnar, load_close_prices, pivot_close_prices
+)
+from f_analysis.c_rolling_correlation import RollingCorrelationEngine
+
+
+# پوشه خروجی تصاویر در ریشه پروژه (کنار logs)
+REPORT_DIR = Path(__file__).parent.parent / 'reports' / 'correlation'
+
+# طول پنجره‌های غلتان پیش‌فرض
+DEFAULT_WINDOWS = (100, 500)
+
+
+def load_returns(db_path, timeframe_id):
+    """returnهای هم‌تراز همه نمادها در یک تایم‌فریم"""
+    conn = sqlite3.connect(db_path)
+    try:
+        store = get_columnar_store()
+        if store is not None:
+            df_pivot = load_close_pivot_columnar(conn, store, timeframe_id)
+        else:
+            df_pivot = pivot_close_prices(load_close_prices(conn, timeframe_id))
+    finally:
+        conn.close()
+    return calculate_returns(df_pivot)
+
+
+def save_correlation_heatmap(correlation_matrix, title, path):
+    """ذخیره Heatmap همبستگی در فایل تصویر (بدون plt.show)"""
+    fig, ax = plt.subplots(figsize=(10, 8))
+    sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5, vmin=-1, vmax=1, ax=ax)
+    ax.set_title(title)
+    fig.savefig(path, dpi=100, bbox_inches='tight')
+    plt.close(fig)
+
+
+def run_timeframe_job(db_path, timeframe_id, timeframe_name, windows, output_dir):
+    """
+    کار یک worker: ماتریس همبستگی کل دوره و آخرین ماتریس هر پنجره غلتان برای یک تایم‌فریم.
+    خروجی: (timeframe_id, لیست نتایج (window, نام نمادها، ماتریس، تعداد نمونه، شروع، پایان)، مسیر تصاویر، ثانیه)
+    """
+    started = time.perf_counter()
+    df_returns = load_returns(db_path, timeframe_id)
+    results, images = [], []
+    if len(df_returns) < 2 or df_returns.shape[1] < 2:
+        return timeframe_id, results, images, time.perf_counter() - started
+
+    symbols = list(df_returns.columns)
+    times = (df_returns.index.astype('int64') // 10**9).to_numpy()
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M')
+
+    full = calculate_correlation(df_returns)
+    results.append((None, symbols, full.to_numpy(), len(df_returns), int(times[0]), int(times[-1])))
+    path = os.path.join(output_dir, f"corr_{timeframe_name}_full_{stamp}.png")
+    save_correlation_heatmap(full, f"Correlation Matrix of Returns ({timeframe_name})", path)
+    images.append(path)
+
+    for window in windows:
+        if len(df_returns) < window:
+            continue
+        engine = RollingCorrelationEngine(symbols, window=window, keep_history=False)
+        engine.update_many(df_returns.to_numpy())
+        matrix = engine.current_frame()
+        results.append((window, symbols, matrix.to_numpy(), window, int(times[-window]), int(times[-1])))
+        path = os.path.join(output_dir, f"corr_{timeframe_name}_w{window}_{stamp}.png")
+        save_correlation_heatmap(matrix, f"Rolling Correlation ({timeframe_name}, last {window} bars)", path)
+        images.append(path)
+
+    return timeframe_id, results, images, time.perf_counter() - started
+
+
+def save_results(conn, timeframe_id, results, computed_at):
+    """ذخیره مثلث بالای هر ماتریس در جدول correlation_results"""
+    symbol_ids = dict((name, symbol_id) for symbol_id, name in conn.execute("SELECT id, symbol_name FROM symbols"))
+    rows = []
+    for window, symbols, matrix, sample_size, period_start, period_end in results:
+        upper_i, upper_j = np.triu_indices(len(symbols), k=1)
+        for i, j in zip(upper_i, upper_j):
+            value = matrix[i, j]
+            rows.append((
+                computed_at, timeframe_id, window, symbol_ids[symbols[i]], symbol_ids[symbols[j]],
+                None if np.isnan(value) else float(value), sample_size, period_start, period_end
+            ))
+    conn.executemany("""
+        INSERT INTO correlation_results
+            (computed_at, timeframe_id, window, symbol_id_1, symbol_id_2, correlation, sample_size, period_start, period_end)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return len(rows)
+
+
+def run_batch(db_path=DEFAULT_DB_PATH, timeframe_names=None, windows=DEFAULT_WINDOWS, workers=None, output_dir=REPORT_DIR):
+    """اجرای موازی برای همه تایم‌فریم‌ها؛ workerها فقط می‌خوانند و پردازه اصلی می‌نویسد"""
+    os.makedirs(output_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        timeframes = conn.execute(
+            "SELECT id, timeframe_name FROM timeframes WHERE COALESCE(is_active, 1) = 1 ORDER BY minutes"
+        ).fetchall()
+        if timeframe_names:
+            timeframes = [(tf_id, name) for tf_id, name in timeframes if name in timeframe_names]
+
+        computed_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+        failures = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(run_timeframe_job, db_path, tf_id, name, tuple(windows), str(output_dir)): name
+                for tf_id, name in timeframes
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    timeframe_id, results, images, seconds = future.result()
+                except Exception as e:
+                    failures += 1
+                    print(f"❌ خطا در محاسبه همبستگی {name}: {e}")
+                    continue
+                saved = save_results(conn, timeframe_id, results, computed_at)
+                print(f"✅ {name}: {saved} ردیف ذخیره و {len(images)} تصویر ساخته شد ({seconds:.2f} ثانیه).")
+    finally:
+        conn.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="محاسبه headless و موازی همبستگی برای همه تایم‌فریم‌ها")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--timeframes", default="", help="مثلاً M15,H1 (پیش‌فرض: همه تایم‌فریم‌های فعال)")
+    parser.add_argument("--windows", default=",".join(str(w) for w in DEFAULT_WINDOWS), help="طول پنجره‌های غلتان")
+    parser.add_argument("--workers", type=int, default=None, help="تعداد پردازه (پیش‌فرض: تعداد هسته‌ها)")
+    parser.add_argument("--output-dir", default=str(REPORT_DIR))
+    args = parser.parse_args()
+
+    failures = run_batch(
+        db_path=args.db,
+        timeframe_names=[name for name in args.timeframes.split(",") if name],
+        windows=[int(w) for w in args.windows.split(",") if w],
+        workers=args.workers,
+        output_dir=args.output_dir,
+    )
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from e_data_ingestion.a_fetch_candles import (
+    DERIVE_HIGHER_TIMEFRAMES, CANDLE_COUNTS, TIMEFRAMES, connect_db, fetched_timeframes,
+    load_high_water_marks, publish_candle_writes, tf_name_to_id, write_candle_columns
+)
+from e_data_ingestion.c_resampler import SOURCE_TIMEFRAME, resample_symbol
+
+# طول هر تایم‌فریم به ثانیه
+TIMEFRAME_SECONDS = {"M1": 60, "M5": 300, "M15": 900}
+
+# تعداد کندل بسته شده‌ای که در هر poll بررسی می‌شود؛ اگر فاصله بیشتر باشد با copy_rates_range پر می‌شود
+STREAM_LOOKBACK_BARS = 10
+
+# تأخیر بعد از مرز کندل تا MT5 کندل بسته شده را تحویل دهد (ثانیه)
+BAR_CLOSE_GRACE = 1.0
+
+# اگر کندل جدید هنوز نرسیده، بعد از این فاصله دوباره poll می‌شود (ثانیه)
+RETRY_INTERVAL = 0.5
+MAX_RETRIES = 20
+
+# اختلاف ساعت سرور بروکر با UTC (ثانیه)؛ زمان کندل‌های MT5 به وقت سرور است
+SERVER_TIME_OFFSET = 0
+
+# تعداد آخرین رکوردهای تأخیر که در حافظه نگه داشته می‌شود (سرویس طولانی‌مدت)
+LATENCY_HISTORY = 10000
+
+
+class LiveBarStreamer:
+    """
+    حالت استریم زنده روی asyncio: برای هر (نماد، تایم‌فریم) یک task همگام با مرز کندل‌ها poll می‌کند
+    و فقط کندل‌های بسته شده جدید را به صف می‌فرستد. یک task نویسنده صف را دسته‌ای در دیتابیس می‌نویسد.
+    صف محدود است؛ اگر نویسنده عقب بیفتد pollها روی put منتظر می‌مانند (backpressure).
+    feed هر شیء با API ماژول MetaTrader5 است (copy_rates_from_pos و copy_rates_range) تا بتوان
+    با یک فید جعلی محلی هم اجرا کرد. clock تابع زمان فعلی (epoch ثانیه) است.
+    """
+
+    def __init__(self, db_path, symbols, feed=None, timeframes=None, queue_size=64,
+                 server_time_offset=SERVER_TIME_OFFSET, clock=time.time, on_latency=None):
+        if feed is None:
+            import MetaTrader5 as feed
+        self.db_path = db_path
+        self.symbols = symbols  # {symbol_name: symbol_id}
+        self.feed = feed
+        self.timeframes = list(timeframes or fetched_timeframes())
+        self.queue_size = queue_size
+        self.server_time_offset = server_time_offset
+        self.clock = clock
+        self.on_latency = on_latency
+        self.latencies = deque(maxlen=LATENCY_HISTORY)  # (symbol, tf_name, bar_time, close_to_commit, detect_to_commit)
+        self.errors = []
+        self._queue = None
+        self._stop = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-writer")
+        self._conn = None
+        self._last_times = {}
+        self._rewinds = {}  # key -> تعداد عقب‌گردهای high-water mark بعد از خطای نوشتن
+
+    def server_now(self):
+        return self.clock() + self.server_time_offset
+
+    def _closed_bars(self, symbol, tf_name, last_time):
+        """کندل‌های بسته شده بعد از last_time (فراخوانی blocking روی فید)"""
+        tf_code = TIMEFRAMES[tf_name]
+        if last_time is None:
+            return self.feed.copy_rates_from_pos(symbol, tf_code, 1, CANDLE_COUNTS[tf_name])
+        rates = self.feed.copy_rates_from_pos(symbol, tf_code, 1, STREAM_LOOKBACK_BARS)
+        if rates is None or len(rates) == 0:
+            return None
+        if rates['time'][0] > last_time + TIMEFRAME_SECONDS[tf_name]:
+            # فاصله از lookback بیشتر است؛ کل بازه از last_time تا آخرین کندل بسته شده
+            latest_closed = int(rates['time'][-1])
+            rates = self.feed.copy_rates_range(symbol, tf_code, last_time + 1, latest_closed)
+            if rates is None:
+                return None
+            rates = rates[rates['time'] <= latest_closed]
+        rates = rates[rates['time'] > last_time]
+        _, first_idx = np.unique(rates['time'], return_index=True)
+        return rates[first_idx]
+
+    async def _poll_series(self, symbol, symbol_id, tf_name):
+        loop = asyncio.get_running_loop()
+        step = TIMEFRAME_SECONDS[tf_name]
+        key = (symbol_id, tf_name_to_id(tf_name))
+        catch_up = True  # اولین poll بلافاصله انجام می‌شود تا فاصله از اجرای قبلی پر شود
+        while not self._stop.is_set():
+            if not catch_up:
+                now = self.server_now()
+                next_boundary = (now // step + 1) * step
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=next_boundary - now + BAR_CLOSE_GRACE)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+            catch_up = False
+
+            expected = (self.server_now() // step - 1) * step  # زمان شروع آخرین کندلی که باید بسته شده باشد
+            for _ in range(MAX_RETRIES):
+                rewinds = self._rewinds.get(key, 0)
+                try:
+                    rates = await loop.run_in_executor(None, self._closed_bars, symbol, tf_name, self._last_times.get(key))
+                except Exception as e:
+                    self.errors.append((symbol, tf_name, e))
+                    print(f"❌ خطا در poll {symbol} در {tf_name}: {e}")
+                    rates = None
+                if rewinds != self._rewinds.get(key, 0):
+                    rates = None  # در حین poll یک دسته نوشته نشد؛ از high-water mark عقب رفته دوباره خوانده می‌شود
+                if rates is not None and len(rates) > 0:
+                    self._last_times[key] = int(rates['time'][-1])
+                    await self._queue.put((symbol, symbol_id, tf_name, rates, self.clock()))
+                if self._last_times.get(key) is not None and self._last_times[key] >= expected:
+                    break
+                if self._stop.is_set():
+                    return
+                await asyncio.sleep(RETRY_INTERVAL)
+
+    def _write_batch(self, batch):
+        """نوشتن یک دسته در thread نویسنده و یک commit"""
+        if self._conn is None:
+            self._conn = connect_db(self.db_path)
+        results, pending = [], []
+        try:
+            for symbol, symbol_id, tf_name, rates, detected_at in batch:
+                columns = {name: rates[name] for name in rates.dtype.names}
+                inserted, _ = write_candle_columns(
+                    self._conn, symbol_id, tf_name_to_id(tf_name), columns, commit=False, pending=pending
+                )
+                if DERIVE_HIGHER_TIMEFRAMES and tf_name == SOURCE_TIMEFRAME and inserted:
+                    resample_symbol(self._conn, symbol_id, commit=False, pending=pending)
+                results.append((symbol, tf_name, rates, detected_at, inserted))
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+        publish_candle_writes(pending)
+        return results, self.clock()
+
+    def _rewind(self, batch):
+        """
+        بعد از شکست نوشتن یک دسته، high-water mark سری‌های آن به قبل از اولین کندل نوشته نشده برمی‌گردد
+        تا poll بعدی همان کندل‌ها را دوباره بخواند (کندل‌های تکراری با INSERT OR IGNORE نادیده گرفته می‌شوند).
+        """
+        for _, symbol_id, tf_name, rates, _ in batch:
+            key = (symbol_id, tf_name_to_id(tf_name))
+            first_time = int(rates['time'][0]) - 1
+            last_time = self._last_times.get(key)
+            self._last_times[key] = first_time if last_time is None else min(last_time, first_time)
+            self._rewinds[key] = self._rewinds.get(key, 0) + 1
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while not self._queue.empty() and len(batch) < self.queue_size:
+                next_item = self._queue.get_nowait()
+                if next_item is None:
+                    self._queue.put_nowait(None)
+                    break
+                batch.append(next_item)
+            try:
+                results, committed_at = await loop.run_in_executor(self._executor, self._write_batch, batch)
+            except Exception as e:
+                self.errors.append(("writer", None, e))
+                print(f"❌ خطا در نوشتن دسته کندل‌ها: {e}؛ این کندل‌ها دوباره دریافت می‌شوند.")
+                self._rewind(batch)
+                continue
+            for symbol, tf_name, rates, detected_at, inserted in results:
+                self._record_latency(symbol, tf_name, rates, detected_at, committed_at, inserted)
+
+    def _record_latency(self, symbol, tf_name, rates, detected_at, committed_at, inserted):
+        bar_time = int(rates['time'][-1])
+        bar_close_utc = bar_time + TIMEFRAME_SECONDS[tf_name] - self.server_time_offset
+        close_to_commit = committed_at - bar_close_utc
+        detect_to_commit = committed_at - detected_at
+        self.latencies.append((symbol, tf_name, bar_time, close_to_commit, detect_to_commit))
+        if self.on_latency is not None:
+            self.on_latency(symbol, tf_name, bar_time, close_to_commit, detect_to_commit)
+        print(f"📥 {inserted} کندل {symbol} {tf_name} ذخیره شد؛ تأخیر از بسته شدن کندل: {close_to_commit:.3f}s")
+
+    async def run(self, duration=None):
+        """اجرای استریم تا فراخوانی stop() یا گذشت duration ثانیه"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stop = asyncio.Event()
+        conn = connect_db(self.db_path)
+        try:
+            marks = load_high_water_marks(conn)
+        finally:
+            conn.close()
+        for symbol_id in self.symbols.values():
+            for tf_name in self.timeframes:
+                key = (symbol_id, tf_name_to_id(tf_name))
+                if key in marks:
+                    self._last_times[key] = marks[key]
+
+        writer = asyncio.create_task(self._writer())
+        pollers = [
+            asyncio.create_task(self._poll_series(symbol, symbol_id, tf_name))
+            for symbol, symbol_id in self.symbols.items()
+            for tf_name in self.timeframes
+        ]
+        print(f"📡 استریم زنده برای {len(pollers)} سری شروع شد.")
+        try:
+            if duration is not None:
+                await asyncio.sleep(duration)
+                self.stop()
+            await asyncio.gather(*pollers)
+        finally:
+            self.stop()
+            await self._queue.put(None)
+            await writer
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._close_conn)
+            self._executor.shutdown(wait=True)
+        print(f"🔕 استریم زنده متوقف شد؛ {len(self.latencies)} دسته ذخیره شد، {len(self.errors)} خطا.")
+        return list(self.latencies)
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def _close_conn(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def main_stream(duration=None, fake=False):
+    """
+    اجرای استریم زنده برای همه نمادها با MT5 واقعی، یا با fake=True روی فید جعلی محلی
+    (e_fake_mt5_feed) بدون ترمینال و بدون اتصال.
+    """
+    from e_data_ingestion.a_fetch_candles import SYMBOLS_TO_FETCH, connect_mt5, get_db_path
+
+    if fake:
+        from e_data_ingestion.e_fake_mt5_feed import FakeMT5Feed
+        asyncio.run(LiveBarStreamer(get_db_path(), SYMBOLS_TO_FETCH, feed=FakeMT5Feed()).run(duration))
+        return
+
+    import MetaTrader5 as mt5
+
+    connect_mt5()
+    try:
+        asyncio.run(LiveBarStreamer(get_db_path(), SYMBOLS_TO_FETCH, feed=mt5).run(duration))
+    finally:
+        mt5.shutdown()
+        print("🔕 اتصال به متاتریدر 5 بسته شد.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="استریم زنده کندل‌های بسته شده به دیتابیس")
+    parser.add_argument("--fake", action="store_true", help="اجرا روی فید جعلی محلی به جای MT5")
+    parser.add_argument("--duration", type=float, default=None, help="مدت اجرا (ثانیه)؛ پیش‌فرض تا توقف")
+    args = parser.parse_args()
+    main_stream(args.duration, fake=args.fake)
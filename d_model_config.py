@@ -11,6 +11,29 @@ RANDOM_SEED = 42
 # Train/Test split ratio
 TEST_SIZE = 0.25  # 25% Test, 75% Train
 
+# Dataset builder: bars of history per sample and bars ahead for the label
+LOOKBACK = 32
+HORIZON = 5
+
+# Classification label: 1 if the forward return over HORIZON bars exceeds this threshold
+LABEL_THRESHOLD = 0.0
+
+# Memory budget for one chunk of the feature matrix X (float32), in megabytes
+DATASET_CHUNK_MB = 256
+
+# Cross-validation mode of train_cross_validated (train() uses the chronological holdout unless asked):
+# "walk_forward" (time-ordered folds, train always before test),
+# "purged_kfold" (contiguous test blocks, embargo on both sides) or "holdout" (chronological split)
+VALIDATION_MODE = "walk_forward"
+CV_N_SPLITS = 5
+CV_TRAIN_SIZE = None  # samples per training window; None = expanding window
+CV_TEST_SIZE = None  # samples per test fold; None = n_samples // (CV_N_SPLITS + 1)
+CV_EMBARGO = HORIZON  # samples dropped between train and test (labels overlap HORIZON bars)
+
+# Parallel folds: worker processes (-1 = all cores) and threads each model may use inside a worker
+CV_N_JOBS = -1
+CV_THREADS_PER_WORKER = 1
+
 # Task Type: "classification" or "regression"
 TASK_TYPE = "classification"  # or "regression"
 
@@ -109,3 +132,22 @@ KNN_PARAMS = {
 
 # Early Stopping settings (for models that support it)
 EARLY_STOPPING_ROUNDS = 10
+
+# Hyperparameter tuning (Optuna)
+TUNING_TIME_BUDGET = 600  # seconds per study
+TUNING_N_TRIALS = None  # optional cap on trials per worker; None = run until the time budget
+TUNING_N_JOBS = -1  # worker processes sharing the study through TUNING_STORAGE
+TUNING_N_SPLITS = 3  # walk-forward folds per trial; pruning is checked after each fold
+TUNING_VALIDATION_FRACTION = 0.1  # tail of each training fold used for early stopping
+TUNING_STORAGE = None  # Optuna RDB URL; None = sqlite file next to the main database
+USE_TUNED_PARAMS = False  # get_model() starts from the latest tuned params in optimization_results
+
+# Model tournament: families compared on the same walk-forward splits (None = every family valid for TASK_TYPE)
+TOURNAMENT_MODELS = None
+TOURNAMENT_N_JOBS = -1  # concurrent model jobs (one process each)
+TOURNAMENT_TIMEOUT = 900  # seconds before a model job is killed
+TOURNAMENT_LATENCY_SAMPLES = 100  # single-row predict calls timed per model
+
+# Model registry: artifact folder (None = "models" folder next to the database) and inference service polling
+MODEL_REGISTRY_DIR = None
+INFERENCE_RELOAD_INTERVAL = 30  # seconds between checks for a newly activated model version
@@ -0,0 +1,149 @@
+# d_walk_forward.py
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from threadpoolctl import threadpool_limits
+from sklearn.metrics import accuracy_score, log_loss, mean_squared_error, r2_score
+from sklearn.preprocessing import StandardScaler
+
+from b_config.d_model_config import (
+    TASK_TYPE, CV_N_SPLITS, CV_TRAIN_SIZE, CV_TEST_SIZE, CV_EMBARGO, CV_N_JOBS, CV_THREADS_PER_WORKER
+)
+from b_config.c_database_config import DEFAULT_DB_PATH
+
+# Model parameters that control intra-model threading (sklearn / XGBoost / LightGBM / CatBoost)
+THREAD_PARAMS = ("n_jobs", "nthread", "thread_count")
+
+# Models that need standardized inputs
+SCALED_MODELS = ("neural_network", "svm")
+
+
+def walk_forward_splits(n_samples, n_splits=CV_N_SPLITS, train_size=CV_TRAIN_SIZE, test_size=CV_TEST_SIZE, embargo=CV_EMBARGO):
+    """
+    Time-ordered folds: the last n_splits blocks of test_size samples are tested in turn,
+    each trained on the samples before it minus an embargo gap (expanding window when
+    train_size is None, otherwise a rolling window of train_size samples).
+    """
+    test_size = test_size or n_samples // (n_splits + 1)
+    first_test = n_samples - n_splits * test_size
+    if test_size <= 0 or first_test - embargo <= 0:
+        raise ValueError(f"Not enough samples ({n_samples}) for {n_splits} walk-forward folds")
+    for k in range(n_splits):
+        test_start = first_test + k * test_size
+        train_end = test_start - embargo
+        train_start = 0 if train_size is None else max(train_end - train_size, 0)
+        yield np.arange(train_start, train_end), np.arange(test_start, test_start + test_size)
+
+
+def purged_kfold_splits(n_samples, n_splits=CV_N_SPLITS, embargo=CV_EMBARGO):
+    """
+    Contiguous test blocks; training uses everything else except embargo samples on both
+    sides of the block, so overlapping labels never straddle train and test.
+    """
+    bounds = np.linspace(0, n_samples, n_splits + 1).astype(int)
+    indices = np.arange(n_samples)
+    for test_start, test_end in zip(bounds[:-1], bounds[1:]):
+        train_mask = (indices < test_start - embargo) | (indices >= test_end + embargo)
+        yield indices[train_mask], indices[test_start:test_end]
+
+
+def cap_model_threads(model, n_threads):
+    """Limit a model's own thread pool so parallel folds don't oversubscribe the cores."""
+    params = model.get_params()
+    model.set_params(**{name: n_threads for name in THREAD_PARAMS if name in params})
+    return model
+
+
+def fold_metrics(model, X_test, y_test, task_type=TASK_TYPE):
+    y_pred = model.predict(X_test)
+    if task_type == "classification":
+        metrics = {"accuracy": float(accuracy_score(y_test, y_pred))}
+        if hasattr(model, "predict_proba") and len(np.unique(y_test)) > 1:
+            metrics["log_loss"] = float(log_loss(y_test, model.predict_proba(X_test), labels=model.classes_))
+        return metrics
+    return {"mse": float(mean_squared_error(y_test, y_pred)), "r2": float(r2_score(y_test, y_pred))}
+
+
+def summarize_folds(folds):
+    """
+    mean_/std_ of every metric over the folds that reported it; the keys are the union over
+    folds because fold_metrics omits log_loss when a test fold holds a single class.
+    """
+    keys = list(dict.fromkeys(key for fold in folds for key in fold))
+    summary = {}
+    for key in keys:
+        values = np.array([fold.get(key, np.nan) for fold in folds], dtype=np.float64)
+        summary[f"mean_{key}"] = float(np.nanmean(values))
+        summary[f"std_{key}"] = float(np.nanstd(values))
+    return summary
+
+
+def run_fold(model_factory, X, y, train_idx, test_idx, model_type, n_threads, task_type=TASK_TYPE):
+    """Fit and score one fold (runs inside a worker process)."""
+    with threadpool_limits(limits=n_threads):
+        X_train, X_test = X[train_idx], X[test_idx]
+        if model_type in SCALED_MODELS:
+            scaler = StandardScaler()
+            X_train = scaler.fit_transform(X_train)
+            X_test = scaler.transform(X_test)
+        model = cap_model_threads(model_factory(), n_threads)
+        started = time.perf_counter()
+        model.fit(X_train, y[train_idx])
+        fit_seconds = time.perf_counter() - started
+        metrics = fold_metrics(model, X_test, y[test_idx], task_type)
+    metrics.update({"fit_seconds": fit_seconds, "train_samples": len(train_idx), "test_samples": len(test_idx)})
+    return metrics
+
+
+def cross_validate(model_factory, X, y, model_type, mode="walk_forward", n_jobs=CV_N_JOBS,
+                   threads_per_worker=CV_THREADS_PER_WORKER, task_type=TASK_TYPE, **split_kwargs):
+    """
+    Run all folds in parallel worker processes and aggregate per-fold metrics.
+    Large X/y are memory-mapped to the workers by joblib instead of being copied.
+    """
+    if mode == "walk_forward":
+        splits = list(walk_forward_splits(len(X), **split_kwargs))
+    elif mode == "purged_kfold":
+        splits = list(purged_kfold_splits(len(X), **split_kwargs))
+    else:
+        raise ValueError(f"Unsupported validation mode: {mode}")
+
+    started = time.perf_counter()
+    with parallel_config(backend="loky", inner_max_num_threads=threads_per_worker):
+        folds = Parallel(n_jobs=n_jobs)(
+            delayed(run_fold)(model_factory, X, y, train_idx, test_idx, model_type, threads_per_worker, task_type)
+            for train_idx, test_idx in splits
+        )
+    summary = {
+        "mode": mode,
+        "n_splits": len(folds),
+        "wall_seconds": time.perf_counter() - started,
+        "folds": folds,
+    }
+    summary.update(summarize_folds(folds))
+    return summary
+
+
+def record_model_version(summary, model_name, params=None, task_type=TASK_TYPE, db_path=DEFAULT_DB_PATH):
+    """Store aggregated CV results as a row in model_versions; returns the new id."""
+    training_date = datetime.utcnow()
+    if task_type == "classification":
+        accuracy, loss = summary.get("mean_accuracy"), summary.get("mean_log_loss")
+    else:
+        accuracy, loss = None, summary.get("mean_mse")
+    description = json.dumps({"cv": summary, "params": params or {}}, default=str)
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(
+            "INSERT INTO model_versions (model_name, version, training_date, accuracy, loss, description) VALUES (?, ?, ?, ?, ?, ?)",
+            (model_name, training_date.strftime('%Y%m%d_%H%M%S'), training_date.strftime('%Y-%m-%d %H:%M:%S.%f'),
+             accuracy, loss, description)
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
@@ -0,0 +1,125 @@
+import sys
+import time
+import types
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+# همان dtype آرایه‌ای که MetaTrader5 برمی‌گرداند
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+
+TIMEFRAME_SECONDS = {
+    TIMEFRAME_M1: 60, TIMEFRAME_M5: 300, TIMEFRAME_M15: 900,
+    TIMEFRAME_H1: 3600, TIMEFRAME_H4: 14400, TIMEFRAME_D1: 86400,
+}
+
+
+def _to_epoch(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+class FakeMT5Feed:
+    """
+    فید جعلی محلی با همان API ماژول MetaTrader5 برای اجرای ingestion و استریم بدون ترمینال.
+    کندل‌ها تابعی قطعی از (نماد، زمان) هستند، پس فراخوانی‌های تکراری داده یکسان می‌دهند.
+    clock زمان فعلی سرور (epoch ثانیه) و delivery_delay تأخیر تحویل کندل بسته شده است.
+    """
+
+    def __init__(self, clock=time.time, delivery_delay=0.0, history_bars=100000):
+        self.clock = clock
+        self.delivery_delay = delivery_delay
+        self.history_bars = history_bars
+        self.calls = 0
+        for name, value in globals().items():
+            if name.startswith("TIMEFRAME_") and isinstance(value, int):
+                setattr(self, name, value)
+
+    # --- API سازگار با MetaTrader5 ---
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def login(self, *args, **kwargs):
+        return True
+
+    def shutdown(self):
+        return True
+
+    def last_error(self):
+        return (1, "Success")
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        self.calls += 1
+        step = TIMEFRAME_SECONDS[timeframe]
+        current = self._current_bar(step)
+        last = current - start_pos * step
+        first = max(last - (count - 1) * step, current - self.history_bars * step)
+        return self._bars(symbol, step, np.arange(first, last + 1, step, dtype=np.int64))
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        self.calls += 1
+        step = TIMEFRAME_SECONDS[timeframe]
+        first = _to_epoch(date_from)
+        first += (-first) % step
+        last = min(_to_epoch(date_to), self._current_bar(step))
+        return self._bars(symbol, step, np.arange(first, last + 1, step, dtype=np.int64))
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        self.calls += 1
+        step = TIMEFRAME_SECONDS[timeframe]
+        last = min(_to_epoch(date_from), self._current_bar(step))
+        last -= last % step
+        return self._bars(symbol, step, np.arange(last - (count - 1) * step, last + 1, step, dtype=np.int64))
+
+    # --- داخلی ---
+    def _current_bar(self, step):
+        """شروع کندل در حال شکل‌گیری؛ کندل قبلی فقط بعد از delivery_delay قابل مشاهده است"""
+        now = self.clock()
+        current = int(now // step * step)
+        if now - current < self.delivery_delay:
+            current -= step
+        return current
+
+    @staticmethod
+    def _price(symbol, times):
+        seed = zlib.crc32(symbol.encode())
+        phase = (seed % 1000) / 1000 * 2 * np.pi
+        noise = ((times * 2654435761 + seed) % 1000) / 1000 - 0.5
+        return 100 + (seed % 50) + 5 * np.sin(times / 86400 * 2 * np.pi + phase) + 0.2 * noise
+
+    def _bars(self, symbol, step, times):
+        rates = np.zeros(len(times), dtype=RATES_DTYPE)
+        if len(times) == 0:
+            return rates
+        rates['time'] = times
+        rates['open'] = self._price(symbol, times)
+        rates['close'] = self._price(symbol, times + step - 1)
+        wick = 0.05 * (1 + (times // step) % 3)
+        rates['high'] = np.maximum(rates['open'], rates['close']) + wick
+        rates['low'] = np.minimum(rates['open'], rates['close']) - wick
+        rates['tick_volume'] = 10 + (times // step) % 90
+        rates['spread'] = 5 + (times // step) % 20
+        return rates
+
+
+def install_fake_mt5(feed=None):
+    """ثبت فید جعلی به جای ماژول MetaTrader5 در sys.modules (قبل از import ماژول‌های ingestion)"""
+    feed = feed or FakeMT5Feed()
+    module = types.ModuleType("MetaTrader5")
+    for name in dir(feed):
+        if not name.startswith("_"):
+            setattr(module, name, getattr(feed, name))
+    sys.modules["MetaTrader5"] = module
+    return feed
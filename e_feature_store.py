@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from b_config.c_database_config import get_feature_store_dir
+
+# نوع داده ماتریس ویژگی‌ها (نصف حافظه float64 و مستقیماً قابل استفاده در مدل‌ها)
+FEATURE_DTYPE = np.float32
+
+
+class FeatureStore:
+    """
+    انبار ویژگی‌های عریض: برای هر (symbol_id, timeframe_id) یک ماتریس float32 سطری (زمان × ویژگی)
+    در features.bin، ستون زمان در time.bin و ثبت ستون‌ها (ترتیب نام ویژگی‌ها) در columns.json.
+    به جای pivot روی جدول EAV (indicators)، یک بازه زمانی با یک memmap و برش پیوسته خوانده می‌شود.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _series_dir(self, symbol_id, timeframe_id):
+        return os.path.join(self.root_dir, f"{symbol_id}_{timeframe_id}")
+
+    def _path(self, symbol_id, timeframe_id, name):
+        return os.path.join(self._series_dir(symbol_id, timeframe_id), name)
+
+    def columns(self, symbol_id, timeframe_id):
+        """ثبت ستون‌های سری: لیست مرتب نام ویژگی‌ها"""
+        with self._lock:
+            self._recover(symbol_id, timeframe_id)
+            return self._load_columns(symbol_id, timeframe_id)
+
+    def _load_columns(self, symbol_id, timeframe_id):
+        path = self._path(symbol_id, timeframe_id, "columns.json")
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def length(self, symbol_id, timeframe_id):
+        """تعداد ردیف‌های کامل ذخیره شده"""
+        path = self._path(symbol_id, timeframe_id, "time.bin")
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // np.dtype(np.int64).itemsize
+
+    def last_time(self, symbol_id, timeframe_id):
+        n = self.length(symbol_id, timeframe_id)
+        if n == 0:
+            return None
+        return int(self._times(symbol_id, timeframe_id, n)[n - 1])
+
+    def _times(self, symbol_id, timeframe_id, n):
+        return np.memmap(self._path(symbol_id, timeframe_id, "time.bin"), dtype=np.int64, mode="r", shape=(n,))
+
+    def _matrix(self, symbol_id, timeframe_id, n, width):
+        return np.memmap(self._path(symbol_id, timeframe_id, "features.bin"), dtype=FEATURE_DTYPE, mode="r", shape=(n, width))
+
+    def _open(self, symbol_id, timeframe_id):
+        """
+        (ستون‌ها، times، ماتریس) سازگار با هم: زیر قفل باز می‌شوند تا _widen همزمان عرض را عوض نکند
+        (memmap باز شده به فایل قبلی اشاره می‌ماند). برای سری خالی times و ماتریس None هستند.
+        """
+        with self._lock:
+            self._recover(symbol_id, timeframe_id)
+            registered = self._load_columns(symbol_id, timeframe_id)
+            n = self.length(symbol_id, timeframe_id)
+            if n == 0:
+                return registered, None, None
+            return registered, self._times(symbol_id, timeframe_id, n), self._matrix(symbol_id, timeframe_id, n, len(registered))
+
+    def _write_file(self, path, data):
+        """نوشتن کامل فایل و fsync، تا جایگزینی بعدی فقط محتوای کامل را ببیند"""
+        with open(path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _recover(self, symbol_id, timeframe_id):
+        """
+        تکمیل _widen نیمه‌کاره بعد از crash. وجود columns.json.pending یعنی ماتریس عریض کامل نوشته شده است،
+        پس features.bin.tmp (اگر هنوز جایگزین نشده) و بعد columns.json جایگزین می‌شوند؛
+        features.bin.tmp بدون pending باقیمانده یک _widen ناتمام است و دور ریخته می‌شود.
+        """
+        path = self._path(symbol_id, timeframe_id, "features.bin")
+        pending = self._path(symbol_id, timeframe_id, "columns.json.pending")
+        if os.path.exists(pending):
+            if os.path.exists(path + ".tmp"):
+                os.replace(path + ".tmp", path)
+            os.replace(pending, self._path(symbol_id, timeframe_id, "columns.json"))
+        elif os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+
+    def _widen(self, symbol_id, timeframe_id, registered, names):
+        """
+        افزودن ستون‌های جدید به ثبت؛ ردیف‌های قبلی برای ستون جدید NaN می‌گیرند.
+        features.bin و columns.json با هم جایگزین نمی‌شوند، پس اول هر دو کامل نوشته می‌شوند و
+        columns.json.pending (با یک rename اتمی) نقطه commit است؛ _recover کار نیمه‌تمام را کامل می‌کند.
+        """
+        added = [name for name in names if name not in registered]
+        if not added:
+            return registered
+        columns = registered + added
+        n = self.length(symbol_id, timeframe_id)
+        path = self._path(symbol_id, timeframe_id, "features.bin")
+        pending = self._path(symbol_id, timeframe_id, "columns.json.pending")
+        if n > 0:
+            wide = np.full((n, len(columns)), np.nan, dtype=FEATURE_DTYPE)
+            wide[:, :len(registered)] = self._matrix(symbol_id, timeframe_id, n, len(registered))
+            self._write_file(path + ".tmp", wide.tobytes())
+        self._write_file(pending + ".tmp", json.dumps(columns).encode("utf-8"))
+        os.replace(pending + ".tmp", pending)
+        self._recover(symbol_id, timeframe_id)
+        return columns
+
+    def append(self, symbol_id, timeframe_id, times, features):
+        """
+        افزودن ردیف‌های جدید (فقط زمان‌های بعد از آخرین ردیف). features دیکشنری نام ویژگی ← آرایه است؛
+        ویژگی ثبت نشده ستون جدید می‌سازد و ویژگی غایب در این دسته NaN می‌شود. خروجی: تعداد ردیف اضافه شده.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        with self._lock:
+            os.makedirs(self._series_dir(symbol_id, timeframe_id), exist_ok=True)
+            self._recover(symbol_id, timeframe_id)
+            columns = self._widen(symbol_id, timeframe_id, self._load_columns(symbol_id, timeframe_id), list(features))
+            n = self.length(symbol_id, timeframe_id)
+            last = self.last_time(symbol_id, timeframe_id)
+            mask = times > last if last is not None else np.ones(len(times), dtype=bool)
+            if not mask.any():
+                return 0
+            order = np.argsort(times[mask], kind="stable")
+            new_times = times[mask][order]
+            keep = np.concatenate(([True], np.diff(new_times) > 0))
+
+            block = np.full((int(keep.sum()), len(columns)), np.nan, dtype=FEATURE_DTYPE)
+            for name, values in features.items():
+                block[:, columns.index(name)] = np.asarray(values, dtype=np.float64)[mask][order][keep]
+
+            # ماتریس اول و زمان آخر نوشته می‌شود؛ طول time.bin تعداد ردیف‌های معتبر است
+            with open(self._path(symbol_id, timeframe_id, "features.bin"), "ab") as f:
+                f.truncate(n * len(columns) * np.dtype(FEATURE_DTYPE).itemsize)
+                f.write(block.tobytes())
+            with open(self._path(symbol_id, timeframe_id, "time.bin"), "ab") as f:
+                f.truncate(n * np.dtype(np.int64).itemsize)
+                f.write(new_times[keep].tobytes())
+            return len(block)
+
+    def read(self, symbol_id, timeframe_id, columns=None, start=None, end=None):
+        """
+        خواندن بازه [start, end] (epoch ثانیه). خروجی: (times, X) که X آرایه C-contiguous float32 با
+        شکل (ردیف، ویژگی) و آماده train است. columns=None یعنی همه ستون‌های ثبت شده به ترتیب ثبت.
+        """
+        registered, times, matrix = self._open(symbol_id, timeframe_id)
+        names = registered if columns is None else list(columns)
+        missing = [name for name in names if name not in registered]
+        if missing:
+            raise KeyError(f"Unknown feature columns: {missing}")
+        if times is None:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(names)), dtype=FEATURE_DTYPE)
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+        matrix = matrix[lo:hi]
+        if names == registered:
+            X = np.array(matrix)  # کپی پیوسته از برش سطری
+        else:
+            X = np.ascontiguousarray(matrix[:, [registered.index(name) for name in names]])
+        return np.array(times[lo:hi]), X
+
+    def read_asof(self, symbol_id, timeframe_id, times, columns=None):
+        """
+        خواندن point-in-time: برای هر زمان درخواستی، آخرین ردیف با زمان ≤ آن (بدون نگاه به آینده).
+        زمان‌های قبل از اولین ردیف NaN می‌گیرند. خروجی: X با شکل (len(times)، ویژگی).
+        """
+        registered, stored, matrix = self._open(symbol_id, timeframe_id)
+        names = registered if columns is None else list(columns)
+        requested = np.asarray(times, dtype=np.int64)
+        X = np.full((len(requested), len(names)), np.nan, dtype=FEATURE_DTYPE)
+        if stored is None:
+            return X
+        rows = np.searchsorted(stored, requested, side="right") - 1
+        found = rows >= 0
+        X[found] = matrix[rows[found]][:, [registered.index(name) for name in names]]
+        return X
+
+    def backfill_from_indicators(self, conn, chunk_size=500000):
+        """ساخت یک‌باره ماتریس عریض از ردیف‌های EAV جدول indicators که هنوز در انبار نیستند"""
+        total = 0
+        series = conn.execute("SELECT DISTINCT symbol_id, timeframe_id FROM indicators").fetchall()
+        for symbol_id, timeframe_id in series:
+            while True:
+                last = self.last_time(symbol_id, timeframe_id)
+                stamps = [row[0] for row in conn.execute("""
+                    SELECT DISTINCT timestamp FROM indicators
+                    WHERE symbol_id = ? AND timeframe_id = ? AND timestamp > ?
+                    ORDER BY timestamp LIMIT ?
+                """, (symbol_id, timeframe_id, -1 if last is None else last, chunk_size))]
+                if not stamps:
+                    break
+                rows = conn.execute("""
+                    SELECT timestamp, indicator_name, value FROM indicators
+                    WHERE symbol_id = ? AND timeframe_id = ? AND timestamp BETWEEN ? AND ?
+                """, (symbol_id, timeframe_id, stamps[0], stamps[-1])).fetchall()
+                times = np.array(stamps, dtype=np.int64)
+                row_times, row_names, row_values = zip(*rows)
+                names, name_index = np.unique(np.array(row_names, dtype=object), return_inverse=True)
+                wide = np.full((len(names), len(times)), np.nan)
+                wide[name_index, np.searchsorted(times, np.array(row_times, dtype=np.int64))] = \
+                    np.array(row_values, dtype=np.float64)  # None → NaN
+                total += self.append(symbol_id, timeframe_id, times, dict(zip(names.tolist(), wide)))
+        print(f"✅ {total} ردیف به انبار ویژگی‌ها اضافه شد.")
+        return total
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    """انبار ویژگی‌ها در مسیر FEATURE_STORE_DIR"""
+    global _store
+    root_dir = get_feature_store_dir()
+    with _store_lock:
+        if _store is None or _store.root_dir != root_dir:
+            _store = FeatureStore(root_dir)
+    return _store
@@ -0,0 +1,321 @@
+# e_hyperparameter_tuning.py
+import argparse
+import json
+import os
+import sys
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+import optuna
+from joblib import Parallel, delayed, effective_n_jobs, parallel_config
+from threadpoolctl import threadpool_limits
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from b_config.d_model_config import (
+    RANDOM_SEED, TASK_TYPE, MODEL_TYPE, EARLY_STOPPING_ROUNDS, CV_EMBARGO, CV_THREADS_PER_WORKER,
+    TUNING_TIME_BUDGET, TUNING_N_TRIALS, TUNING_N_JOBS, TUNING_N_SPLITS, TUNING_VALIDATION_FRACTION, TUNING_STORAGE
+)
+from g_training.b_model_trainer import get_model
+from g_training.c_dataset_builder import build_dataset
+from b_config.c_database_config import DEFAULT_DB_PATH
+from g_training.d_walk_forward import SCALED_MODELS, cap_model_threads, fold_metrics, walk_forward_splits
+
+DEFAULT_STORAGE = "sqlite:///" + os.path.join(os.path.dirname(DEFAULT_DB_PATH), "optuna.db").replace("\\", "/")
+
+# MLP layer layouts (Optuna categorical choices must be primitives)
+HIDDEN_LAYER_CHOICES = {"64": (64,), "100_50": (100, 50), "128_64": (128, 64), "256_128_64": (256, 128, 64)}
+
+
+def suggest_params(trial, model_type):
+    """Search space per model type; values override the config params in get_model()."""
+    if model_type == "xgboost":
+        return {
+            "n_estimators": 2000,  # upper bound, early stopping picks the real count
+            "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3, log=True),
+            "max_depth": trial.suggest_int("max_depth", 3, 10),
+            "min_child_weight": trial.suggest_float("min_child_weight", 1, 20, log=True),
+            "subsample": trial.suggest_float("subsample", 0.5, 1.0),
+            "colsample_bytree": trial.suggest_float("colsample_bytree", 0.5, 1.0),
+            "reg_lambda": trial.suggest_float("reg_lambda", 1e-3, 10, log=True),
+        }
+    if model_type == "lightgbm":
+        return {
+            "n_estimators": 2000,
+            "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3, log=True),
+            "num_leaves": trial.suggest_int("num_leaves", 15, 255, log=True),
+            "min_child_samples": trial.suggest_int("min_child_samples", 5, 200, log=True),
+            "subsample": trial.suggest_float("subsample", 0.5, 1.0),
+            "subsample_freq": 1,
+            "colsample_bytree": trial.suggest_float("colsample_bytree", 0.5, 1.0),
+            "reg_lambda": trial.suggest_float("reg_lambda", 1e-3, 10, log=True),
+            "verbose": -1,
+        }
+    if model_type == "catboost":
+        return {
+            "iterations": 2000,
+            "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3, log=True),
+            "depth": trial.suggest_int("depth", 4, 10),
+            "l2_leaf_reg": trial.suggest_float("l2_leaf_reg", 1, 10, log=True),
+        }
+    if model_type == "random_forest":
+        return {
+            "n_estimators": trial.suggest_int("n_estimators", 100, 500, step=50),
+            "max_depth": trial.suggest_int("max_depth", 4, 20),
+            "min_samples_leaf": trial.suggest_int("min_samples_leaf", 1, 50, log=True),
+            "max_features": trial.suggest_categorical("max_features", ["sqrt", "log2", 0.5]),
+        }
+    if model_type == "gradient_boosting":
+        return {
+            "n_estimators": 1000,
+            "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3, log=True),
+            "max_depth": trial.suggest_int("max_depth", 2, 6),
+            "subsample": trial.suggest_float("subsample", 0.5, 1.0),
+            "n_iter_no_change": EARLY_STOPPING_ROUNDS,
+        }
+    if model_type == "neural_network":
+        return {
+            "hidden_layer_sizes": HIDDEN_LAYER_CHOICES[trial.suggest_categorical("hidden_layer_sizes", list(HIDDEN_LAYER_CHOICES))],
+            "alpha": trial.suggest_float("alpha", 1e-6, 1e-2, log=True),
+            "learning_rate_init": trial.suggest_float("learning_rate_init", 1e-4, 1e-2, log=True),
+            "early_stopping": True,
+            "n_iter_no_change": EARLY_STOPPING_ROUNDS,
+        }
+    if model_type == "svm":
+        return {
+            "C": trial.suggest_float("C", 1e-2, 1e2, log=True),
+            "gamma": trial.suggest_categorical("gamma", ["scale", "auto"]),
+        }
+    if model_type == "logistic_regression":
+        return {"C": trial.suggest_float("C", 1e-3, 1e2, log=True)}
+    if model_type == "knn":
+        return {
+            "n_neighbors": trial.suggest_int("n_neighbors", 3, 50, log=True),
+            "weights": trial.suggest_categorical("weights", ["uniform", "distance"]),
+        }
+    return {}
+
+
+def fit_with_early_stopping(model, model_type, X_train, y_train, X_val, y_val):
+    """Fit using the model's own early-stopping hook on a validation tail (gradient boosters)."""
+    if model_type == "xgboost":
+        model.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+    elif model_type == "lightgbm":
+        import lightgbm
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)],
+                  callbacks=[lightgbm.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+    elif model_type == "catboost":
+        model.fit(X_train, y_train, eval_set=(X_val, y_val), early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+    else:
+        # sklearn models stop early internally (n_iter_no_change / early_stopping) or not at all
+        model.fit(np.concatenate((X_train, X_val)), np.concatenate((y_train, y_val)))
+    return model
+
+
+def boosting_rounds(model, model_type):
+    """Number of boosting rounds kept by early stopping (None for other models)."""
+    if model_type == "xgboost":
+        return int(model.best_iteration) + 1 if hasattr(model, "best_iteration") else None
+    if model_type == "lightgbm":
+        return int(model.best_iteration_) or None
+    if model_type == "catboost":
+        best = model.get_best_iteration()
+        return None if best is None else int(best) + 1
+    return None
+
+
+def primary_metric(task_type=TASK_TYPE):
+    """(metric name, optimization direction) used to rank trials."""
+    return ("accuracy", "maximize") if task_type == "classification" else ("mse", "minimize")
+
+
+def make_objective(X, y, model_type, n_splits=TUNING_N_SPLITS, embargo=CV_EMBARGO, n_threads=CV_THREADS_PER_WORKER):
+    """Walk-forward objective; the running mean is reported after each fold so bad trials are pruned early."""
+    metric, _ = primary_metric()
+    splits = list(walk_forward_splits(len(X), n_splits=n_splits, embargo=embargo))
+
+    def objective(trial):
+        params = suggest_params(trial, model_type)
+        scores = []
+        for step, (train_idx, test_idx) in enumerate(splits):
+            n_val = max(int(len(train_idx) * TUNING_VALIDATION_FRACTION), 1)
+            fit_idx, val_idx = train_idx[:-n_val], train_idx[-n_val:]
+            X_fit, X_val, X_test = X[fit_idx], X[val_idx], X[test_idx]
+            if model_type in SCALED_MODELS:
+                scaler = StandardScaler().fit(X_fit)
+                X_fit, X_val, X_test = scaler.transform(X_fit), scaler.transform(X_val), scaler.transform(X_test)
+            model = cap_model_threads(get_model(model_type, params, tuned=False), n_threads)
+            fit_with_early_stopping(model, model_type, X_fit, y[fit_idx], X_val, y[val_idx])
+            scores.append(fold_metrics(model, X_test, y[test_idx])[metric])
+
+            trial.report(float(np.mean(scores)), step)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+        rounds = boosting_rounds(model, model_type)
+        if rounds:
+            trial.set_user_attr("best_iteration", rounds)
+        return float(np.mean(scores))
+
+    return objective
+
+
+def make_sampler_and_pruner(worker=0):
+    """
+    Sampler and pruner of a tuning study. load_study() does not persist them, so the study and
+    every worker build their own here; the seed is offset per worker so parallel workers do not
+    draw identical startup trials.
+    """
+    sampler = optuna.samplers.TPESampler(seed=RANDOM_SEED + worker)
+    pruner = optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+    return sampler, pruner
+
+
+def has_completed_trials(study):
+    """study.best_value/best_params raise until at least one trial completed (all pruned or failed)."""
+    return any(trial.state == optuna.trial.TrialState.COMPLETE for trial in study.trials)
+
+
+def _optimize_worker(storage, study_name, X, y, model_type, timeout, n_trials, n_threads, worker=0):
+    """One worker process: attach to the shared study and run trials until the time budget ends."""
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    sampler, pruner = make_sampler_and_pruner(worker)
+    study = optuna.load_study(study_name=study_name, storage=storage, sampler=sampler, pruner=pruner)
+    with threadpool_limits(limits=n_threads):
+        study.optimize(make_objective(X, y, model_type, n_threads=n_threads),
+                       timeout=timeout, n_trials=n_trials, gc_after_trial=True)
+
+
+def tune(X, y, model_type=MODEL_TYPE, time_budget=TUNING_TIME_BUDGET, n_trials=TUNING_N_TRIALS,
+         n_jobs=TUNING_N_JOBS, storage=TUNING_STORAGE, study_name=None, n_threads=CV_THREADS_PER_WORKER):
+    """
+    Run an Optuna study for model_type within time_budget seconds, with trials spread over
+    worker processes that share the study through an RDB storage. Returns the study.
+    """
+    metric, direction = primary_metric()
+    storage = storage or DEFAULT_STORAGE
+    study_name = study_name or f"{model_type}_{TASK_TYPE}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    sampler, pruner = make_sampler_and_pruner()
+    study = optuna.create_study(
+        study_name=study_name, storage=storage, direction=direction, load_if_exists=True,
+        sampler=sampler, pruner=pruner,
+    )
+    workers = effective_n_jobs(n_jobs)
+    print(f"🔧 Tuning {model_type} ({metric}, {direction}) for {time_budget}s with {workers} worker(s)...")
+    started = time.perf_counter()
+    with parallel_config(backend="loky", inner_max_num_threads=n_threads):
+        Parallel(n_jobs=workers)(
+            delayed(_optimize_worker)(storage, study_name, X, y, model_type, time_budget, n_trials, n_threads, worker)
+            for worker in range(workers)
+        )
+
+    states = [trial.state for trial in study.trials]
+    print(f"✅ {states.count(optuna.trial.TrialState.COMPLETE)} trials completed, "
+          f"{states.count(optuna.trial.TrialState.PRUNED)} pruned in {time.perf_counter() - started:.1f}s")
+    if has_completed_trials(study):
+        print(f"🏆 Best {metric}: {study.best_value:.4f} with {study.best_params}")
+    else:
+        print("⚠️ No trial completed; nothing to report as best.")
+    return study
+
+
+def best_model_params(study, model_type):
+    """Full get_model() override for the best trial (fixed values plus sampled ones)."""
+    params = suggest_params(optuna.trial.FixedTrial(study.best_params), model_type)
+    best_iteration = study.best_trial.user_attrs.get("best_iteration")
+    if best_iteration:
+        params["iterations" if model_type == "catboost" else "n_estimators"] = best_iteration
+    return params
+
+
+def save_best_params(study, model_type, n_samples, db_path=DEFAULT_DB_PATH, test_period=None):
+    """Store the best parameter set in optimization_results; returns the new id (None if no trial completed)."""
+    if not has_completed_trials(study):
+        return None
+    metric, direction = primary_metric()
+    parameter_set = json.dumps({
+        "model_type": model_type,
+        "task_type": TASK_TYPE,
+        "params": best_model_params(study, model_type),
+        "metric": metric,
+        "direction": direction,
+        "score": study.best_value,
+        "study_name": study.study_name,
+        "n_trials": len(study.trials),
+    }, default=str)
+    # Trading metrics (profit, drawdown, sharpe) come from backtests; for classification
+    # the directional accuracy of the forward-return label is stored as win_rate
+    win_rate = study.best_value if metric == "accuracy" else None
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(
+            "INSERT INTO optimization_results (parameter_set, profit, drawdown, sharpe_ratio, win_rate, test_period) "
+            "VALUES (?, NULL, NULL, NULL, ?, ?)",
+            (parameter_set, win_rate, test_period or f"walk_forward {TUNING_N_SPLITS} folds / {n_samples} samples")
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def load_best_params(model_type=MODEL_TYPE, db_path=DEFAULT_DB_PATH):
+    """Latest tuned params for model_type from optimization_results (None if never tuned)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT parameter_set FROM optimization_results ORDER BY id DESC").fetchall()
+    finally:
+        conn.close()
+    for (parameter_set,) in rows:
+        try:
+            record = json.loads(parameter_set)
+        except ValueError:
+            continue
+        if record.get("model_type") == model_type and record.get("task_type") == TASK_TYPE:
+            params = record["params"]
+            if "hidden_layer_sizes" in params:
+                params["hidden_layer_sizes"] = tuple(params["hidden_layer_sizes"])
+            return params
+    return None
+
+
+def tune_and_train(X, y, model_type=MODEL_TYPE, db_path=DEFAULT_DB_PATH, **tune_kwargs):
+    """Tune, persist the best params, and return a model fitted on all samples with them."""
+    study = tune(X, y, model_type, **tune_kwargs)
+    if has_completed_trials(study):
+        result_id = save_best_params(study, model_type, len(X), db_path=db_path)
+        print(f"🗂️ Best params saved in optimization_results (id={result_id})")
+        model = get_model(model_type, best_model_params(study, model_type), tuned=False)
+    else:
+        print(f"⚠️ Tuning produced no completed trial; training {model_type} with the config params.")
+        model = get_model(model_type, tuned=False)
+    if model_type in SCALED_MODELS:
+        model = make_pipeline(StandardScaler(), model)
+    return model.fit(X, y)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune a model on one series and store the best params in optimization_results")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--symbol-id", type=int, required=True)
+    parser.add_argument("--timeframe-id", type=int, default=1)
+    parser.add_argument("--model-type", default=MODEL_TYPE)
+    parser.add_argument("--time-budget", type=float, default=TUNING_TIME_BUDGET, help="seconds per study")
+    parser.add_argument("--trials", type=int, default=TUNING_N_TRIALS, help="optional cap on trials per worker")
+    parser.add_argument("--jobs", type=int, default=TUNING_N_JOBS)
+    parser.add_argument("--start", type=int, default=None, help="first candle time (epoch seconds)")
+    parser.add_argument("--end", type=int, default=None, help="last candle time (epoch seconds)")
+    args = parser.parse_args()
+
+    X, y, _ = build_dataset(args.symbol_id, args.timeframe_id, start=args.start, end=args.end, db_path=args.db)
+    if not len(X):
+        print("❌ No samples for this series; fetch candles first.")
+        sys.exit(1)
+    tune_and_train(X, y, args.model_type, db_path=args.db,
+                   time_budget=args.time_budget, n_trials=args.trials, n_jobs=args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from b_config.c_database_config import DEFAULT_DB_PATH
+from f_analysis.d_correlation_batch import load_returns
+
+# بیشترین تأخیر بررسی شده (کندل)
+DEFAULT_MAX_LAG = 20
+
+
+def cross_correlation_fft(returns, max_lag=DEFAULT_MAX_LAG):
+    """
+    همبستگی متقابل همه جفت‌ها برای تأخیرهای -max_lag..max_lag با FFT (بدون shift برای هر تأخیر).
+    returns آرایه T×N است. خروجی: (lags, pairs, ccf) که ccf[p, k] برابر
+    corr(x_i[t], x_j[t + lags[k]]) برای جفت pairs[p] = (i, j) است؛ پس مقدار بزرگ در تأخیر مثبت
+    یعنی i به اندازه lag کندل از j جلوتر است.
+    """
+    x = np.asarray(returns, dtype=np.float64)
+    t, n = x.shape
+    max_lag = min(max_lag, t - 1)
+    std = x.std(axis=0)
+    std[std == 0] = np.nan
+    z = (x - x.mean(axis=0)) / std
+
+    nfft = 1 << int(np.ceil(np.log2(2 * t - 1)))
+    spectrum = np.fft.rfft(np.nan_to_num(z), n=nfft, axis=0)  # یک FFT برای هر نماد
+
+    pair_i, pair_j = np.triu_indices(n, k=1)
+    # irfft(conj(Fi) * Fj)[k] = Σ z_i[t] z_j[t + k] (تأخیرهای منفی در انتهای آرایه دایره‌ای هستند)
+    raw = np.fft.irfft(np.conj(spectrum[:, pair_i]) * spectrum[:, pair_j], n=nfft, axis=0)
+    lags = np.arange(-max_lag, max_lag + 1)
+    ccf = raw[lags % nfft].T / (t - np.abs(lags))  # نرمال‌سازی با تعداد نقاط هم‌پوشان
+    ccf[np.isnan(std[pair_i]) | np.isnan(std[pair_j])] = np.nan
+    return lags, np.stack((pair_i, pair_j), axis=1), ccf
+
+
+def scan_lead_lag(df_returns, max_lag=DEFAULT_MAX_LAG, min_lag=1):
+    """
+    قوی‌ترین رابطه تأخیری هر جفت نماد، مرتب شده بر اساس قدر مطلق همبستگی.
+    خروجی DataFrame با ستون‌های leader, lagger, lag_bars, correlation, zero_lag_correlation, z_score.
+    """
+    symbols = list(df_returns.columns)
+    lags, pairs, ccf = cross_correlation_fft(df_returns.to_numpy(), max_lag)
+    t = len(df_returns)
+    zero = ccf[:, lags == 0][:, 0]
+    candidates = np.abs(lags) >= min_lag
+    rows = []
+    for p, (i, j) in enumerate(pairs):
+        values = np.where(candidates, ccf[p], np.nan)
+        if np.all(np.isnan(values)):
+            continue
+        k = int(np.nanargmax(np.abs(values)))
+        lag = int(lags[k])
+        leader, lagger = (symbols[i], symbols[j]) if lag > 0 else (symbols[j], symbols[i])
+        corr = float(values[k])
+        rows.append({
+            "leader": leader,
+            "lagger": lagger,
+            "lag_bars": abs(lag),
+            "correlation": corr,
+            "zero_lag_correlation": float(zero[p]),
+            "z_score": corr * np.sqrt(t - abs(lag)),
+        })
+    result = pd.DataFrame(rows, columns=["leader", "lagger", "lag_bars", "correlation", "zero_lag_correlation", "z_score"])
+    return result.reindex(result["correlation"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+
+def save_lead_lag(conn, timeframe_id, ranking, sample_size):
+    """ذخیره رتبه‌بندی در جدول lead_lag_results"""
+    symbol_ids = dict((name, symbol_id) for symbol_id, name in conn.execute("SELECT id, symbol_name FROM symbols"))
+    computed_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+    conn.executemany("""
+        INSERT INTO lead_lag_results
+            (computed_at, timeframe_id, leader_symbol_id, lagger_symbol_id, lag_bars, correlation, zero_lag_correlation, sample_size)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (computed_at, timeframe_id, symbol_ids[row.leader], symbol_ids[row.lagger], int(row.lag_bars),
+         float(row.correlation), float(row.zero_lag_correlation), sample_size)
+        for row in ranking.itertuples()
+    ])
+    conn.commit()
+    return len(ranking)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اسکن lead-lag بین همه جفت‌نمادها با همبستگی متقابل FFT")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--timeframe", default="M15")
+    parser.add_argument("--max-lag", type=int, default=DEFAULT_MAX_LAG)
+    parser.add_argument("--top", type=int, default=10, help="تعداد ردیف نمایش داده شده")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        row = conn.execute("SELECT id FROM timeframes WHERE timeframe_name = ?", (args.timeframe,)).fetchone()
+        if row is None:
+            print(f"❌ تایم‌فریم {args.timeframe} پیدا نشد.")
+            sys.exit(1)
+        timeframe_id = row[0]
+        df_returns = load_returns(args.db, timeframe_id)
+        ranking = scan_lead_lag(df_returns, args.max_lag)
+        saved = save_lead_lag(conn, timeframe_id, ranking, len(df_returns))
+    finally:
+        conn.close()
+
+    print(f"✅ {saved} رابطه lead-lag برای {args.timeframe} ذخیره شد. قوی‌ترین‌ها:")
+    print(ranking.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,248 @@
-
 import sqlite3
+import threading
+import time
+from datetime import datetime
 from decimal import Decimal
+from typing import NamedTuple
+
+import numpy as np
+
 from b_config.f_logger_config import get_logger
 from pathlib import Path
 
+# ATR used when the indicator engine has not produced a value yet
+DEFAULT_ATR_VALUE = 20
+
+# Seconds between checks of trading_risk_settings.updated_at (0 = check on every access)
+RISK_SETTINGS_CHECK_INTERVAL = 5.0
+
+
+class RiskSettings(NamedTuple):
+    """Immutable, typed snapshot of trading_risk_settings (defaults used for missing rows)."""
+    max_risk_percent: float = 1.0
+    min_lot: float = 0.01
+    max_lot: float = 50.0
+    stop_loss_atr_multiplier: float = 1.5
+    take_profit_ratio: float = 2.0
+    max_portfolio_risk_percent: float = 3.0
+    version: tuple = (None, 0)  # (MAX(updated_at), row count) the snapshot was read at
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (parameter_name, parameter_value, updated_at) rows."""
+        values = {name: value for name, value, _ in rows}
+        typed = {name: float(values[name]) for name in cls._fields if name != 'version' and name in values}
+        stamps = [updated_at for _, _, updated_at in rows if updated_at is not None]
+        return cls(version=(max(stamps) if stamps else None, len(rows)), **typed)
+
+
+def sl_tp_levels(entry_prices, atr_values, directions, atr_multiplier, take_profit_ratio):
+    """Vectorized SL/TP for arrays of signals; directions are +1 (buy) / -1 (sell)."""
+    sl_distance = atr_multiplier * np.asarray(atr_values, dtype=np.float64)
+    directions = np.asarray(directions)
+    stop_loss = entry_prices - directions * sl_distance
+    take_profit = entry_prices + directions * sl_distance * take_profit_ratio
+    return stop_loss, take_profit
+
+
+def position_size(balance, risk_per_unit, max_risk_percent, min_lot, max_lot, contract_size=1.0):
+    """Lots for one order: risk amount / (SL distance x contract size), clipped to [min_lot, max_lot]."""
+    volume = balance * (max_risk_percent / 100) / (risk_per_unit * contract_size)
+    return round(max(min(volume, max_lot), min_lot), 2)
+
+
+def position_sizes(balance, entry_prices, stop_loss_prices, max_risk_percent, min_lot, max_lot, contract_size=1.0):
+    """Vectorized position_size: lots per order, 0 where entry equals stop loss."""
+    risk_per_unit = np.abs(np.asarray(entry_prices, dtype=np.float64) - stop_loss_prices)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume = np.asarray(balance, dtype=np.float64) * (max_risk_percent / 100) / (risk_per_unit * contract_size)
+    return np.where(risk_per_unit > 0, np.round(np.clip(volume, min_lot, max_lot), 2), 0.0)
+
+
+# Units of the underlying per lot for the seeded symbols, used to backfill databases created before contract_size
+SYMBOL_CONTRACT_SIZES = {"XAUUSD": 100, "USDInd": 1000, "WTI": 1000, "XAGUSD": 5000, "EURUSD": 100000, "US500": 1}
+
+
+def ensure_symbol_columns(conn):
+    """Add symbols.contract_size to older databases and backfill it for the known symbols."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(symbols)")}
+    if "contract_size" not in existing:
+        conn.execute("ALTER TABLE symbols ADD COLUMN contract_size FLOAT")
+    cursor = conn.executemany(
+        "UPDATE symbols SET contract_size = ? WHERE symbol_name = ? AND contract_size IS NULL",
+        [(size, name) for name, size in SYMBOL_CONTRACT_SIZES.items()]
+    )
+    if "contract_size" not in existing or cursor.rowcount > 0:
+        conn.commit()
+
+
+def symbol_contract_size(conn, symbol_id):
+    """Units of the underlying per lot (profit = price move x lots x contract_size); raises if it is not recorded."""
+    ensure_symbol_columns(conn)
+    row = conn.execute("SELECT contract_size FROM symbols WHERE id = ?", (symbol_id,)).fetchone()
+    if row is None or not row[0]:
+        raise ValueError(f"symbols.contract_size is not set for symbol_id={symbol_id}; sizing and P&L need it")
+    return float(row[0])
+
+
 class TradingRiskConfig:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, check_interval: float = RISK_SETTINGS_CHECK_INTERVAL):
         self.db_path = db_path
-        self.logger = get_logger('risk_manager', level='DEBUG')
-        self.settings = self.load_risk_settings()
+        self.check_interval = check_interval
+        # Sizing runs on every bar/order, so log writes stay off the caller's thread
+        self.logger = get_logger('risk_manager', async_mode=True)
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._raw = {}
+        self._snapshot = None
+        self._contract_sizes = {}
+        self.refresh(force=True)
+
+    @property
+    def settings(self):
+        """Raw parameter_name -> parameter_value strings of the current snapshot."""
+        self.snapshot()
+        return dict(self._raw)
 
     def load_risk_settings(self):
         """Load risk parameters from database into a dictionary."""
-        settings = {}
+        self.refresh(force=True)
+        return dict(self._raw)
+
+    def refresh(self, force: bool = False):
+        """Reload the snapshot if updated_at changed since it was read; returns True when reloaded."""
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                if not force and self._snapshot is not None:
+                    version = tuple(conn.execute(
+                        "SELECT MAX(updated_at), COUNT(*) FROM trading_risk_settings"
+                    ).fetchone())
+                    if version == self._snapshot.version:
+                        self._next_check = time.monotonic() + self.check_interval
+                        return False
+                rows = conn.execute(
+                    "SELECT parameter_name, parameter_value, updated_at FROM trading_risk_settings"
+                ).fetchall()
+            finally:
+                conn.close()
+            self._raw = {name: value for name, value, _ in rows}
+            self._snapshot = RiskSettings.from_rows(rows)
+            self._next_check = time.monotonic() + self.check_interval
+        self.logger.info("تنظیمات ریسک بارگذاری شد: %s", self._raw)
+        return True
+
+    def invalidate(self):
+        """Change notification: the next access re-checks updated_at instead of waiting for the interval."""
+        self._next_check = 0.0
+
+    def snapshot(self) -> RiskSettings:
+        """Current typed settings; hits the database at most once per check_interval."""
+        if time.monotonic() >= self._next_check:
+            self.refresh()
+        return self._snapshot
+
+    def set_parameter(self, name: str, value):
+        """
+        Update one setting and bump its updated_at so every TradingRiskConfig picks it up.
+        A known setting missing from the table (e.g. added after the database was seeded) is inserted;
+        an unknown name raises KeyError.
+        """
+        updated_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT parameter_name, parameter_value FROM trading_risk_settings")
-        for name, value in cursor.fetchall():
-            settings[name] = value
-        conn.close()
-        self.logger.info(f"تنظیمات ریسک بارگذاری شد: {settings}")
-        return settings
-
-    def calculate_position_size(self, balance: float, entry_price: float, stop_loss_price: float):
-        """Calculate the optimal position size based on risk settings."""
-        risk_percent = float(self.settings.get('max_risk_percent', 1)) / 100
-        risk_amount = balance * risk_percent
+        try:
+            cursor = conn.execute(
+                "UPDATE trading_risk_settings SET parameter_value = ?, updated_at = ? WHERE parameter_name = ?",
+                (str(value), updated_at, name)
+            )
+            if cursor.rowcount == 0:
+                if name not in RiskSettings._fields or name == 'version':
+                    raise KeyError(f"Unknown risk parameter: {name}")
+                conn.execute(
+                    "INSERT INTO trading_risk_settings (parameter_name, parameter_value, updated_at) VALUES (?, ?, ?)",
+                    (name, str(value), updated_at)
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        self.invalidate()
+
+    def contract_size(self, symbol_id: int) -> float:
+        """symbols.contract_size of symbol_id, read once per symbol with the backtester's lookup."""
+        size = self._contract_sizes.get(symbol_id)
+        if size is None:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                size = symbol_contract_size(conn, symbol_id)
+            finally:
+                conn.close()
+            self._contract_sizes[symbol_id] = size
+        return size
+
+    def calculate_position_size(self, balance: float, entry_price: float, stop_loss_price: float, symbol_id: int):
+        """Calculate the optimal position size (lots of symbol_id) based on risk settings."""
+        settings = self.snapshot()
         risk_per_unit = abs(entry_price - stop_loss_price)
         if risk_per_unit == 0:
             self.logger.error("اختلاف قیمت ورود و حد ضرر صفر است، محاسبه حجم غیرممکن.")
             return 0
-        volume = risk_amount / risk_per_unit
-        min_lot = float(self.settings.get('min_lot', 0.01))
-        max_lot = float(self.settings.get('max_lot', 50))
-        volume = max(min(volume, max_lot), min_lot)
-        self.logger.info(f"حجم محاسبه شده: {volume} لات برای ریسک مجاز: {risk_percent*100}%")
-        return round(volume, 2)
-
-    def calculate_sl_tp(self, entry_price: float):
+        volume = position_size(balance, risk_per_unit, settings.max_risk_percent, settings.min_lot, settings.max_lot,
+                               self.contract_size(symbol_id))
+        self.logger.debug("حجم محاسبه شده: %s لات برای ریسک مجاز: %s%%", volume, settings.max_risk_percent)
+        return volume
+
+    def calculate_position_sizes(self, balance, entry_prices, stop_loss_prices, symbol_id: int):
+        """Position sizes (lots of symbol_id) for arrays of candidate orders in one NumPy pass (0 where SL equals entry)."""
+        settings = self.snapshot()
+        return position_sizes(balance, entry_prices, stop_loss_prices,
+                              settings.max_risk_percent, settings.min_lot, settings.max_lot, self.contract_size(symbol_id))
+
+    def get_latest_atr(self, symbol_id: int, timeframe_id: int, indicator_name: str = 'atr_14'):
+        """Read the most recent ATR value written by the indicator engine (None if missing)."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(
+                "SELECT value FROM indicators WHERE symbol_id = ? AND timeframe_id = ? AND indicator_name = ? "
+                "ORDER BY timestamp DESC LIMIT 1",
+                (symbol_id, timeframe_id, indicator_name)
+            ).fetchone()
+        finally:
+            conn.close()
+        return None if row is None else row[0]
+
+    def calculate_sl_tp(self, entry_price: float, symbol_id: int = None, timeframe_id: int = None, atr_value: float = None):
         """Calculate Stop Loss and Take Profit based on dynamic strategy."""
-        atr_multiplier = float(self.settings.get('stop_loss_atr_multiplier', 1.5))
-        atr_value = 20  # فرضی — در پروژه واقعی این مقدار از اندیکاتور گرفته می‌شود
-        sl_distance = atr_multiplier * atr_value
-        tp_distance = sl_distance * float(self.settings.get('take_profit_ratio', 2))
+        settings = self.snapshot()
+        if atr_value is None and symbol_id is not None and timeframe_id is not None:
+            atr_value = self.get_latest_atr(symbol_id, timeframe_id)
+        if atr_value is None:
+            atr_value = DEFAULT_ATR_VALUE
+            self.logger.warning("مقدار ATR پیدا نشد، از مقدار پیش‌فرض %s استفاده می‌شود.", atr_value)
+        sl_distance = settings.stop_loss_atr_multiplier * atr_value
+        tp_distance = sl_distance * settings.take_profit_ratio
 
         stop_loss = entry_price - sl_distance
         take_profit = entry_price + tp_distance
-        self.logger.info(f"SL: {stop_loss}, TP: {take_profit} برای قیمت ورود: {entry_price}")
+        self.logger.debug("SL: %s, TP: %s برای قیمت ورود: %s", stop_loss, take_profit, entry_price)
         return stop_loss, take_profit
 
+    def calculate_sl_tp_batch(self, entry_prices, atr_values, directions=1):
+        """SL/TP arrays for many signals at once; directions +1 (buy) / -1 (sell), NaN ATR uses the default."""
+        settings = self.snapshot()
+        entry_prices = np.asarray(entry_prices, dtype=np.float64)
+        atr_values = np.broadcast_to(np.asarray(atr_values, dtype=np.float64), entry_prices.shape)
+        missing = np.isnan(atr_values)
+        if missing.any():
+            atr_values = np.where(missing, DEFAULT_ATR_VALUE, atr_values)
+            self.logger.warning("مقدار ATR برای %d سیگنال پیدا نشد، از مقدار پیش‌فرض %s استفاده می‌شود.",
+                                int(missing.sum()), DEFAULT_ATR_VALUE)
+        return sl_tp_levels(entry_prices, atr_values, directions,
+                            settings.stop_loss_atr_multiplier, settings.take_profit_ratio)
+
     def is_position_allowed(self, open_positions: int):
         """Check if a new position is allowed."""
         if open_positions >= 1:
             self.logger.warning("مجاز به باز کردن پوزیشن جدید نیستید. فقط یک پوزیشن همزمان مجاز است.")
             return False
-        self.logger.info("باز کردن پوزیشن جدید مجاز است.")
+        self.logger.debug("باز کردن پوزیشن جدید مجاز است.")
         return True
@@ -0,0 +1,329 @@
+import argparse
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from b_config.c_database_config import DEFAULT_DB_PATH
+from b_config.e_trading_config import TradingRiskConfig, position_size, sl_tp_levels, symbol_contract_size
+from c_database.d_candle_cache import get_candle_cache
+from e_data_ingestion.f_indicator_engine import ATR
+
+# موجودی اولیه حساب در بک‌تست
+INITIAL_BALANCE = 10000.0
+
+# حداکثر مدت نگهداری پوزیشن (کندل)؛ بعد از آن با قیمت بسته شدن خارج می‌شود
+MAX_HOLDING_BARS = 1440
+
+# بیشتر معاملات در چند کندل اول بسته می‌شوند: بررسی از یک بلوک کوچک شروع می‌شود و فقط
+# معاملات باز مانده بلوک بعدی (۴ برابر بزرگ‌تر) را می‌بینند
+EXIT_FIRST_BLOCK = 32
+
+# حداکثر خانه‌های ماتریس (معامله × کندل) در هر مرحله، برای محدود ماندن حافظه
+EXIT_CHUNK_CELLS = 2_000_000
+
+# اندازه point وقتی digits نماد در جدول symbols ثبت نشده
+DEFAULT_POINT = 0.00001
+
+# اندازه قرارداد پیش‌فرض select_trades/run_backtest وقتی فراخواننده آن را نمی‌دهد (لات استاندارد فارکس)؛
+# بک‌تست یک نماد از دیتابیس همیشه contract_size خود نماد را می‌خواند (symbol_contract_size)
+DEFAULT_CONTRACT_SIZE = 100000.0
+
+# ستون‌های اضافه شده به backtest_results (برای دیتابیس‌های قدیمی‌تر)
+BACKTEST_COLUMNS = {
+    "sharpe_ratio": "FLOAT",
+    "symbol_id": "INTEGER REFERENCES symbols(id)",
+    "timeframe_id": "INTEGER REFERENCES timeframes(id)",
+}
+
+EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, EXIT_TIME = 0, 1, 2
+
+
+def ensure_backtest_columns(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(backtest_results)")}
+    for name, ddl in BACKTEST_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE backtest_results ADD COLUMN {name} {ddl}")
+    conn.commit()
+
+
+def _epoch_seconds(values):
+    """تبدیل ستون زمان متنی به epoch ثانیه (مستقل از دقت datetime در نسخه pandas)"""
+    return pd.to_datetime(values).to_numpy().astype("datetime64[s]").astype(np.int64)
+
+
+def load_prediction_signals(conn, symbol_id, timeframe_id, model_version_id=None):
+    """سیگنال‌های signal_predictions (اختیاری: فقط یک نسخه مدل). خروجی: (زمان‌ها epoch، جهت ±1)"""
+    query = "SELECT timestamp, predicted_signal FROM signal_predictions WHERE symbol_id = ? AND timeframe_id = ?"
+    params = [symbol_id, timeframe_id]
+    if model_version_id is not None:
+        query += " AND model_version_id = ?"
+        params.append(model_version_id)
+    df = pd.read_sql_query(query + " ORDER BY timestamp", conn, params=params)
+    times = _epoch_seconds(df['timestamp'])
+    return times, np.where(df['predicted_signal'].str.upper() == 'BUY', 1, -1)
+
+
+def load_table_signals(conn, symbol_id, timeframe_id):
+    """سیگنال‌های جدول signals. خروجی: (زمان‌ها epoch، جهت ±1)"""
+    df = pd.read_sql_query(
+        "SELECT signal_time, signal_type FROM signals WHERE symbol_id = ? AND timeframe_id = ? ORDER BY signal_time",
+        conn, params=(symbol_id, timeframe_id)
+    )
+    times = _epoch_seconds(df['signal_time'])
+    return times, np.where(df['signal_type'].str.upper() == 'BUY', 1, -1)
+
+
+def symbol_point(conn, symbol_id):
+    row = conn.execute("SELECT digits FROM symbols WHERE id = ?", (symbol_id,)).fetchone()
+    return DEFAULT_POINT if row is None or row[0] is None else 10.0 ** -row[0]
+
+
+def _first_hit(mask):
+    """اندیس اولین True در هر ردیف (یا طول ردیف اگر وجود نداشته باشد)"""
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), mask.shape[1])
+
+
+def simulate_exits(candles, entry_idx, direction, stop_loss, take_profit, spread_price, max_holding=MAX_HOLDING_BARS):
+    """
+    محاسبه برداری خروج همه معاملات کاندید به صورت مستقل (ماتریس معامله × کندل‌های بعد از ورود).
+    قیمت‌ها bid هستند: خرید با bid بسته می‌شود و فروش با ask = bid + spread.
+    اگر SL و TP در یک کندل لمس شوند، SL (حالت محافظه‌کارانه) در نظر گرفته می‌شود؛ گپ قیمت با open پر می‌شود.
+    خروجی: (اندیس کندل خروج، قیمت خروج، نوع خروج)
+    """
+    n = len(candles["close"])
+    exit_idx = np.empty(len(entry_idx), dtype=np.int64)
+    exit_price = np.empty(len(entry_idx))
+    reason = np.empty(len(entry_idx), dtype=np.int8)
+    last = np.minimum(n - 1 - entry_idx, max_holding - 1)  # فاصله آخرین کندل مجاز (خروج زمانی)
+    pending = np.arange(len(entry_idx))
+    start, width = 0, EXIT_FIRST_BLOCK
+    while len(pending):
+        width = min(width, max_holding - start)
+        offsets = start + np.arange(width)
+        still_open = []
+        for a in range(0, len(pending), max(1, EXIT_CHUNK_CELLS // width)):
+            idx = pending[a:a + max(1, EXIT_CHUNK_CELLS // width)]
+            bars = np.minimum(entry_idx[idx, None] + offsets, n - 1)  # (معامله، کندل)
+            valid = offsets <= last[idx, None]
+            # قیمت‌های طرف بسته شدن: bid برای خرید، ask برای فروش
+            shift = np.where(direction[idx, None] < 0, spread_price[bars], 0.0)
+            high, low, open_ = candles["high"][bars] + shift, candles["low"][bars] + shift, candles["open"][bars] + shift
+            d, sl, tp = direction[idx], stop_loss[idx], take_profit[idx]
+
+            sl_hit = valid & np.where(d[:, None] > 0, low <= sl[:, None], high >= sl[:, None])
+            tp_hit = valid & np.where(d[:, None] > 0, high >= tp[:, None], low <= tp[:, None])
+            first_sl, first_tp = _first_hit(sl_hit), _first_hit(tp_hit)
+            is_sl = (first_sl < width) & (first_sl <= first_tp)
+            is_tp = ~is_sl & (first_tp < width)
+            is_time = ~is_sl & ~is_tp & (last[idx] < start + width)
+            step = np.where(is_sl, first_sl, np.where(is_tp, first_tp, np.clip(last[idx] - start, 0, width - 1)))
+            rows = np.arange(len(idx))
+            gap_open = open_[rows, step]
+
+            price = candles["close"][bars[rows, step]] + shift[rows, step]  # خروج زمانی
+            # گپ: اگر کندل بعد از SL/TP باز شود، با open پر می‌شود
+            price = np.where(is_sl, np.where(d > 0, np.minimum(sl, gap_open), np.maximum(sl, gap_open)), price)
+            price = np.where(is_tp, np.where(d > 0, np.maximum(tp, gap_open), np.minimum(tp, gap_open)), price)
+
+            done = is_sl | is_tp | is_time
+            closed = idx[done]
+            exit_idx[closed] = entry_idx[closed] + start + step[done]
+            exit_price[closed] = price[done]
+            reason[closed] = np.where(is_sl, EXIT_STOP_LOSS, np.where(is_tp, EXIT_TAKE_PROFIT, EXIT_TIME))[done]
+            still_open.append(idx[~done])
+        pending = np.concatenate(still_open)
+        start += width
+        width *= 4
+    return exit_idx, exit_price, reason
+
+
+def signal_bars(times, atr, signal_times, signal_directions):
+    """اندیس کندل هر سیگنال (آخرین کندل بسته شده تا زمان سیگنال)؛ سیگنال‌های بدون کندل بعدی یا ATR حذف می‌شوند"""
+    signal_idx = np.searchsorted(times, np.asarray(signal_times, dtype=np.int64), side="right") - 1
+    keep = (signal_idx >= 0) & (signal_idx + 1 < len(times)) & ~np.isnan(atr[np.maximum(signal_idx, 0)])
+    return signal_idx[keep], np.asarray(signal_directions, dtype=np.int64)[keep]
+
+
+def candidate_trades(candles, atr, signal_idx, direction, atr_multiplier, take_profit_ratio,
+                     point=DEFAULT_POINT, max_holding=MAX_HOLDING_BARS):
+    """
+    معامله کاندید برای هر سیگنال: ورود با open کندل بعد (خرید با ask = open + spread)،
+    SL/TP مثل TradingRiskConfig.calculate_sl_tp از ATR کندل سیگنال، و خروج مستقل هر معامله.
+    به حجم و موجودی بستگی ندارد، پس برای درصدهای ریسک مختلف یک بار محاسبه می‌شود.
+    """
+    entry_idx = signal_idx + 1
+    spread_price = candles["spread"] * point
+    entry_price = candles["open"][entry_idx] + np.where(direction > 0, spread_price[entry_idx], 0.0)
+    sl_distance = atr_multiplier * atr[signal_idx]
+    stop_loss, take_profit = sl_tp_levels(entry_price, atr[signal_idx], direction, atr_multiplier, take_profit_ratio)
+    exit_idx, exit_price, reason = simulate_exits(candles, entry_idx, direction, stop_loss, take_profit, spread_price, max_holding)
+    return {
+        "entry_idx": entry_idx, "direction": direction, "entry_price": entry_price, "sl_distance": sl_distance,
+        "stop_loss": stop_loss, "take_profit": take_profit,
+        "exit_idx": exit_idx, "exit_price": exit_price, "reason": reason,
+    }
+
+
+def select_trades(candidates, risk_percent, min_lot, max_lot, initial_balance=INITIAL_BALANCE,
+                  contract_size=DEFAULT_CONTRACT_SIZE):
+    """
+    انتخاب ترتیبی معاملات غیرهم‌پوشان (فقط یک پوزیشن همزمان، مثل is_position_allowed) و حجم
+    از موجودی فعلی با position_size (همان قاعده calculate_position_size). فقط روی معاملات حلقه می‌زند، نه کندل‌ها.
+    خروجی: (اندیس معاملات انتخاب شده، حجم‌ها، سودها)
+    """
+    entry_idx, exit_idx = candidates["entry_idx"].tolist(), candidates["exit_idx"].tolist()
+    sl_distance = candidates["sl_distance"].tolist()
+    move = (candidates["direction"] * (candidates["exit_price"] - candidates["entry_price"])).tolist()
+    taken, volumes, profits = [], [], []
+    balance, busy_until = initial_balance, -1
+    for i in range(len(entry_idx)):
+        if entry_idx[i] <= busy_until or sl_distance[i] <= 0:
+            continue
+        volume = position_size(balance, sl_distance[i], risk_percent, min_lot, max_lot, contract_size)
+        profit = move[i] * volume * contract_size
+        balance += profit
+        busy_until = exit_idx[i]
+        taken.append(i)
+        volumes.append(volume)
+        profits.append(profit)
+    return np.array(taken, dtype=np.int64), np.array(volumes), np.array(profits)
+
+
+def run_backtest(candles, signal_times, signal_directions, risk_settings, point=DEFAULT_POINT,
+                 initial_balance=INITIAL_BALANCE, max_holding=MAX_HOLDING_BARS, atr_period=14,
+                 contract_size=DEFAULT_CONTRACT_SIZE):
+    """
+    بک‌تست سیگنال‌ها روی کندل‌ها با تنظیمات ریسک (RiskSettings از TradingRiskConfig.snapshot).
+    ورود با open کندل بعد از سیگنال (بدون نگاه به آینده). خروجی: DataFrame معاملات.
+    """
+    times = np.asarray(candles["time"], dtype=np.int64)
+    candles = {name: np.asarray(candles[name], dtype=np.float64) for name in ("open", "high", "low", "close", "spread")}
+    atr = ATR(atr_period).batch(candles["high"], candles["low"], candles["close"])[f"atr_{atr_period}"]
+    signal_idx, direction = signal_bars(times, atr, signal_times, signal_directions)
+
+    trades = candidate_trades(
+        candles, atr, signal_idx, direction, risk_settings.stop_loss_atr_multiplier, risk_settings.take_profit_ratio,
+        point, max_holding
+    )
+    taken, volumes, profits = select_trades(
+        trades, risk_settings.max_risk_percent, risk_settings.min_lot, risk_settings.max_lot, initial_balance,
+        contract_size
+    )
+    return pd.DataFrame({
+        "entry_time": times[trades["entry_idx"][taken]],
+        "exit_time": times[trades["exit_idx"][taken]],
+        "direction": trades["direction"][taken],
+        "entry_price": trades["entry_price"][taken],
+        "exit_price": trades["exit_price"][taken],
+        "stop_loss": trades["stop_loss"][taken],
+        "take_profit": trades["take_profit"][taken],
+        "volume": volumes,
+        "profit": profits,
+        "exit_reason": pd.Categorical.from_codes(trades["reason"][taken], ["stop_loss", "take_profit", "time"]),
+    })
+
+
+def equity_metrics(exit_times, profits, initial_balance=INITIAL_BALANCE):
+    """
+    سود، حداکثر افت (درصد از قله equity)، نرخ برد و Sharpe سالانه بر اساس بازده روزانه.
+    ورودی‌ها آرایه‌های numpy به ترتیب زمان خروج هستند (بدون DataFrame، برای sweep سریع).
+    """
+    if len(profits) == 0:
+        return {"total_trades": 0, "profit": 0.0, "drawdown": 0.0, "win_rate": 0.0, "sharpe_ratio": 0.0}
+    equity = initial_balance + np.cumsum(profits)
+    curve = np.concatenate(([initial_balance], equity))
+    peak = np.maximum.accumulate(curve)
+    drawdown = float(((peak - curve) / peak).max() * 100)
+
+    days = np.asarray(exit_times, dtype=np.int64) // 86400
+    day_starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    daily_profit = np.add.reduceat(profits, day_starts)
+    start_equity = initial_balance + np.concatenate(([0.0], np.cumsum(daily_profit)[:-1]))
+    daily_return = daily_profit / start_equity
+    sharpe = 0.0
+    if len(daily_return) > 1 and daily_return.std(ddof=1) > 0:
+        sharpe = float(daily_return.mean() / daily_return.std(ddof=1) * np.sqrt(252))
+    return {
+        "total_trades": len(profits),
+        "profit": float(equity[-1] - initial_balance),
+        "drawdown": drawdown,
+        "win_rate": float((profits > 0).mean()),
+        "sharpe_ratio": sharpe,
+    }
+
+
+def backtest_metrics(trades, initial_balance=INITIAL_BALANCE):
+    """معیارهای equity_metrics برای DataFrame معاملات run_backtest"""
+    return equity_metrics(trades["exit_time"].to_numpy(), trades["profit"].to_numpy(dtype=np.float64), initial_balance)
+
+
+def save_backtest_result(conn, metrics, model_version_id, symbol_id, timeframe_id, start_time, end_time):
+    """ذخیره یک ردیف در backtest_results مرتبط با نسخه مدل"""
+    ensure_backtest_columns(conn)
+    cursor = conn.execute("""
+        INSERT INTO backtest_results
+            (model_version_id, start_date, end_date, total_trades, profit, drawdown, win_rate, sharpe_ratio, symbol_id, timeframe_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        model_version_id,
+        pd.to_datetime(start_time, unit="s").strftime('%Y-%m-%d %H:%M:%S.%f'),
+        pd.to_datetime(end_time, unit="s").strftime('%Y-%m-%d %H:%M:%S.%f'),
+        metrics["total_trades"], metrics["profit"], metrics["drawdown"], metrics["win_rate"], metrics["sharpe_ratio"],
+        symbol_id, timeframe_id,
+    ))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def backtest_model_version(db_path, symbol_id, timeframe_id, model_version_id=None, source="predictions",
+                           start=None, end=None, initial_balance=INITIAL_BALANCE, max_holding=MAX_HOLDING_BARS, save=True):
+    """بک‌تست کامل یک نماد/تایم‌فریم از دیتابیس و ذخیره نتیجه. خروجی: (معاملات، معیارها)"""
+    candles = get_candle_cache(db_path).get(symbol_id, timeframe_id, start, end,
+                                            columns=("time", "open", "high", "low", "close", "spread"))
+    conn = sqlite3.connect(db_path)
+    try:
+        if source == "predictions":
+            signal_times, directions = load_prediction_signals(conn, symbol_id, timeframe_id, model_version_id)
+        else:
+            signal_times, directions = load_table_signals(conn, symbol_id, timeframe_id)
+        risk_settings = TradingRiskConfig(db_path).snapshot()
+        started = time.perf_counter()
+        trades = run_backtest(candles, signal_times, directions, risk_settings, symbol_point(conn, symbol_id),
+                              initial_balance, max_holding, contract_size=symbol_contract_size(conn, symbol_id))
+        metrics = backtest_metrics(trades, initial_balance)
+        print(f"⏱️ بک‌تست {len(candles['time'])} کندل و {len(signal_times)} سیگنال در {time.perf_counter() - started:.2f} ثانیه")
+        if save and len(candles["time"]):
+            metrics["id"] = save_backtest_result(conn, metrics, model_version_id, symbol_id, timeframe_id,
+                                                 int(candles["time"][0]), int(candles["time"][-1]))
+    finally:
+        conn.close()
+    return trades, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بک‌تست برداری سیگنال‌ها و ذخیره در backtest_results")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--symbol-id", type=int, required=True)
+    parser.add_argument("--timeframe-id", type=int, default=1)
+    parser.add_argument("--model-version", type=int, default=None)
+    parser.add_argument("--source", choices=("predictions", "signals"), default="predictions")
+    parser.add_argument("--balance", type=float, default=INITIAL_BALANCE)
+    parser.add_argument("--max-holding", type=int, default=MAX_HOLDING_BARS)
+    args = parser.parse_args()
+
+    trades, metrics = backtest_model_version(
+        args.db, args.symbol_id, args.timeframe_id, args.model_version, args.source,
+        initial_balance=args.balance, max_holding=args.max_holding,
+    )
+    if not metrics["total_trades"]:
+        print("❌ هیچ معامله‌ای انجام نشد.")
+        sys.exit(1)
+    print(f"✅ معاملات: {metrics['total_trades']}, سود: {metrics['profit']:.2f}, افت: {metrics['drawdown']:.2f}%, "
+          f"نرخ برد: {metrics['win_rate']:.2%}, Sharpe: {metrics['sharpe_ratio']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import json
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from c_database.e_feature_store import get_feature_store
+
+
+class _SeededSmoother:
+    """
+    هموارسازی نمایی y_t = α·x_t + (1-α)·y_{t-1} که با میانگین ساده n مقدار اول شروع می‌شود
+    (EMA با α=2/(n+1) و Wilder با α=1/n). محاسبه دسته‌ای با lfilter و ادامه از وضعیت قبلی.
+    """
+
+    def __init__(self, n, alpha):
+        self.n = n
+        self.alpha = alpha
+        self.value = None
+        self.seed = []
+
+    def batch(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        out = np.full(len(x), np.nan)
+        valid = np.flatnonzero(~np.isnan(x))  # مقادیر NaN فقط در ابتدای ورودی‌های مشتق شده (warmup) هستند
+        if len(valid) == 0:
+            return out
+        values = x[valid]
+        start = 0
+        if self.value is None:
+            need = self.n - len(self.seed)
+            self.seed.extend(values[:need].tolist())
+            start = min(need, len(values))
+            if len(self.seed) < self.n:
+                return out
+            self.value = float(np.mean(self.seed))
+            self.seed = []
+            out[valid[start - 1]] = self.value
+        rest = values[start:]
+        if len(rest):
+            from scipy.signal import lfilter  # import سنگین (~1 ثانیه)، فقط در اولین محاسبه
+            decay = 1.0 - self.alpha
+            y, _ = lfilter([self.alpha], [1.0, -decay], rest, zi=[decay * self.value])
+            out[valid[start:]] = y
+            self.value = float(y[-1])
+        return out
+
+    def get_state(self):
+        return {"value": self.value, "seed": self.seed}
+
+    def set_state(self, state):
+        self.value = state["value"]
+        self.seed = list(state["seed"])
+
+
+class _RollingWindow:
+    """پنجره غلتان n تایی؛ n-1 مقدار آخر برای ادامه محاسبه نگه داشته می‌شود"""
+
+    def __init__(self, n):
+        self.n = n
+        self.tail = []
+
+    def windows(self, x):
+        """برای هر مقدار جدید x پنجره n تایی منتهی به آن (یا None برای مقادیر warmup)"""
+        full = np.concatenate((np.asarray(self.tail, dtype=np.float64), np.asarray(x, dtype=np.float64)))
+        offset = len(self.tail)
+        self.tail = full[-(self.n - 1):].tolist() if self.n > 1 else []
+        if len(full) < self.n:
+            return None, len(x)
+        views = sliding_window_view(full, self.n)
+        # پنجره i به اندیس i+n-1 در full ختم می‌شود؛ اولین مقدار جدید در اندیس offset است
+        first = max(offset - (self.n - 1), 0)
+        skipped = len(x) - (len(views) - first)
+        return views[first:], skipped
+
+    def get_state(self):
+        return {"tail": self.tail}
+
+    def set_state(self, state):
+        self.tail = list(state["tail"])
+
+
+class SMA:
+    def __init__(self, n=20):
+        self.key = f"sma_{n}"
+        self.window = _RollingWindow(n)
+
+    def batch(self, high, low, close):
+        out = np.full(len(close), np.nan)
+        views, skipped = self.window.windows(close)
+        if views is not None:
+            out[skipped:] = views.mean(axis=1)
+        return {self.key: out}
+
+    def get_state(self):
+        return self.window.get_state()
+
+    def set_state(self, state):
+        self.window.set_state(state)
+
+
+class EMA:
+    def __init__(self, n=20):
+        self.key = f"ema_{n}"
+        self.smoother = _SeededSmoother(n, 2.0 / (n + 1))
+
+    def batch(self, high, low, close):
+        return {self.key: self.smoother.batch(close)}
+
+    def get_state(self):
+        return self.smoother.get_state()
+
+    def set_state(self, state):
+        self.smoother.set_state(state)
+
+
+class RSI:
+    """RSI با هموارسازی Wilder روی سود و زیان تغییرات قیمت بسته شدن"""
+
+    def __init__(self, n=14):
+        self.key = f"rsi_{n}"
+        self.gain = _SeededSmoother(n, 1.0 / n)
+        self.loss = _SeededSmoother(n, 1.0 / n)
+        self.prev_close = None
+
+    def batch(self, high, low, close):
+        close = np.asarray(close, dtype=np.float64)
+        prev = np.concatenate(([np.nan if self.prev_close is None else self.prev_close], close[:-1]))
+        change = close - prev
+        self.prev_close = float(close[-1])
+        avg_gain = self.gain.batch(np.where(np.isnan(change), np.nan, np.clip(change, 0, None)))
+        avg_loss = self.loss.batch(np.where(np.isnan(change), np.nan, np.clip(-change, 0, None)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        rsi[(avg_loss == 0) & ~np.isnan(avg_gain)] = 100.0
+        return {self.key: rsi}
+
+    def get_state(self):
+        return {"gain": self.gain.get_state(), "loss": self.loss.get_state(), "prev_close": self.prev_close}
+
+    def set_state(self, state):
+        self.gain.set_state(state["gain"])
+        self.loss.set_state(state["loss"])
+        self.prev_close = state["prev_close"]
+
+
+class ATR:
+    """Average True Range با هموارسازی Wilder"""
+
+    def __init__(self, n=14):
+        self.key = f"atr_{n}"
+        self.smoother = _SeededSmoother(n, 1.0 / n)
+        self.prev_close = None
+
+    def batch(self, high, low, close):
+        high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+        prev = np.concatenate(([np.nan if self.prev_close is None else self.prev_close], close[:-1]))
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+        self.prev_close = float(close[-1])
+        return {self.key: self.smoother.batch(true_range)}
+
+    def get_state(self):
+        return {"smoother": self.smoother.get_state(), "prev_close": self.prev_close}
+
+    def set_state(self, state):
+        self.smoother.set_state(state["smoother"])
+        self.prev_close = state["prev_close"]
+
+
+class Bollinger:
+    def __init__(self, n=20, k=2.0):
+        self.keys = (f"bb_upper_{n}", f"bb_middle_{n}", f"bb_lower_{n}")
+        self.k = k
+        self.window = _RollingWindow(n)
+
+    def batch(self, high, low, close):
+        upper, middle, lower = (np.full(len(close), np.nan) for _ in range(3))
+        views, skipped = self.window.windows(close)
+        if views is not None:
+            mean = views.mean(axis=1)
+            std = views.std(axis=1)
+            middle[skipped:] = mean
+            upper[skipped:] = mean + self.k * std
+            lower[skipped:] = mean - self.k * std
+        return dict(zip(self.keys, (upper, middle, lower)))
+
+    def get_state(self):
+        return self.window.get_state()
+
+    def set_state(self, state):
+        self.window.set_state(state)
+
+
+class MACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        prefix = f"macd_{fast}_{slow}_{signal}"
+        self.keys = (prefix, f"{prefix}_signal", f"{prefix}_hist")
+        self.fast = _SeededSmoother(fast, 2.0 / (fast + 1))
+        self.slow = _SeededSmoother(slow, 2.0 / (slow + 1))
+        self.signal = _SeededSmoother(signal, 2.0 / (signal + 1))
+
+    def batch(self, high, low, close):
+        macd = self.fast.batch(close) - self.slow.batch(close)
+        signal = self.signal.batch(macd)
+        return dict(zip(self.keys, (macd, signal, macd - signal)))
+
+    def get_state(self):
+        return {"fast": self.fast.get_state(), "slow": self.slow.get_state(), "signal": self.signal.get_state()}
+
+    def set_state(self, state):
+        self.fast.set_state(state["fast"])
+        self.slow.set_state(state["slow"])
+        self.signal.set_state(state["signal"])
+
+
+def default_indicators():
+    return [SMA(20), EMA(20), EMA(50), RSI(14), ATR(14), Bollinger(20, 2.0), MACD(12, 26, 9)]
+
+
+class IndicatorEngine:
+    """
+    موتور اندیکاتورها برای یک سری (نماد، تایم‌فریم). کندل‌های جدید به صورت برداری پردازش می‌شوند
+    و وضعیت بازگشتی (EMA، Wilder، پنجره‌ها) ادامه پیدا می‌کند؛ پس هر کندل جدید فقط یک بار محاسبه می‌شود.
+    """
+
+    def __init__(self, indicators=None):
+        self.indicators = indicators if indicators is not None else default_indicators()
+        self.last_time = None
+
+    def process(self, times, high, low, close):
+        """محاسبه همه اندیکاتورها برای کندل‌های جدید؛ خروجی: نام اندیکاتور ← آرایه (NaN در warmup)"""
+        values = {}
+        for indicator in self.indicators:
+            values.update(indicator.batch(high, low, close))
+        if len(times):
+            self.last_time = int(times[-1])
+        return values
+
+    def update(self, time, high, low, close):
+        """به‌روزرسانی با یک کندل (مسیر زنده)؛ خروجی: نام اندیکاتور ← مقدار"""
+        values = self.process([time], [high], [low], [close])
+        return {name: float(v[0]) for name, v in values.items()}
+
+    def dumps(self):
+        return json.dumps([indicator.get_state() for indicator in self.indicators])
+
+    def loads(self, state, last_time):
+        for indicator, indicator_state in zip(self.indicators, json.loads(state)):
+            indicator.set_state(indicator_state)
+        self.last_time = last_time
+
+
+def update_series_indicators(conn, symbol_id, timeframe_id, indicators=None, commit=True):
+    """
+    محاسبه افزایشی اندیکاتورهای یک سری از آخرین کندل پردازش شده و نوشتن دسته‌ای در جدول indicators.
+    خروجی: تعداد ردیف نوشته شده.
+    """
+    engine = IndicatorEngine(indicators)
+    row = conn.execute(
+        "SELECT last_time, state FROM indicator_state WHERE symbol_id = ? AND timeframe_id = ?", (symbol_id, timeframe_id)
+    ).fetchone()
+    if row is not None:
+        engine.loads(row[1], row[0])
+
+    candles = conn.execute("""
+        SELECT time, high, low, close FROM candles
+        WHERE symbol_id = ? AND timeframe_id = ? AND time > ?
+        ORDER BY time
+    """, (symbol_id, timeframe_id, -1 if engine.last_time is None else engine.last_time)).fetchall()
+    if not candles:
+        return 0
+    data = np.array(candles, dtype=np.float64)
+    times = data[:, 0].astype(np.int64)
+    values = engine.process(times, data[:, 1], data[:, 2], data[:, 3])
+
+    time_list = times.tolist()
+    rows = []
+    for name, series in values.items():
+        valid = np.flatnonzero(~np.isnan(series))
+        rows.extend(zip(
+            [symbol_id] * len(valid), [timeframe_id] * len(valid), [time_list[i] for i in valid],
+            [name] * len(valid), series[valid].tolist()
+        ))
+    conn.executemany(
+        "INSERT OR REPLACE INTO indicators (symbol_id, timeframe_id, timestamp, indicator_name, value) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    # همان مقادیر به صورت عریض در انبار ویژگی‌ها برای خواندن سریع داده آموزش
+    get_feature_store().append(symbol_id, timeframe_id, times, values)
+    conn.execute(
+        "INSERT OR REPLACE INTO indicator_state (symbol_id, timeframe_id, last_time, state) VALUES (?, ?, ?, ?)",
+        (symbol_id, timeframe_id, engine.last_time, engine.dumps())
+    )
+    if commit:
+        conn.commit()
+    return len(rows)
+
+
+def update_all_indicators(conn, commit=True):
+    """به‌روزرسانی اندیکاتورهای همه سری‌های موجود در candles"""
+    total = 0
+    for symbol_id, timeframe_id in conn.execute("SELECT DISTINCT symbol_id, timeframe_id FROM candles").fetchall():
+        total += update_series_indicators(conn, symbol_id, timeframe_id, commit=commit)
+    print(f"📈 {total} مقدار اندیکاتور ذخیره شد.")
+    return total
+
+
+def get_latest_indicator(conn, symbol_id, timeframe_id, indicator_name):
+    """آخرین مقدار یک اندیکاتور (یا None)"""
+    row = conn.execute("""
+        SELECT value FROM indicators
+        WHERE symbol_id = ? AND timeframe_id = ? AND indicator_name = ?
+        ORDER BY timestamp DESC LIMIT 1
+    """, (symbol_id, timeframe_id, indicator_name)).fetchone()
+    return None if row is None else row[0]
@@ -1,26 +1,169 @@
+import atexit
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import threading
+import time
 from pathlib import Path
 
 # مسیر پوشه لاگ‌ها (logs) در ریشه پروژه
 LOG_DIR = Path(__file__).parent.parent / 'logs'
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
-def get_logger(name: str, level=logging.INFO, log_to_file=True):
+# حالت غیرهمزمان: لاگرها فقط رکورد را در صف می‌گذارند و نوشتن در کنسول/فایل در thread پس‌زمینه انجام می‌شود.
+# پیش‌فرض همزمان است؛ مسیرهای پرتکرار (هر کندل/هر سفارش) با async_mode=True آن را صریحاً روشن می‌کنند
+LOG_ASYNC = os.getenv("LOG_ASYNC", "0") == "1"
+
+# خروجی JSON (یک خط برای هر رکورد) به جای متن ساده
+LOG_JSON = os.getenv("LOG_JSON", "0") == "1"
+
+# محدودیت پیش‌فرض تعداد رکورد در ثانیه برای هر محل فراخوانی لاگ (0 = بدون محدودیت)
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "0"))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# آرگومان‌هایی که می‌توان بدون قالب‌بندی به thread پس‌زمینه فرستاد (تغییرناپذیر)
+_IMMUTABLE_ARG_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+class TextFormatter(logging.Formatter):
+    """قالب متنی پروژه؛ تعداد رکوردهای حذف شده توسط RateLimitFilter به انتهای پیام اضافه می‌شود"""
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f"{text} (+{suppressed} suppressed)" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """هر رکورد یک خط JSON با زمان، سطح، نام لاگر، پیام و (در صورت وجود) exception"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    محدودیت نرخ برای رویدادهای پرتکرار (token bucket جدا برای هر محل فراخوانی لاگ).
+    رکوردهای اضافه قبل از قالب‌بندی و صف حذف می‌شوند و تعدادشان روی رکورد مجاز بعدی ثبت می‌شود.
+    """
+
+    def __init__(self, rate, burst=None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._buckets = {}  # (مسیر فایل، شماره خط) -> [توکن‌ها، آخرین زمان، تعداد حذف شده]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            record.suppressed, bucket[2] = bucket[2], 0
+        return True
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    رکورد بدون قالب‌بندی همراه با هندلرهای کنسول/فایل همین QueueHandler در صف گذاشته می‌شود؛
+    getMessage و format در thread پس‌زمینه اجرا می‌شوند. رکوردهای لاگرهای فرزند (مثلاً main.sub)
+    که به این هندلر propagate می‌شوند هم به همین هندلرها می‌رسند.
+    اگر آرگومانی تغییرپذیر باشد (لیست، dict، شیء) پیام همین‌جا ساخته می‌شود تا مقدار لحظه لاگ ثبت شود.
+    """
+
+    def __init__(self, queue, handlers):
+        super().__init__(queue)
+        self.handlers = handlers
+
+    def prepare(self, record):
+        args = record.args
+        if args:
+            values = args.values() if isinstance(args, dict) else args
+            if not all(isinstance(value, _IMMUTABLE_ARG_TYPES) for value in values):
+                record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record):
+        self.queue.put_nowait((self.handlers, record))
+
+
+class _RoutingHandler(logging.Handler):
+    """در thread پس‌زمینه، هر رکورد را به هندلرهای QueueHandler ای که آن را در صف گذاشته می‌فرستد"""
+
+    def handle(self, item):
+        handlers, record = item
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+_log_queue = queue.SimpleQueue()
+_router = _RoutingHandler()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_log_queue, _router)
+            _listener.start()
+            atexit.register(stop_logging)
+
+
+def stop_logging():
+    """خالی کردن صف و توقف thread لاگ (در خروج برنامه خودکار صدا زده می‌شود)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: str, level=logging.INFO, log_to_file=True, async_mode=None, json_format=None, rate_limit=None):
     """
     ساخت و بازگشت لاگر با نام مشخص.
     لاگ‌ها به کنسول و به فایل در پوشه logs ذخیره می‌شوند.
-    
+
     پارامترها:
     - name: نام لاگر (معمولاً نام ماژول یا بخش)
     - level: سطح لاگ (مثلاً logging.INFO، logging.DEBUG)
     - log_to_file: اگر True باشد لاگ‌ها به فایل هم ذخیره می‌شوند
+    - async_mode: نوشتن از طریق صف و thread پس‌زمینه (پیش‌فرض LOG_ASYNC)
+    - json_format: خروجی JSON (پیش‌فرض LOG_JSON)
+    - rate_limit: حداکثر رکورد در ثانیه برای هر محل فراخوانی (پیش‌فرض LOG_RATE_LIMIT)
     """
+    async_mode = LOG_ASYNC if async_mode is None else async_mode
+    json_format = LOG_JSON if json_format is None else json_format
+    rate_limit = LOG_RATE_LIMIT if rate_limit is None else rate_limit
+
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = JsonFormatter() if json_format else TextFormatter(TEXT_FORMAT)
 
     # جلوگیری از اضافه شدن چندباره هندلرها
     if not logger.hasHandlers():
@@ -28,18 +171,30 @@ def get_logger(name: str, level=logging.INFO, log_to_file=True):
         ch = logging.StreamHandler()
         ch.setLevel(level)
         ch.setFormatter(formatter)
-        logger.addHandler(ch)
+        handlers = [ch]
 
         if log_to_file:
             # لاگ فایل با چرخش روزانه و نگهداری ۷ روز
             fh = logging.handlers.TimedRotatingFileHandler(
-                filename=LOG_DIR / f'{name}.log',
+                filename=LOG_DIR / f'{name}{".jsonl" if json_format else ".log"}',
                 when='midnight',
                 backupCount=7,
                 encoding='utf-8'
             )
             fh.setLevel(level)
             fh.setFormatter(formatter)
-            logger.addHandler(fh)
+            handlers.append(fh)
+
+        if async_mode:
+            qh = _LazyQueueHandler(_log_queue, handlers)
+            qh.setLevel(level)
+            logger.addHandler(qh)
+            _start_listener()
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
+
+        if rate_limit:
+            logger.addFilter(RateLimitFilter(rate_limit))
 
     return logger
@@ -0,0 +1,193 @@
+# f_model_tournament.py
+import multiprocessing
+import os
+import pickle
+import queue
+import shutil
+import tempfile
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+from joblib import cpu_count
+from threadpoolctl import threadpool_limits
+from sklearn.preprocessing import StandardScaler
+
+from b_config.d_model_config import (
+    TASK_TYPE, CV_N_SPLITS, CV_EMBARGO, CV_THREADS_PER_WORKER,
+    TOURNAMENT_MODELS, TOURNAMENT_N_JOBS, TOURNAMENT_TIMEOUT, TOURNAMENT_LATENCY_SAMPLES
+)
+from g_training.b_model_trainer import MODEL_PARAMS, get_model
+from b_config.c_database_config import DEFAULT_DB_PATH
+from g_training.d_walk_forward import (
+    SCALED_MODELS, cap_model_threads, fold_metrics, record_model_version, summarize_folds, walk_forward_splits
+)
+
+# Families that only exist for one task type
+CLASSIFICATION_ONLY = ("logistic_regression",)
+REGRESSION_ONLY = ("linear_regression",)
+
+
+def tournament_models(task_type=TASK_TYPE):
+    """Model families competing for task_type (TOURNAMENT_MODELS or every family in get_model)."""
+    if TOURNAMENT_MODELS:
+        return list(TOURNAMENT_MODELS)
+    excluded = REGRESSION_ONLY if task_type == "classification" else CLASSIFICATION_ONLY
+    return [model_type for model_type in MODEL_PARAMS if model_type not in excluded]
+
+
+def single_row_latency(model, X, samples=TOURNAMENT_LATENCY_SAMPLES):
+    """Median and p99 latency (ms) of predict() on one row, as in live inference."""
+    rows = X[np.linspace(0, len(X) - 1, min(samples, len(X))).astype(int)]
+    timings = []
+    for i in range(len(rows)):
+        started = time.perf_counter()
+        model.predict(rows[i:i + 1])
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def run_model_job(model_type, data_dir, splits, n_threads, cpus, results):
+    """
+    One tournament entry (separate process): walk-forward fit/score on the shared splits,
+    plus predict latency and pickled model size of the last fold's model.
+    """
+    try:
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        X = np.load(os.path.join(data_dir, "X.npy"), mmap_mode="r")
+        y = np.load(os.path.join(data_dir, "y.npy"), mmap_mode="r")
+        folds = []
+        with threadpool_limits(limits=n_threads):
+            for train_idx, test_idx in splits:
+                X_train, X_test = X[train_idx], X[test_idx]
+                if model_type in SCALED_MODELS:
+                    scaler = StandardScaler()
+                    X_train = scaler.fit_transform(X_train)
+                    X_test = scaler.transform(X_test)
+                model = cap_model_threads(get_model(model_type), n_threads)
+                started = time.perf_counter()
+                model.fit(X_train, y[train_idx])
+                fit_seconds = time.perf_counter() - started
+                started = time.perf_counter()
+                metrics = fold_metrics(model, X_test, y[test_idx])
+                metrics["batch_predict_us_per_row"] = (time.perf_counter() - started) / len(test_idx) * 1e6
+                metrics.update({"fit_seconds": fit_seconds, "train_samples": len(train_idx), "test_samples": len(test_idx)})
+                folds.append(metrics)
+            p50, p99 = single_row_latency(model, X_test)
+
+        summary = {"mode": "walk_forward", "n_splits": len(folds), "folds": folds}
+        summary.update(summarize_folds(folds))
+        summary.update({
+            "predict_p50_ms": p50,
+            "predict_p99_ms": p99,
+            "model_bytes": len(pickle.dumps(model)),
+            "params": model.get_params(),
+        })
+        results.put((model_type, "ok", summary))
+    except Exception:
+        results.put((model_type, "error", traceback.format_exc()))
+
+
+def run_tournament(X, y, models=None, n_jobs=TOURNAMENT_N_JOBS, timeout=TOURNAMENT_TIMEOUT,
+                   threads_per_job=CV_THREADS_PER_WORKER, n_splits=CV_N_SPLITS, embargo=CV_EMBARGO,
+                   record=True, db_path=DEFAULT_DB_PATH):
+    """
+    Train every model family on the same data and walk-forward splits, up to n_jobs at a time,
+    each in its own process pinned to its own cores and killed after timeout seconds.
+    Returns the leaderboard DataFrame (best first).
+    """
+    models = models or tournament_models()
+    splits = list(walk_forward_splits(len(X), n_splits=n_splits, embargo=embargo))
+    n_cpus = cpu_count()
+    n_jobs = max(1, min(n_cpus if n_jobs is None or n_jobs < 0 else n_jobs, len(models)))
+    # Pin to the CPUs this process may use (ids need not be 0..n-1 under taskset/cgroups)
+    allowed_cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(n_cpus))
+    cores_per_job = max(1, len(allowed_cpus) // n_jobs)
+
+    # Data is written once and memory-mapped by every job instead of being pickled per process
+    data_dir = tempfile.mkdtemp(prefix="tournament_")
+    np.save(os.path.join(data_dir, "X.npy"), np.asarray(X))
+    np.save(os.path.join(data_dir, "y.npy"), np.asarray(y))
+
+    results = multiprocessing.Queue()
+    pending = list(models)
+    running = {}  # model_type -> (process, started, slot)
+    free_slots = list(range(n_jobs))
+    outcomes = {}
+    print(f"🏁 Tournament: {len(models)} models, {n_jobs} concurrent job(s), {len(splits)} folds, timeout {timeout}s")
+    try:
+        while pending or running:
+            while pending and free_slots:
+                model_type = pending.pop(0)
+                slot = free_slots.pop(0)
+                cpus = set(allowed_cpus[slot * cores_per_job:(slot + 1) * cores_per_job]) if len(allowed_cpus) > 1 else None
+                process = multiprocessing.Process(
+                    target=run_model_job, args=(model_type, data_dir, splits, threads_per_job, cpus, results), daemon=True
+                )
+                process.start()
+                running[model_type] = (process, time.perf_counter(), slot)
+
+            try:
+                model_type, status, payload = results.get(timeout=0.5)
+                if model_type in running:
+                    outcomes[model_type] = (status, payload, time.perf_counter() - running[model_type][1])
+                else:
+                    print(f"   {model_type}: late result ignored")
+            except queue.Empty:
+                pass
+
+            for model_type, (process, started, slot) in list(running.items()):
+                if model_type in outcomes:
+                    process.join()
+                elif time.perf_counter() - started > timeout:
+                    process.terminate()
+                    process.join()
+                    outcomes[model_type] = ("timeout", f"killed after {timeout}s", timeout)
+                elif not process.is_alive() and process.exitcode != 0:
+                    outcomes[model_type] = ("error", f"exit code {process.exitcode}", time.perf_counter() - started)
+                else:
+                    continue
+                del running[model_type]
+                free_slots.append(slot)
+                print(f"   {model_type}: {outcomes[model_type][0]} ({outcomes[model_type][2]:.1f}s)")
+    finally:
+        for process, _, _ in running.values():
+            process.terminate()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return build_leaderboard(outcomes, record, db_path)
+
+
+def build_leaderboard(outcomes, record=True, db_path=DEFAULT_DB_PATH):
+    metric = "accuracy" if TASK_TYPE == "classification" else "mse"
+    rows = []
+    for model_type, (status, payload, wall_seconds) in outcomes.items():
+        row = {"model": model_type, "status": status, "wall_seconds": wall_seconds}
+        if status == "ok":
+            row.update({
+                metric: payload[f"mean_{metric}"],
+                f"{metric}_std": payload[f"std_{metric}"],
+                "fit_seconds": payload["mean_fit_seconds"],
+                "batch_predict_us_per_row": payload["mean_batch_predict_us_per_row"],
+                "predict_p50_ms": payload["predict_p50_ms"],
+                "predict_p99_ms": payload["predict_p99_ms"],
+                "model_kb": payload["model_bytes"] / 1024,
+            })
+            if record:
+                params = payload.pop("params")
+                row["model_version_id"] = record_model_version(payload, model_type, params=params, db_path=db_path)
+        else:
+            row["error"] = payload.strip().splitlines()[-1]
+        rows.append(row)
+
+    leaderboard = pd.DataFrame(rows)
+    if "model_version_id" in leaderboard:
+        leaderboard["model_version_id"] = leaderboard["model_version_id"].astype("Int64")
+    if metric in leaderboard:
+        leaderboard = leaderboard.sort_values(metric, ascending=(metric == "mse"), na_position="last")
+    leaderboard = leaderboard.reset_index(drop=True)
+    print("📊 Leaderboard:")
+    print(leaderboard.drop(columns=["error"], errors="ignore").to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    return leaderboard
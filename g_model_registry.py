@@ -0,0 +1,171 @@
+# g_model_registry.py
+import json
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+
+import joblib
+
+from b_config.d_model_config import TASK_TYPE, MODEL_REGISTRY_DIR
+from b_config.c_database_config import DEFAULT_DB_PATH
+
+DEFAULT_REGISTRY_DIR = os.path.join(os.path.dirname(DEFAULT_DB_PATH), "..", "models")
+
+# Columns added to model_versions for the registry (for databases created before them)
+REGISTRY_COLUMNS = {
+    "artifact_path": "VARCHAR",
+    "artifact_format": "VARCHAR",
+    "is_active": "BOOLEAN DEFAULT 0",
+}
+
+
+def get_registry_dir():
+    return MODEL_REGISTRY_DIR or DEFAULT_REGISTRY_DIR
+
+
+def ensure_registry_columns(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(model_versions)")}
+    for name, ddl in REGISTRY_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE model_versions ADD COLUMN {name} {ddl}")
+    conn.commit()
+
+
+def artifact_format(model, model_type):
+    """Native formats for XGBoost/CatBoost (version-stable, fast to load); joblib for everything else."""
+    if model_type == "xgboost" and hasattr(model, "save_model"):
+        return "xgboost"
+    if model_type == "catboost" and hasattr(model, "save_model"):
+        return "catboost"
+    return "joblib"
+
+
+def save_artifact(model, version_id, model_type, db_path=DEFAULT_DB_PATH, registry_dir=None):
+    """Serialize the model next to its model_versions row and link the file to the row."""
+    fmt = artifact_format(model, model_type)
+    folder = os.path.join(registry_dir or get_registry_dir(), f"{version_id}_{model_type}")
+    os.makedirs(folder, exist_ok=True)
+    try:
+        if fmt == "xgboost":
+            path = os.path.join(folder, "model.ubj")
+            model.save_model(path)
+        elif fmt == "catboost":
+            path = os.path.join(folder, "model.cbm")
+            model.save_model(path)
+        else:
+            # uncompressed, so large numpy arrays (tree tables, weights) can be memory-mapped on load
+            path = os.path.join(folder, "model.joblib")
+            joblib.dump(model, path)
+    except Exception:
+        shutil.rmtree(folder, ignore_errors=True)  # no half-written artifact left behind
+        raise
+
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_registry_columns(conn)
+        conn.execute(
+            "UPDATE model_versions SET artifact_path = ?, artifact_format = ? WHERE id = ?",
+            (os.path.abspath(path), fmt, version_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+def register_model(model, model_type, metrics=None, params=None, activate=False, db_path=DEFAULT_DB_PATH):
+    """Create a model_versions row for a fitted model (no CV summary), save its artifact; returns the id."""
+    metrics = metrics or {}
+    training_date = datetime.utcnow()
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(
+            "INSERT INTO model_versions (model_name, version, training_date, accuracy, loss, description) VALUES (?, ?, ?, ?, ?, ?)",
+            (model_type, training_date.strftime('%Y%m%d_%H%M%S'), training_date.strftime('%Y-%m-%d %H:%M:%S.%f'),
+             metrics.get("accuracy"), metrics.get("loss"),
+             json.dumps({"metrics": metrics, "params": params or {}}, default=str))
+        )
+        conn.commit()
+        version_id = cursor.lastrowid
+    finally:
+        conn.close()
+    save_or_discard_artifact(model, version_id, model_type, db_path)
+    if activate:
+        activate_model(version_id, db_path)
+    return version_id
+
+
+def delete_model_version(version_id, db_path=DEFAULT_DB_PATH):
+    """Remove a model_versions row (e.g. one whose artifact could not be saved)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("DELETE FROM model_versions WHERE id = ?", (version_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def save_or_discard_artifact(model, version_id, model_type, db_path=DEFAULT_DB_PATH):
+    """save_artifact for a freshly inserted row; if saving fails the row is deleted, so no version lacks its artifact."""
+    try:
+        return save_artifact(model, version_id, model_type, db_path)
+    except Exception:
+        delete_model_version(version_id, db_path)
+        raise
+
+
+def activate_model(version_id, db_path=DEFAULT_DB_PATH):
+    """Mark one version as the active model (inference services pick it up on their next check)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_registry_columns(conn)
+        row = conn.execute("SELECT artifact_path FROM model_versions WHERE id = ?", (version_id,)).fetchone()
+        if row is None or row[0] is None:
+            raise ValueError(f"Model version {version_id} has no saved artifact")
+        conn.execute("UPDATE model_versions SET is_active = (id = ?)", (version_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"✅ Model version {version_id} is now active.")
+
+
+def get_active_version(db_path=DEFAULT_DB_PATH):
+    """(id, model_name, artifact_path, artifact_format) of the active version, or None."""
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_registry_columns(conn)
+        return conn.execute(
+            "SELECT id, model_name, artifact_path, artifact_format FROM model_versions WHERE is_active = 1 ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def load_artifact(path, fmt, model_type, mmap=True):
+    """Load a saved model; joblib artifacts are memory-mapped read-only when mmap is True."""
+    if fmt == "xgboost":
+        from xgboost import XGBClassifier, XGBRegressor
+        model = XGBClassifier() if TASK_TYPE == "classification" else XGBRegressor()
+        model.load_model(path)
+        return model
+    if fmt == "catboost":
+        from catboost import CatBoostClassifier, CatBoostRegressor
+        model = CatBoostClassifier() if TASK_TYPE == "classification" else CatBoostRegressor()
+        model.load_model(path)
+        return model
+    return joblib.load(path, mmap_mode="r" if mmap else None)
+
+
+def load_model(version_id, db_path=DEFAULT_DB_PATH, mmap=True):
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT model_name, artifact_path, artifact_format FROM model_versions WHERE id = ?", (version_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None or row[1] is None:
+        raise ValueError(f"Model version {version_id} has no saved artifact")
+    model_type, path, fmt = row
+    return load_artifact(path, fmt, model_type, mmap)
@@ -0,0 +1,222 @@
+import argparse
+import itertools
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from b_config.c_database_config import DEFAULT_DB_PATH
+from b_config.e_trading_config import TradingRiskConfig, symbol_contract_size
+from c_database.d_candle_cache import get_candle_cache
+from e_data_ingestion.f_indicator_engine import ATR
+from f_analysis.f_backtester import (
+    INITIAL_BALANCE, MAX_HOLDING_BARS, candidate_trades, equity_metrics, load_prediction_signals,
+    load_table_signals, select_trades, signal_bars, symbol_point
+)
+
+# شبکه پیش‌فرض پارامترهای ریسک (مقادیر seed شده: 1.5 / 2 / 1)
+SWEEP_GRID = {
+    "stop_loss_atr_multiplier": [1.0, 1.5, 2.0, 2.5, 3.0, 4.0],
+    "take_profit_ratio": [1.0, 1.5, 2.0, 2.5, 3.0, 4.0],
+    "max_risk_percent": [0.25, 0.5, 1.0, 1.5, 2.0],
+}
+
+# بازه‌های نمونه‌گیری تصادفی (حداقل، حداکثر)
+SWEEP_RANGES = {
+    "stop_loss_atr_multiplier": (0.5, 5.0),
+    "take_profit_ratio": (0.5, 5.0),
+    "max_risk_percent": (0.1, 3.0),
+}
+
+# آرایه‌هایی که یک بار در shared memory قرار می‌گیرند و همه workerها از آن می‌خوانند
+SHARED_ARRAYS = ("time", "open", "high", "low", "close", "spread", "atr", "signal_idx", "direction")
+
+# وضعیت هر worker (بعد از attach به shared memory)
+_worker_arrays = {}
+_worker_blocks = []
+_worker_settings = {}
+
+
+def parameter_grid(grid=SWEEP_GRID):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_parameters(n_samples, ranges=SWEEP_RANGES, seed=None):
+    rng = np.random.default_rng(seed)
+    return [
+        {name: round(float(rng.uniform(low, high)), 2) for name, (low, high) in ranges.items()}
+        for _ in range(n_samples)
+    ]
+
+
+def group_by_exits(combinations):
+    """
+    خروج معاملات فقط به ضریب ATR و نسبت TP بستگی دارد؛ ترکیب‌ها بر این اساس گروه می‌شوند
+    تا برای همه درصدهای ریسک یک گروه، شبیه‌سازی خروج یک بار انجام شود.
+    """
+    groups = {}
+    for params in combinations:
+        key = (float(params["stop_loss_atr_multiplier"]), float(params["take_profit_ratio"]))
+        groups.setdefault(key, []).append(float(params["max_risk_percent"]))
+    return groups
+
+
+def share_arrays(arrays):
+    """کپی آرایه‌ها در بلوک‌های shared memory. خروجی: (بلوک‌ها، مشخصات برای attach در worker)"""
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def _attach_worker(specs, settings):
+    """initializer هر worker: آرایه‌ها بدون کپی از shared memory خوانده می‌شوند"""
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        _worker_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    _worker_settings.update(settings)
+
+
+def run_sweep_group(atr_multiplier, take_profit_ratio, risk_percents):
+    """یک شبیه‌سازی خروج و سپس انتخاب معاملات/حجم برای هر درصد ریسک. خروجی: لیست (پارامترها، معیارها)"""
+    arrays, settings = _worker_arrays, _worker_settings
+    trades = candidate_trades(
+        arrays, arrays["atr"], arrays["signal_idx"], arrays["direction"], atr_multiplier, take_profit_ratio,
+        settings["point"], settings["max_holding"]
+    )
+    results = []
+    for risk_percent in risk_percents:
+        taken, _, profits = select_trades(
+            trades, risk_percent, settings["min_lot"], settings["max_lot"], settings["initial_balance"],
+            settings["contract_size"]
+        )
+        metrics = equity_metrics(arrays["time"][trades["exit_idx"][taken]], profits, settings["initial_balance"])
+        results.append(({
+            "stop_loss_atr_multiplier": atr_multiplier,
+            "take_profit_ratio": take_profit_ratio,
+            "max_risk_percent": risk_percent,
+        }, metrics))
+    return results
+
+
+def save_sweep_results(conn, results, symbol_id, timeframe_id, model_version_id, test_period):
+    rows = []
+    for params, metrics in results:
+        parameter_set = json.dumps({
+            "type": "risk_sweep",
+            "symbol_id": symbol_id,
+            "timeframe_id": timeframe_id,
+            "model_version_id": model_version_id,
+            "params": params,
+            "total_trades": metrics["total_trades"],
+        })
+        rows.append((parameter_set, metrics["profit"], metrics["drawdown"], metrics["sharpe_ratio"],
+                     metrics["win_rate"], test_period))
+    conn.executemany("""
+        INSERT INTO optimization_results (parameter_set, profit, drawdown, sharpe_ratio, win_rate, test_period)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return len(rows)
+
+
+def run_sweep(db_path, symbol_id, timeframe_id, combinations, model_version_id=None, source="predictions",
+              start=None, end=None, initial_balance=INITIAL_BALANCE, max_holding=MAX_HOLDING_BARS, workers=None):
+    """
+    اجرای موازی بک‌تست برای همه ترکیب‌های پارامتر. کندل‌ها، ATR و سیگنال‌ها یک بار بارگذاری و
+    در shared memory قرار می‌گیرند؛ workerها فقط گروه پارامتر دریافت می‌کنند و پردازه اصلی می‌نویسد.
+    خروجی: لیست (پارامترها، معیارها)
+    """
+    candles = get_candle_cache(db_path).get(symbol_id, timeframe_id, start, end,
+                                            columns=("time", "open", "high", "low", "close", "spread"))
+    conn = sqlite3.connect(db_path)
+    try:
+        if source == "predictions":
+            signal_times, directions = load_prediction_signals(conn, symbol_id, timeframe_id, model_version_id)
+        else:
+            signal_times, directions = load_table_signals(conn, symbol_id, timeframe_id)
+        point = symbol_point(conn, symbol_id)
+        contract_size = symbol_contract_size(conn, symbol_id)
+        risk_settings = TradingRiskConfig(db_path).snapshot()
+        if len(candles["time"]) < 2 or len(signal_times) == 0:
+            print("❌ کندل یا سیگنال کافی برای sweep وجود ندارد.")
+            return []
+
+        arrays = {"time": np.asarray(candles["time"], dtype=np.int64)}
+        arrays.update({name: np.asarray(candles[name], dtype=np.float64) for name in ("open", "high", "low", "close", "spread")})
+        arrays["atr"] = ATR(14).batch(arrays["high"], arrays["low"], arrays["close"])["atr_14"]
+        arrays["signal_idx"], arrays["direction"] = signal_bars(arrays["time"], arrays["atr"], signal_times, directions)
+        settings = {
+            "point": point,
+            "contract_size": contract_size,
+            "max_holding": max_holding,
+            "initial_balance": initial_balance,
+            "min_lot": risk_settings.min_lot,
+            "max_lot": risk_settings.max_lot,
+        }
+
+        groups = group_by_exits(combinations)
+        started = time.perf_counter()
+        results = []
+        blocks, specs = share_arrays({name: arrays[name] for name in SHARED_ARRAYS})
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_worker, initargs=(specs, settings)) as pool:
+                futures = [pool.submit(run_sweep_group, atr_multiplier, tp_ratio, risk_percents)
+                           for (atr_multiplier, tp_ratio), risk_percents in groups.items()]
+                for future in as_completed(futures):
+                    results.extend(future.result())
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        test_period = f"{time.strftime('%Y-%m-%d', time.gmtime(int(arrays['time'][0])))} - " \
+                      f"{time.strftime('%Y-%m-%d', time.gmtime(int(arrays['time'][-1])))}"
+        saved = save_sweep_results(conn, results, symbol_id, timeframe_id, model_version_id, test_period)
+        print(f"✅ {saved} ترکیب ({len(groups)} گروه خروج) روی {len(arrays['time'])} کندل و "
+              f"{len(arrays['signal_idx'])} سیگنال در {time.perf_counter() - started:.1f} ثانیه ذخیره شد.")
+    finally:
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="جستجوی پارامترهای ریسک با بک‌تست موازی و ذخیره در optimization_results")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--symbol-id", type=int, required=True)
+    parser.add_argument("--timeframe-id", type=int, default=1)
+    parser.add_argument("--model-version", type=int, default=None)
+    parser.add_argument("--source", choices=("predictions", "signals"), default="predictions")
+    parser.add_argument("--samples", type=int, default=None, help="تعداد نمونه تصادفی (پیش‌فرض: شبکه کامل SWEEP_GRID)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--balance", type=float, default=INITIAL_BALANCE)
+    parser.add_argument("--max-holding", type=int, default=MAX_HOLDING_BARS)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    combinations = random_parameters(args.samples, seed=args.seed) if args.samples else parameter_grid()
+    results = run_sweep(
+        args.db, args.symbol_id, args.timeframe_id, combinations, args.model_version, args.source,
+        initial_balance=args.balance, max_holding=args.max_holding, workers=args.workers,
+    )
+    if not results:
+        sys.exit(1)
+    results.sort(key=lambda item: item[1]["sharpe_ratio"], reverse=True)
+    for params, metrics in results[:args.top]:
+        print(f"   {params} -> سود: {metrics['profit']:.2f}, افت: {metrics['drawdown']:.2f}%, "
+              f"نرخ برد: {metrics['win_rate']:.2%}, Sharpe: {metrics['sharpe_ratio']:.2f}, معاملات: {metrics['total_trades']}")
+
+
+if __name__ == "__main__":
+    main()
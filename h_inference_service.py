@@ -0,0 +1,153 @@
+# h_inference_service.py
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from b_config.d_model_config import TASK_TYPE, INFERENCE_RELOAD_INTERVAL
+from b_config.c_database_config import DEFAULT_DB_PATH
+from g_training.g_model_registry import get_active_version, load_artifact
+from g_training.i_fast_predict import FastPredictor
+
+INSERT_PREDICTIONS_SQL = """
+    INSERT INTO signal_predictions (symbol_id, timeframe_id, timestamp, predicted_signal, confidence, status, model_version_id)
+    VALUES (?, ?, ?, ?, ?, 'pending', ?)
+"""
+
+
+def ensure_prediction_columns(conn):
+    """Add signal_predictions.model_version_id on databases created before it existed."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(signal_predictions)")}
+    if "model_version_id" not in existing:
+        conn.execute("ALTER TABLE signal_predictions ADD COLUMN model_version_id INTEGER REFERENCES model_versions(id)")
+        conn.commit()
+
+
+class _LoadedModel:
+    __slots__ = ("version_id", "model_type", "model", "fast")
+
+    def __init__(self, version_id, model_type, model):
+        self.version_id = version_id
+        self.model_type = model_type
+        self.model = model
+        self.fast = FastPredictor(model, model_type)  # single-bar path, swapped together with the model
+
+
+class InferenceService:
+    """
+    Long-lived inference service. The active registry model is loaded once and kept warm;
+    predict() scores a batch of feature rows (any mix of symbols) in one call.
+    A watcher thread loads a newly activated version in the background and swaps the
+    reference atomically, so in-flight batches finish on the old model and nothing waits.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, reload_interval=INFERENCE_RELOAD_INTERVAL):
+        self.db_path = db_path
+        self.reload_interval = reload_interval
+        self._loaded = None
+        self._reload_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        ensure_prediction_columns(self.conn)
+
+    @property
+    def version_id(self):
+        loaded = self._loaded
+        return None if loaded is None else loaded.version_id
+
+    def reload(self):
+        """Load the active version if it changed; returns True when a new model was swapped in."""
+        with self._reload_lock:
+            active = get_active_version(self.db_path)
+            if active is None:
+                return False
+            version_id, model_type, path, fmt = active
+            if self._loaded is not None and self._loaded.version_id == version_id:
+                return False
+            started = time.perf_counter()
+            model = load_artifact(path, fmt, model_type)
+            self._warm_up(model)
+            self._loaded = _LoadedModel(version_id, model_type, model)  # atomic reference swap
+            print(f"🔄 Inference model -> version {version_id} ({model_type}) in {time.perf_counter() - started:.2f}s")
+            return True
+
+    @staticmethod
+    def _warm_up(model):
+        """One dummy prediction so lazy initialisation happens before real traffic arrives."""
+        n_features = getattr(model, "n_features_in_", None)
+        if n_features:
+            model.predict(np.zeros((1, n_features), dtype=np.float32))
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"⚠️ Model reload failed, keeping version {self.version_id}: {e}")
+
+    def start(self):
+        self.reload()
+        if self._loaded is None:
+            raise RuntimeError("No active model version in the registry")
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-reload", daemon=True)
+        self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        self.conn.close()
+
+    def predict(self, X):
+        """Score a batch; returns (signals, confidences, version_id) from one consistent model."""
+        loaded = self._loaded
+        if loaded is None:
+            raise RuntimeError("InferenceService has no model loaded; call start() first")
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        model = loaded.model
+        if TASK_TYPE == "classification":
+            if hasattr(model, "predict_proba"):
+                proba = model.predict_proba(X)
+                best = proba.argmax(axis=1)
+                classes = np.asarray(model.classes_)[best]
+                confidence = proba[np.arange(len(X)), best]
+            else:
+                classes = model.predict(X)
+                confidence = np.zeros(len(X))
+            signals = np.where(classes == 1, "BUY", "SELL")
+        else:
+            forecast = np.asarray(model.predict(X), dtype=np.float64)
+            signals = np.where(forecast > 0, "BUY", "SELL")
+            confidence = np.abs(forecast)
+        return signals, confidence, loaded.version_id
+
+    def predict_one(self, features):
+        """Low-latency decision for one bar: (signal, confidence, version_id)."""
+        loaded = self._loaded
+        if loaded is None:
+            raise RuntimeError("InferenceService has no model loaded; call start() first")
+        signal, confidence = loaded.fast.predict_row(features)
+        return signal, confidence, loaded.version_id
+
+    def predict_and_store(self, symbol_ids, timeframe_ids, times, X):
+        """
+        Score rows for many symbols at once and bulk-insert them into signal_predictions.
+        symbol_ids/timeframe_ids are per-row (or scalars), times are epoch seconds. Returns the row count.
+        """
+        n = len(X)
+        symbol_ids = np.broadcast_to(np.asarray(symbol_ids, dtype=np.int64), n).tolist()
+        timeframe_ids = np.broadcast_to(np.asarray(timeframe_ids, dtype=np.int64), n).tolist()
+        stamps = pd.to_datetime(np.asarray(times, dtype=np.int64), unit="s").strftime('%Y-%m-%d %H:%M:%S.%f').tolist()
+        signals, confidence, version_id = self.predict(X)
+        with self._write_lock:
+            self.conn.executemany(INSERT_PREDICTIONS_SQL, zip(
+                symbol_ids, timeframe_ids, stamps, signals.tolist(), confidence.astype(float).tolist(), [version_id] * n
+            ))
+            self.conn.commit()
+        return n
@@ -0,0 +1,234 @@
+import argparse
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from b_config.c_database_config import DEFAULT_DB_PATH
+from b_config.e_trading_config import TradingRiskConfig, ensure_symbol_columns
+from b_config.f_logger_config import get_logger
+
+# همبستگی جفت‌هایی که در correlation_results نیستند (یا NaN هستند)
+MISSING_CORRELATION = 0.0
+
+# بعد از این تعداد به‌روزرسانی افزایشی، واریانس از نو محاسبه می‌شود (جلوگیری از انباشت خطای عددی)
+RECOMPUTE_EVERY = 10000
+
+# check_order روی هر سفارش صدا زده می‌شود؛ نوشتن لاگ مسیر پذیرش را کند نکند
+logger = get_logger('portfolio_risk', async_mode=True)
+
+
+def position_risk(direction, volume, entry_price, stop_loss, contract_size):
+    """
+    ریسک علامت‌دار یک پوزیشن به واحد پول حساب: جهت × حجم × فاصله تا حد ضرر × contract_size
+    (همان قاعده position_size). پوزیشن بدون حد ضرر ریسک محدودی ندارد، پس None برمی‌گردد.
+    """
+    if stop_loss is None:
+        return None
+    return direction * volume * abs(entry_price - stop_loss) * contract_size
+
+
+def load_contract_sizes(conn):
+    """contract_size نمادهایی که در جدول symbols ثبت شده است: symbol_id ← اندازه قرارداد"""
+    ensure_symbol_columns(conn)
+    return {symbol_id: float(size) for symbol_id, size in conn.execute(
+        "SELECT id, contract_size FROM symbols WHERE contract_size IS NOT NULL AND contract_size > 0"
+    )}
+
+
+def load_correlation_matrix(conn, timeframe_id, window=None):
+    """
+    آخرین ماتریس همبستگی یک تایم‌فریم از correlation_results (window=None یعنی کل دوره).
+    خروجی: (شناسه نمادها، ماتریس n×n) روی همه نمادهای جدول symbols؛ قطر ۱ و جفت‌های بدون داده MISSING_CORRELATION
+    """
+    symbol_ids = [row[0] for row in conn.execute("SELECT id FROM symbols ORDER BY id")]
+    index = {symbol_id: i for i, symbol_id in enumerate(symbol_ids)}
+    matrix = np.full((len(symbol_ids), len(symbol_ids)), MISSING_CORRELATION)
+    np.fill_diagonal(matrix, 1.0)
+    window_filter = "window IS NULL" if window is None else "window = ?"
+    params = (timeframe_id,) if window is None else (timeframe_id, window)
+    rows = conn.execute(f"""
+        SELECT symbol_id_1, symbol_id_2, correlation FROM correlation_results
+        WHERE timeframe_id = ? AND {window_filter} AND computed_at = (
+            SELECT MAX(computed_at) FROM correlation_results WHERE timeframe_id = ? AND {window_filter}
+        )
+    """, params + params).fetchall()
+    for symbol_1, symbol_2, correlation in rows:
+        if correlation is not None and symbol_1 in index and symbol_2 in index:
+            matrix[index[symbol_1], index[symbol_2]] = matrix[index[symbol_2], index[symbol_1]] = correlation
+    return symbol_ids, matrix
+
+
+class PortfolioRiskEngine:
+    """
+    موتور ریسک پورتفو برای پذیرش سفارش‌ها.
+    ریسک هر نماد R_s جمع ریسک علامت‌دار پوزیشن‌های باز آن است و ریسک پورتفو sqrt(Rᵀ C R) با ماتریس همبستگی C.
+    بردار g = C R نگه داشته می‌شود، پس اثر یک سفارش Δ روی نماد k در زمان ثابت محاسبه می‌شود:
+    V' = V + 2Δ g_k + Δ² ؛ ثبت یا بستن پوزیشن فقط g را به‌روز می‌کند (O(تعداد نمادها)، بدون پیمایش پوزیشن‌ها).
+    """
+
+    def __init__(self, symbol_ids, correlation, balance, max_portfolio_risk_percent, contract_sizes=None):
+        self.symbol_ids = list(symbol_ids)
+        self.index = {symbol_id: i for i, symbol_id in enumerate(self.symbol_ids)}
+        self.correlation = np.array(correlation, dtype=np.float64)
+        self.exposure = np.zeros(len(self.symbol_ids))  # R
+        self.weighted = np.zeros(len(self.symbol_ids))  # g = C R
+        self.variance = 0.0  # V = Rᵀ C R
+        self.positions = {}  # position_id -> (اندیس نماد، ریسک علامت‌دار)
+        self.max_portfolio_risk_percent = max_portfolio_risk_percent
+        self.contract_sizes = dict(contract_sizes or {})  # symbol_id -> contract_size
+        self.set_balance(balance)
+        self._updates = 0
+
+    @classmethod
+    def from_database(cls, db_path, balance, timeframe_id, window=None):
+        """
+        ساخت موتور از آخرین همبستگی‌ها، تنظیمات ریسک، contract_size نمادها و پوزیشن‌های باز جدول open_positions.
+        پوزیشن باز بدون حد ضرر یا بدون contract_size قابل اندازه‌گیری نیست؛ با خطای لاگ شده کنار گذاشته می‌شود.
+        """
+        settings = TradingRiskConfig(db_path).snapshot()
+        conn = sqlite3.connect(db_path)
+        try:
+            symbol_ids, matrix = load_correlation_matrix(conn, timeframe_id, window)
+            contract_sizes = load_contract_sizes(conn)
+            rows = conn.execute("""
+                SELECT id, symbol_id, position_type, volume, open_price, stop_loss
+                FROM open_positions WHERE status = 'Open'
+            """).fetchall()
+        finally:
+            conn.close()
+        engine = cls(symbol_ids, matrix, balance, settings.max_portfolio_risk_percent, contract_sizes)
+        for position_id, symbol_id, position_type, volume, open_price, stop_loss in rows:
+            direction = 1 if position_type.upper() == 'BUY' else -1
+            risk = engine.order_risk(symbol_id, direction, volume, open_price, stop_loss)
+            if risk is None:
+                logger.error("پوزیشن باز %s در ریسک پورتفو حساب نشد (حد ضرر یا contract_size ندارد).", position_id)
+                continue
+            engine.add(position_id, symbol_id, risk)
+        return engine
+
+    @property
+    def portfolio_risk(self):
+        return float(np.sqrt(max(self.variance, 0.0)))
+
+    def set_balance(self, balance):
+        self.balance = balance
+        limit = balance * self.max_portfolio_risk_percent / 100
+        self.variance_limit = limit * limit
+
+    def check(self, symbol_id, risk):
+        """پذیرش سفارش با ریسک علامت‌دار risk روی symbol_id در زمان ثابت. خروجی: (مجاز؟، واریانس بعد از سفارش)"""
+        k = self.index.get(symbol_id)
+        if k is None:
+            # نماد بدون همبستگی ثبت شده: ناهمبسته با بقیه فرض می‌شود
+            new_variance = self.variance + risk * risk
+        else:
+            new_variance = self.variance + 2.0 * risk * float(self.weighted[k]) + risk * risk * float(self.correlation[k, k])
+        return new_variance <= self.variance_limit, new_variance
+
+    def order_risk(self, symbol_id, direction, volume, entry_price, stop_loss):
+        """ریسک پولی یک سفارش؛ None اگر حد ضرر یا contract_size نماد معلوم نباشد"""
+        contract_size = self.contract_sizes.get(symbol_id)
+        if contract_size is None:
+            return None
+        return position_risk(direction, volume, entry_price, stop_loss, contract_size)
+
+    def check_order(self, symbol_id, direction, volume, entry_price, stop_loss):
+        """مثل check برای یک سفارش؛ سفارش بدون حد ضرر یا بدون contract_size رد می‌شود"""
+        risk = self.order_risk(symbol_id, direction, volume, entry_price, stop_loss)
+        if risk is None:
+            logger.warning("سفارش نماد %s رد شد: بدون حد ضرر یا contract_size ریسک آن قابل محاسبه نیست.", symbol_id)
+            return False, self.variance
+        return self.check(symbol_id, risk)
+
+    def _ensure_symbol(self, symbol_id):
+        k = self.index.get(symbol_id)
+        if k is None:
+            k = len(self.symbol_ids)
+            self.symbol_ids.append(symbol_id)
+            self.index[symbol_id] = k
+            correlation = np.full((k + 1, k + 1), MISSING_CORRELATION)
+            correlation[:k, :k] = self.correlation
+            correlation[k, k] = 1.0
+            self.correlation = correlation
+            self.exposure = np.append(self.exposure, 0.0)
+            self.weighted = np.append(self.weighted, 0.0)
+        return k
+
+    def _apply(self, k, risk):
+        self.variance += 2.0 * risk * float(self.weighted[k]) + risk * risk * float(self.correlation[k, k])
+        self.exposure[k] += risk
+        self.weighted += risk * self.correlation[:, k]
+        self._updates += 1
+        if self._updates >= RECOMPUTE_EVERY:
+            self.recompute()
+
+    def add(self, position_id, symbol_id, risk):
+        """ثبت یک پوزیشن باز (بدون بررسی حد)"""
+        if position_id in self.positions:
+            self.remove(position_id)
+        k = self._ensure_symbol(symbol_id)
+        self.positions[position_id] = (k, risk)
+        self._apply(k, risk)
+
+    def remove(self, position_id):
+        """حذف پوزیشن بسته شده"""
+        entry = self.positions.pop(position_id, None)
+        if entry is not None:
+            k, risk = entry
+            self._apply(k, -risk)
+
+    def admit(self, position_id, symbol_id, risk):
+        """بررسی و در صورت مجاز بودن ثبت سفارش. خروجی: True اگر پذیرفته شد"""
+        allowed, _ = self.check(symbol_id, risk)
+        if allowed:
+            self.add(position_id, symbol_id, risk)
+        return allowed
+
+    def update_correlation(self, symbol_ids, correlation):
+        """جایگزینی ماتریس همبستگی (مثلاً بعد از اجرای correlation batch) و محاسبه دوباره g و V"""
+        exposure = {symbol_id: self.exposure[k] for symbol_id, k in self.index.items()}
+        positions = {position_id: (self.symbol_ids[k], risk) for position_id, (k, risk) in self.positions.items()}
+        self.symbol_ids = list(symbol_ids)
+        self.index = {symbol_id: i for i, symbol_id in enumerate(self.symbol_ids)}
+        self.correlation = np.array(correlation, dtype=np.float64)
+        self.exposure = np.zeros(len(self.symbol_ids))
+        for symbol_id, value in exposure.items():
+            # _ensure_symbol ممکن است آرایه exposure را بزرگ‌تر کند، پس اندیس جدا گرفته می‌شود
+            k = self._ensure_symbol(symbol_id)
+            self.exposure[k] = value
+        self.positions = {position_id: (self.index[symbol_id], risk) for position_id, (symbol_id, risk) in positions.items()}
+        self.recompute()
+
+    def recompute(self):
+        """محاسبه کامل g و V از روی R"""
+        self.weighted = self.correlation @ self.exposure
+        self.variance = float(self.exposure @ self.weighted)
+        self._updates = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="وضعیت ریسک پورتفو و زمان تصمیم پذیرش سفارش")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--balance", type=float, required=True)
+    parser.add_argument("--timeframe-id", type=int, default=1)
+    parser.add_argument("--window", type=int, default=None)
+    args = parser.parse_args()
+
+    engine = PortfolioRiskEngine.from_database(args.db, args.balance, args.timeframe_id, args.window)
+    if not engine.symbol_ids:
+        print("❌ هیچ نمادی در دیتابیس نیست.")
+        sys.exit(1)
+    print(f"✅ {len(engine.positions)} پوزیشن باز روی {len(engine.symbol_ids)} نماد، "
+          f"ریسک پورتفو: {engine.portfolio_risk:.2f} از حد {np.sqrt(engine.variance_limit):.2f}")
+
+    calls = 10000
+    started = time.perf_counter()
+    for i in range(calls):
+        engine.check(engine.symbol_ids[i % len(engine.symbol_ids)], 1.0)
+    print(f"⏱️ هر تصمیم پذیرش: {(time.perf_counter() - started) / calls * 1e6:.2f} میکروثانیه")
+
+
+if __name__ == "__main__":
+    main()
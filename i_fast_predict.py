@@ -0,0 +1,249 @@
+# i_fast_predict.py
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from b_config.d_model_config import TASK_TYPE
+
+# Single-row predict calls timed per benchmark run
+BENCHMARK_CALLS = 2000
+
+
+class _TreeTables:
+    """
+    Every tree of an ensemble padded into (n_trees, max_nodes) tables, so all trees are walked
+    together with a handful of numpy ops per depth level instead of one Python call per tree.
+    Leaves point to themselves, so extra iterations past a shallow leaf are no-ops.
+    """
+
+    def __init__(self, trees, strict):
+        self.strict = strict  # XGBoost goes left on x < threshold, sklearn on x <= threshold
+        n_trees, max_nodes = len(trees), max(len(tree["left"]) for tree in trees)
+        n_outputs = trees[0]["value"].shape[1]
+        self.left = np.zeros((n_trees, max_nodes), dtype=np.int64)
+        self.right = np.zeros((n_trees, max_nodes), dtype=np.int64)
+        self.feature = np.zeros((n_trees, max_nodes), dtype=np.int64)
+        self.threshold = np.zeros((n_trees, max_nodes), dtype=np.float64)
+        self.default_left = np.zeros((n_trees, max_nodes), dtype=bool)
+        self.value = np.zeros((n_trees, max_nodes, n_outputs), dtype=np.float64)
+        self.depth = 0
+        for t, tree in enumerate(trees):
+            n = len(tree["left"])
+            leaf = tree["left"] == -1
+            nodes = np.arange(n)
+            self.left[t, :n] = np.where(leaf, nodes, tree["left"])
+            self.right[t, :n] = np.where(leaf, nodes, tree["right"])
+            self.feature[t, :n] = np.where(leaf, 0, tree["feature"])
+            self.threshold[t, :n] = tree["threshold"]
+            self.default_left[t, :n] = tree.get("default_left", False)
+            self.value[t, :n] = tree["value"]
+            depth = np.zeros(n, dtype=np.int64)
+            for node in range(n):  # parents are stored before their children
+                if not leaf[node]:
+                    depth[tree["left"][node]] = depth[tree["right"][node]] = depth[node] + 1
+            self.depth = max(self.depth, int(depth.max()))
+        self.offsets = np.arange(n_trees, dtype=np.int64) * max_nodes
+        self.left_flat, self.right_flat = self.left.ravel(), self.right.ravel()
+        self.feature_flat, self.threshold_flat = self.feature.ravel(), self.threshold.ravel()
+        self.default_left_flat = self.default_left.ravel()
+        self.value_flat = self.value.reshape(n_trees * max_nodes, n_outputs)
+
+    def leaf_values(self, x):
+        """(n_trees, n_outputs) leaf values reached by row x."""
+        # flat indices into the raveled tables: np.take on 1-D arrays is much cheaper than 2-D fancy indexing
+        flat = self.offsets.copy()
+        for _ in range(self.depth):
+            value = x.take(self.feature_flat.take(flat))
+            threshold = self.threshold_flat.take(flat)
+            go_left = value < threshold if self.strict else value <= threshold
+            go_left = np.where(np.isnan(value), self.default_left_flat.take(flat), go_left)
+            flat = self.offsets + np.where(go_left, self.left_flat.take(flat), self.right_flat.take(flat))
+        return self.value_flat.take(flat, axis=0)
+
+
+def _forest_trees(model):
+    trees = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        value = tree.value[:, 0, :]
+        if TASK_TYPE == "classification":
+            value = value / value.sum(axis=1, keepdims=True)
+        trees.append({"left": tree.children_left, "right": tree.children_right, "feature": tree.feature,
+                      "threshold": tree.threshold, "value": value})
+    return trees
+
+
+def _xgboost_trees(booster, n_rounds):
+    """
+    Trees of the first n_rounds boosting rounds of a single-output booster from its JSON model,
+    or None if unsupported (multi-class).
+    """
+    config = json.loads(booster.save_raw("json"))
+    learner = config["learner"]
+    if int(learner["learner_model_param"].get("num_class", "0")) > 1:
+        return None
+    model_trees = learner["gradient_booster"]["model"]["trees"]
+    trees_per_round = len(model_trees) // max(booster.num_boosted_rounds(), 1)
+    trees = []
+    for tree in model_trees[:n_rounds * trees_per_round]:
+        left = np.array(tree["left_children"], dtype=np.int64)
+        conditions = np.array(tree["split_conditions"], dtype=np.float32).astype(np.float64)
+        trees.append({"left": left, "right": np.array(tree["right_children"], dtype=np.int64),
+                      "feature": np.array(tree["split_indices"], dtype=np.int64), "threshold": conditions,
+                      "default_left": np.array(tree["default_left"], dtype=bool),
+                      "value": np.where(left == -1, conditions, 0.0)[:, None]})  # leaf value lives in split_conditions
+    return trees
+
+
+class FastPredictor:
+    """
+    Low-latency predict for one feature row (the live per-bar decision).
+
+    The row is copied into a preallocated float32 buffer and evaluated single-threaded without
+    sklearn validation, DMatrix construction or joblib dispatch: XGBoost and RandomForest trees are
+    walked together from padded node tables, LightGBM uses Booster.predict with num_threads=1.
+    Other models fall back to predict_proba on the same buffer.
+    """
+
+    def __init__(self, model, model_type):
+        self.model = model
+        self.model_type = model_type
+        n_features = getattr(model, "n_features_in_", None)
+        if n_features is None:
+            raise ValueError("Model must be fitted before building a FastPredictor")
+        self._row = np.empty((1, n_features), dtype=np.float32)
+        self.classes_ = np.asarray(getattr(model, "classes_", [0, 1]))
+
+        self._predict = self._predict_generic
+        if model_type == "xgboost" and hasattr(model, "get_booster"):
+            # a copy, so the served model keeps its thread setting for batch predict
+            booster = model.get_booster().copy()
+            booster.set_param({"nthread": 1})
+            # early-stopped models predict with the rounds up to best_iteration, as the sklearn API does
+            best_iteration = getattr(model, "best_iteration", None)
+            n_rounds = booster.num_boosted_rounds() if best_iteration is None else int(best_iteration) + 1
+            trees = _xgboost_trees(booster, n_rounds)
+            if trees is not None:
+                self._tables = _TreeTables(trees, strict=True)
+                # base score in margin space, measured once instead of parsing version-specific config
+                probe = np.zeros((1, n_features), dtype=np.float32)
+                margin = booster.inplace_predict(probe, predict_type="margin", iteration_range=(0, n_rounds))
+                self._base_margin = float(margin[0]) - float(self._tables.leaf_values(probe[0]).sum())
+                self._predict = self._predict_xgboost
+        elif model_type == "lightgbm" and hasattr(model, "booster_"):
+            self._booster = model.booster_
+            self._predict = self._predict_lightgbm
+        elif model_type == "random_forest" and hasattr(model, "estimators_"):
+            self._tables = _TreeTables(_forest_trees(model), strict=False)
+            self._predict = self._predict_forest
+
+    # --- each path returns class probabilities (classification) or the forecast (regression)
+    def _predict_xgboost(self):
+        margin = self._tables.leaf_values(self._row[0]).sum() + self._base_margin
+        return 1.0 / (1.0 + np.exp(-margin)) if TASK_TYPE == "classification" else margin
+
+    def _predict_lightgbm(self):
+        return self._booster.predict(self._row, num_threads=1)[0]
+
+    def _predict_forest(self):
+        value = self._tables.leaf_values(self._row[0]).mean(axis=0)
+        return value if TASK_TYPE == "classification" else value[0]
+
+    def _predict_generic(self):
+        if TASK_TYPE == "classification" and hasattr(self.model, "predict_proba"):
+            return self.model.predict_proba(self._row)[0]
+        return self.model.predict(self._row)[0]
+
+    # --- public API
+    def predict_raw(self, features):
+        """Class probabilities (classification) or forecast (regression) for one row."""
+        self._row[0] = features
+        out = self._predict()
+        if TASK_TYPE == "classification":
+            out = np.atleast_1d(out)
+            if out.size == 1:  # binary models return P(class 1) only
+                out = np.array([1.0 - out[0], out[0]])
+        return out
+
+    def predict_row(self, features):
+        """(signal, confidence) for one row, same convention as InferenceService.predict."""
+        out = self.predict_raw(features)
+        if TASK_TYPE == "classification":
+            best = int(out.argmax())
+            return ("BUY" if self.classes_[best] == 1 else "SELL"), float(out[best])
+        return ("BUY" if out > 0 else "SELL"), float(abs(out))
+
+
+def pin_threads(cpu=None):
+    """
+    Restrict BLAS/OpenMP pools to one thread for the live process (and optionally pin it to a core).
+    Returns the threadpool limiter; keep a reference for as long as the limit should hold.
+    """
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    return threadpool_limits(limits=1)
+
+
+def _percentiles(timings):
+    timings = np.asarray(timings) * 1e6
+    return {"p50_us": float(np.percentile(timings, 50)), "p99_us": float(np.percentile(timings, 99)),
+            "mean_us": float(timings.mean())}
+
+
+def benchmark_latency(model, model_type, X, calls=BENCHMARK_CALLS):
+    """
+    p50/p99 latency per bar of the current path (sklearn-API predict_proba/predict on a one-row
+    array, as InferenceService.predict does) versus FastPredictor.predict_raw on the same rows.
+    Also reports the largest output difference between the two.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    rows = X[np.arange(calls) % len(X)]
+    generic = model.predict_proba if TASK_TYPE == "classification" and hasattr(model, "predict_proba") else model.predict
+    fast = FastPredictor(model, model_type)
+
+    current, optimized = [], []
+    max_diff = 0.0
+    for row in rows:
+        started = time.perf_counter()
+        expected = generic(row[None])
+        current.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        out = fast.predict_raw(row)
+        optimized.append(time.perf_counter() - started)
+        max_diff = max(max_diff, float(np.max(np.abs(np.ravel(expected) - np.ravel(out)))))
+
+    result = {"model": model_type}
+    result.update({f"current_{k}": v for k, v in _percentiles(current).items()})
+    result.update({f"fast_{k}": v for k, v in _percentiles(optimized).items()})
+    result["speedup_p50"] = result["current_p50_us"] / result["fast_p50_us"]
+    result["max_abs_diff"] = max_diff
+    return result
+
+
+def main():
+    from g_training.b_model_trainer import get_model, make_placeholder_dataset
+
+    parser = argparse.ArgumentParser(description="Single-bar inference latency: current predict path vs FastPredictor")
+    parser.add_argument("--models", default="xgboost,lightgbm,random_forest")
+    parser.add_argument("--calls", type=int, default=BENCHMARK_CALLS)
+    parser.add_argument("--cpu", type=int, default=None, help="pin the benchmark to this core")
+    args = parser.parse_args()
+
+    X, y = make_placeholder_dataset()
+    limiter = pin_threads(args.cpu)
+    results = []
+    for model_type in [name for name in args.models.split(",") if name]:
+        model = get_model(model_type).fit(X, y)
+        results.append(benchmark_latency(model, model_type, X, args.calls))
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    limiter.restore_original_limits()
+
+
+if __name__ == "__main__":
+    main()
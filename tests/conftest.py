@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from e_data_ingestion.e_fake_mt5_feed import install_fake_mt5
+
+# The ingestion modules import MetaTrader5 at import time; without a terminal the local fake feed stands in
+try:
+    import MetaTrader5  # noqa: F401
+except ImportError:
+    install_fake_mt5()
+
+from c_database.a_database import seed_risk_settings, seed_symbols, seed_timeframes
+from d_models.a_models import Base
+
+
+@pytest.fixture
+def seeded_db(tmp_path):
+    """Path of a fresh SQLite database with the schema and the seeded risk settings, symbols and timeframes."""
+    path = str(tmp_path / "smart_expert.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    seed_risk_settings(session)
+    seed_symbols(session)
+    seed_timeframes(session)
+    session.close()
+    engine.dispose()
+    return path
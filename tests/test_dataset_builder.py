@@ -0,0 +1,34 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from g_training import c_dataset_builder
+
+
+@pytest.fixture
+def candles_db(seeded_db):
+    rng = np.random.default_rng(3)
+    close = 1.1 * np.exp(np.cumsum(rng.normal(scale=1e-3, size=700)))
+    conn = sqlite3.connect(seeded_db)
+    conn.executemany(
+        "INSERT INTO candles (symbol_id, timeframe_id, time, open, high, low, close) VALUES (1, 1, ?, ?, ?, ?, ?)",
+        [(1_700_000_000 + 60 * i, c, c * 1.001, c * 0.999, c) for i, c in enumerate(close)]
+    )
+    conn.commit()
+    conn.close()
+    return seeded_db
+
+
+def test_streamed_sql_chunks_match_whole_series(candles_db):
+    candles = c_dataset_builder.load_candle_columns(1, 1, db_path=candles_db)
+    expected = list(c_dataset_builder.iter_dataset(1, 1, lookback=20, horizon=5, candles=candles))
+    # Small SQL chunks, so many chunk edges fall inside the series
+    chunks = list(c_dataset_builder.iter_dataset(1, 1, lookback=20, horizon=5, chunk_rows=37, db_path=candles_db))
+    assert len(chunks) > 10
+    for got, want in zip(zip(*chunks), zip(*expected)):  # X, y and times
+        np.testing.assert_array_equal(np.concatenate(got), np.concatenate(want))
+
+    X, y, times = c_dataset_builder.build_dataset(1, 1, lookback=20, horizon=5, db_path=candles_db)
+    assert len(X) == len(y) == len(times) == 700 - 20 - 5
+    np.testing.assert_array_equal(times, np.concatenate([part[2] for part in expected]))
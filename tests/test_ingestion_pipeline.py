@@ -0,0 +1,79 @@
+import sqlite3
+import sys
+
+import pytest
+
+from e_data_ingestion import a_fetch_candles, b_ingestion_pipeline
+from e_data_ingestion.e_fake_mt5_feed import FakeMT5Feed, install_fake_mt5
+
+# Fixed feed clock (mid-bar), so a re-run sees exactly the same closed bars
+NOW = 1_750_000_030
+M1_BARS = 500
+
+
+@pytest.fixture
+def fake_feed(monkeypatch):
+    monkeypatch.setitem(sys.modules, "MetaTrader5", sys.modules.get("MetaTrader5"))
+    feed = install_fake_mt5(FakeMT5Feed(clock=lambda: NOW))
+    monkeypatch.setattr(a_fetch_candles, "mt5", sys.modules["MetaTrader5"])
+    monkeypatch.setitem(a_fetch_candles.CANDLE_COUNTS, "M1", M1_BARS)
+    return feed
+
+
+@pytest.fixture
+def symbols(seeded_db):
+    conn = sqlite3.connect(seeded_db)
+    try:
+        return dict(conn.execute("SELECT symbol_name, id FROM symbols WHERE symbol_name IN ('EURUSD', 'XAUUSD')"))
+    finally:
+        conn.close()
+
+
+def _m1_rows(db_path, symbol_id=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        query = "SELECT COUNT(*), MAX(time) FROM candles WHERE timeframe_id = ?"
+        params = [a_fetch_candles.tf_name_to_id("M1")]
+        if symbol_id is not None:
+            query += " AND symbol_id = ?"
+            params.append(symbol_id)
+        return conn.execute(query, params).fetchone()
+    finally:
+        conn.close()
+
+
+def _pipeline(db_path, symbols):
+    return b_ingestion_pipeline.IngestionPipeline(db_path, symbols, timeframes=["M1"], fetch_workers=2,
+                                                  group_commit_rows=10 ** 9)
+
+
+def test_full_pull_then_incremental_rerun(fake_feed, seeded_db, symbols):
+    stats = _pipeline(seeded_db, symbols).run()
+    count, last = _m1_rows(seeded_db)
+    assert stats["inserted"] == count == len(symbols) * M1_BARS
+    assert last == NOW - NOW % 60 - 60  # the forming bar is not stored
+
+    pipeline = _pipeline(seeded_db, symbols)
+    stats = pipeline.run()
+    assert stats["inserted"] == 0 and not pipeline.errors
+    assert _m1_rows(seeded_db)[0] == count
+
+
+def test_failing_series_rolls_back_only_itself(fake_feed, seeded_db, symbols, monkeypatch):
+    failing = symbols["EURUSD"]
+    write = b_ingestion_pipeline.write_candle_columns
+
+    def write_then_fail(conn, symbol_id, *args, **kwargs):
+        result = write(conn, symbol_id, *args, **kwargs)
+        if symbol_id == failing:
+            raise sqlite3.OperationalError("disk I/O error (simulated)")
+        return result
+
+    monkeypatch.setattr(b_ingestion_pipeline, "write_candle_columns", write_then_fail)
+    pipeline = _pipeline(seeded_db, symbols)
+    stats = pipeline.run()
+
+    assert [(symbol, tf_name) for symbol, tf_name, _ in pipeline.errors] == [("EURUSD", "M1")]
+    assert _m1_rows(seeded_db, failing)[0] == 0
+    assert _m1_rows(seeded_db, symbols["XAUUSD"])[0] == M1_BARS
+    assert stats["inserted"] == M1_BARS  # the rolled-back series is not counted
@@ -0,0 +1,36 @@
+import asyncio
+import sqlite3
+import time
+
+from e_data_ingestion import a_fetch_candles, d_live_stream
+from e_data_ingestion.e_fake_mt5_feed import FakeMT5Feed
+
+
+def test_stream_writes_closed_bars_and_records_latency(seeded_db, monkeypatch):
+    monkeypatch.setitem(d_live_stream.CANDLE_COUNTS, "M1", 200)
+    conn = sqlite3.connect(seeded_db)
+    symbol_id = conn.execute("SELECT id FROM symbols WHERE symbol_name = 'EURUSD'").fetchone()[0]
+    conn.close()
+
+    # Clock starts half a second before a minute boundary, so one new bar closes during the run
+    started = time.time()
+    boundary = (int(started) // 60 + 1) * 60
+    clock = lambda: boundary - 0.5 + (time.time() - started)
+    streamer = d_live_stream.LiveBarStreamer(seeded_db, {"EURUSD": symbol_id}, feed=FakeMT5Feed(clock=clock),
+                                             timeframes=["M1"], clock=clock)
+    latencies = asyncio.run(streamer.run(duration=3))
+
+    assert not streamer.errors
+    conn = sqlite3.connect(seeded_db)
+    count, last = conn.execute(
+        "SELECT COUNT(*), MAX(time) FROM candles WHERE symbol_id = ? AND timeframe_id = ?",
+        (symbol_id, a_fetch_candles.tf_name_to_id("M1"))
+    ).fetchone()
+    conn.close()
+    assert last == boundary - 60  # the bar that closed at the boundary, not the forming one
+    assert count == 201  # the catch-up history plus the newly closed bar
+
+    bar_times = [bar_time for _, _, bar_time, _, _ in latencies]
+    assert bar_times == [boundary - 120, boundary - 60]
+    _, _, _, close_to_commit, detect_to_commit = latencies[-1]
+    assert 0 <= detect_to_commit <= close_to_commit < 3
@@ -0,0 +1,44 @@
+import sqlite3
+
+import numpy as np
+
+from b_config.e_trading_config import TradingRiskConfig
+from f_analysis.f_backtester import select_trades, symbol_contract_size
+
+
+def _symbol_id(db_path, name):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT id FROM symbols WHERE symbol_name = ?", (name,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _backtest_volume(db_path, symbol_id, balance, entry, stop_loss, settings):
+    conn = sqlite3.connect(db_path)
+    try:
+        contract_size = symbol_contract_size(conn, symbol_id)
+    finally:
+        conn.close()
+    candidates = {
+        "entry_idx": np.array([1]), "exit_idx": np.array([2]), "direction": np.array([1]),
+        "entry_price": np.array([entry]), "exit_price": np.array([entry]),
+        "sl_distance": np.array([abs(entry - stop_loss)]),
+    }
+    _, volumes, _ = select_trades(candidates, settings.max_risk_percent, settings.min_lot, settings.max_lot,
+                                  initial_balance=balance, contract_size=contract_size)
+    return volumes[0]
+
+
+def test_live_and_backtest_sizes_match(seeded_db):
+    config = TradingRiskConfig(seeded_db)
+    settings = config.snapshot()
+    for name, entry, stop_loss in [("EURUSD", 1.1000, 1.0980), ("XAUUSD", 2400.0, 2385.0), ("US500", 5200.0, 5150.0)]:
+        symbol_id = _symbol_id(seeded_db, name)
+        live = config.calculate_position_size(10000, entry, stop_loss, symbol_id)
+        assert live == _backtest_volume(seeded_db, symbol_id, 10000, entry, stop_loss, settings)
+        batch = config.calculate_position_sizes(10000, np.array([entry]), np.array([stop_loss]), symbol_id)
+        assert batch[0] == live
+
+    # 1% of 10000 over a 20-pip stop on a 100000-unit lot
+    assert config.calculate_position_size(10000, 1.1000, 1.0980, _symbol_id(seeded_db, "EURUSD")) == 0.5
@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from f_analysis.c_rolling_correlation import compare_with_pandas
+
+
+def _returns(offset=0.0, rows=600, columns=4):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame(rng.normal(size=(rows, columns)) + offset,
+                        columns=[f"S{i}" for i in range(columns)])
+
+
+@pytest.mark.parametrize("offset, tolerance", [(0.0, 1e-12), (1000.0, 1e-6)])
+def test_rolling_correlation_matches_pandas(offset, tolerance):
+    # A large common offset makes the running sums cancel badly; the engine must stay close to pandas anyway
+    assert compare_with_pandas(_returns(offset), window=100) < tolerance